@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""Persistent on-disk cache of scd.
+
+scd is often executed many times with the same configuration (e.g. in
+pre-commit hooks or CI pipelines) and most of its work at startup is
+the same on every run: validation of config, rendering and
+compilation of search patterns etc. Results of such work are stored in
+the :file:`.scd-cache` directory near the config file and reused by
+next runs.
+
+Each cached value is a JSON file, stored under some namespace. The
+name of the file is a digest of everything the value depends on, so
+cache is never invalidated explicitly: if something changes, the key
+changes too. It is always safe to remove cache directory.
+
+Values which are recalculated often for the same owner (e.g. plan of
+the config) are stored in slots: a slot is a single file, it keeps
+only the latest value with its key, so stale values do not pile up
+(see :py:func:`load_slot` and :py:func:`save_slot`).
+
+Some values do not depend on the project (e.g. index of installed
+plugins), they are stored in user cache directory (see
+:py:func:`get_user_directory`).
+
+Cache is disabled by default (so library usage of scd does not create
+any files), CLI enables it unless ``--no-cache`` option is set.
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import hashlib
+import json
+import logging
+import os
+import os.path
+
+import six
+
+import scd.utils
+
+
+ENABLED = False
+"""Is cache enabled or not."""
+
+DIRECTORY_NAME = ".scd-cache"
+"""Name of the cache directory (it is placed near the config file)."""
+
+
+def get_directory(project_directory):
+    """Return path to the cache directory of the project.
+
+    :param project_directory: Path to the project directory. If
+        ``None``, then user cache directory is used.
+    :type project_directory: str or None
+    :return: Path to the cache directory.
+    :rtype: str
+    """
+    if project_directory is None:
+        return get_user_directory()
+
+    return os.path.join(project_directory, DIRECTORY_NAME)
+
+
+def get_user_directory():
+    """Return path to the user cache directory.
+
+    It respects ``XDG_CACHE_HOME`` environment variable.
+
+    :return: Path to the cache directory.
+    :rtype: str
+    """
+    base_directory = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache")
+
+    return os.path.join(base_directory, "scd")
+
+
+def get_path(project_directory, namespace, key):
+    """Return path to the file with cached value.
+
+    :param project_directory: Path to the project directory (see
+        :py:func:`get_directory`).
+    :type project_directory: str or None
+    :param str namespace: Namespace of the value.
+    :param str key: Key of the value (see :py:func:`make_key`).
+    :return: Path to the file.
+    :rtype: str
+    """
+    return os.path.join(
+        get_directory(project_directory), namespace, key + ".json")
+
+
+def make_key(*values):
+    """Make cache key from given values.
+
+    :param values: Any JSON serializable values (unknown types, like
+        dates from YAML, are converted to strings).
+    :return: Digest of values.
+    :rtype: str
+    """
+    content = json.dumps(
+        values, sort_keys=True, separators=(",", ":"), default=six.text_type)
+
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def load(project_directory, namespace, key):
+    """Load value from cache.
+
+    :param project_directory: Path to the project directory (see
+        :py:func:`get_directory`).
+    :type project_directory: str or None
+    :param str namespace: Namespace of the value.
+    :param str key: Key of the value (see :py:func:`make_key`).
+    :return: Cached value or ``None`` if nothing is cached (or cache
+        is disabled).
+    """
+    if not ENABLED:
+        return None
+
+    path = get_path(project_directory, namespace, key)
+    try:
+        with open(path, "rt") as filefp:
+            value = json.load(filefp)
+    except (IOError, OSError, ValueError) as exc:
+        logging.debug("Cannot load %s from cache: %s", path, exc)
+        return None
+
+    logging.debug("Loaded %s from cache", path)
+
+    return value
+
+
+def save(project_directory, namespace, key, value):
+    """Save value into cache.
+
+    Errors are logged and ignored: inability to save something into
+    cache should never break scd.
+
+    :param project_directory: Path to the project directory (see
+        :py:func:`get_directory`).
+    :type project_directory: str or None
+    :param str namespace: Namespace of the value.
+    :param str key: Key of the value (see :py:func:`make_key`).
+    :param value: Any JSON serializable value.
+    """
+    if not ENABLED:
+        return
+
+    path = get_path(project_directory, namespace, key)
+    try:
+        ensure_directory(project_directory, namespace)
+        with scd.utils.AtomicWriter(path, "wt") as writer:
+            writer.write(json.dumps(value, sort_keys=True))
+    except (IOError, OSError, ValueError) as exc:
+        logging.warning("Cannot save %s into cache: %s", path, exc)
+        return
+
+    logging.debug("Saved %s into cache", path)
+
+
+def load_slot(project_directory, namespace, slot, key):
+    """Load value from the slot if it was saved with the same key.
+
+    :param project_directory: Path to the project directory (see
+        :py:func:`get_directory`).
+    :type project_directory: str or None
+    :param str namespace: Namespace of the value.
+    :param str slot: Name of the slot (see :py:func:`make_key`).
+    :param str key: Key of the value (see :py:func:`make_key`).
+    :return: Cached value or ``None`` if nothing is cached, slot has
+        a value for another key (or cache is disabled).
+    """
+    entry = load(project_directory, namespace, slot)
+    if not isinstance(entry, dict) or entry.get("key") != key:
+        return None
+
+    return entry.get("value")
+
+
+def save_slot(project_directory, namespace, slot, key, value):
+    """Save value into the slot, replacing previous one.
+
+    :param project_directory: Path to the project directory (see
+        :py:func:`get_directory`).
+    :type project_directory: str or None
+    :param str namespace: Namespace of the value.
+    :param str slot: Name of the slot (see :py:func:`make_key`).
+    :param str key: Key of the value (see :py:func:`make_key`).
+    :param value: Any JSON serializable value.
+    """
+    save(project_directory, namespace, slot, {"key": key, "value": value})
+
+
+def ensure_directory(project_directory, namespace):
+    """Create cache directory for the namespace if required.
+
+    Cache directory has its own :file:`.gitignore` so it is never
+    committed by accident.
+
+    :param project_directory: Path to the project directory (see
+        :py:func:`get_directory`).
+    :type project_directory: str or None
+    :param str namespace: Namespace of the values.
+    """
+    cache_directory = get_directory(project_directory)
+    if not os.path.isdir(cache_directory):
+        os.makedirs(cache_directory)
+        with open(os.path.join(cache_directory, ".gitignore"), "wt") as gfp:
+            gfp.write("*\n")
+
+    namespace_directory = os.path.join(cache_directory, namespace)
+    if not os.path.isdir(namespace_directory):
+        os.makedirs(namespace_directory)
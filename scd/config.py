@@ -7,18 +7,20 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import collections
+import copy
+import functools
 import json
 import logging
 import os.path
 import re
 import warnings
 
-import jsonschema
 import six
 
+import scd.cache
 import scd.files
 import scd.utils
-import scd.version
+import scd.validator
 
 try:
     from collections.abc import Hashable
@@ -26,6 +28,9 @@ except ImportError:
     from collections import Hashable
 
 
+STRICT_VALIDATION = False
+"""Validate config even if it was successfully validated before."""
+
 Parser = collections.namedtuple("Parser", ["name", "func"])
 """Just a named tuple, related to configuration parsers.
 
@@ -34,6 +39,17 @@ Parser = collections.namedtuple("Parser", ["name", "func"])
     config as a first argument.
 """
 
+PARSER_EXTENSIONS = {
+    ".json": "JSON",
+    ".toml": "TOML",
+    ".yaml": "YAML",
+    ".yml": "YAML"
+}
+"""A mapping of config file extensions to the names of parsers.
+
+If config file has other extension, all parsers are tried one by one.
+"""
+
 V1_CONFIG_SCHEMA = {
     "$schema": "http://json-schema.org/draft-04/schema",
     "type": "object",
@@ -48,15 +64,25 @@ V1_CONFIG_SCHEMA = {
             "type": "object",
             "required": ["scheme", "number"],
             "properties": {
-                "scheme": {
-                    "type": "string",
-                    "enum": sorted(scd.utils.get_version_plugins().keys())
-                },
+                "scheme": {"type": "string"},
                 "number": {
                     "oneOf": [
                         {"type": "number"},
                         {"type": "string"}
                     ]
+                },
+                "tag_glob": {"type": "string"},
+                "describe": {
+                    "type": "object",
+                    "properties": {
+                        "candidates": {"type": "integer", "minimum": 0},
+                        "first_parent": {"type": "boolean"},
+                        "max_commits": {"type": "integer", "minimum": 1},
+                        "shallow": {
+                            "type": "string",
+                            "enum": ["fail", "count"]
+                        }
+                    }
                 }
             }
         },
@@ -124,6 +150,9 @@ V1_CONFIG_SCHEMA = {
 
 This valid by `Draft V4
 <https://tools.ietf.org/html/draft-wright-json-schema-00>`_.
+
+Possible version schemes are not listed here: they depend on installed
+plugins, so :py:func:`make_v1_config_schema` adds them on demand.
 """
 
 
@@ -151,34 +180,73 @@ class Config(Hashable):
     def validate_schema(config):
         """Validate parsed content to comply with JSON Schema.
 
+        Config is checked with compiled validator first (see
+        :py:mod:`scd.validator`), and only if it is not valid,
+        :py:mod:`jsonschema` is used to collect errors.
+
         :param dict config: Parsed configuration.
         :return: A list of errors, found during verification. If list is
             empty, everyting is valid.
         :rtype: list[str]
         """
+        validator = make_compiled_validator()
+        if validator is not None and validator(config):
+            return []
+
+        import jsonschema
+
         validator = jsonschema.Draft4Validator(
-            V1_CONFIG_SCHEMA, format_checker=jsonschema.FormatChecker())
+            make_v1_config_schema(), format_checker=jsonschema.FormatChecker())
 
         return [
             "{0}: {1}".format("/".join(err.path), err.message)
             for err in validator.iter_errors(config)]
 
     def __hash__(self):
-        return hash(self.configpath)
+        return hash(self.key)
+
+    def __eq__(self, other):
+        return isinstance(other, Config) and self.key == other.key
+
+    def __ne__(self, other):
+        return not self == other
 
     def __init__(self, configpath, version_scheme, config, extra_context):
+        self.raw = config
+        self.configpath = os.path.abspath(configpath)
+        self.extra_context = extra_context
+        self.explicit_version_scheme = version_scheme
+        self._digest = None
+        self._files = None
+        self._group_regexps = None
+        self.plan = {}
+        if scd.cache.ENABLED:
+            self.plan = scd.cache.load_slot(
+                self.project_directory, "plans", self.cache_slot,
+                self.plan_key) or {}
+
+        if scd.cache.ENABLED and not STRICT_VALIDATION and \
+                scd.cache.load_slot(
+                    self.project_directory, "validations", self.cache_slot,
+                    self.validation_key) and \
+                make_version_number_validator()(
+                    config["version"].get("number")):
+            logging.debug("Config was validated already, skip validation.")
+            return
+
         errors = self.validate_schema(config)
         if errors:
             for error in errors:
                 logging.error("Error in config: %s", error)
-            logging.debug("Schema is \n%s",
-                          json.dumps(self.SCHEMA, sort_keys=True, indent=4))
+            if logging.getLogger().isEnabledFor(logging.DEBUG):
+                logging.debug(
+                    "Schema is \n%s",
+                    json.dumps(self.SCHEMA, sort_keys=True, indent=4))
             raise ValueError("Incorrect config")
 
-        self.raw = config
-        self.configpath = os.path.abspath(configpath)
-        self.extra_context = extra_context
-        self.explicit_version_scheme = version_scheme
+        if scd.cache.ENABLED:
+            scd.cache.save_slot(self.project_directory, "validations",
+                                self.cache_slot, self.validation_key, True)
 
     def __str__(self):
         return (
@@ -187,6 +255,94 @@ class Config(Hashable):
 
     __repr__ = __str__
 
+    @property
+    def digest(self):
+        """Digest of the config content.
+
+        It includes everything which affects config: parsed content,
+        extra context and explicit version scheme. Digest is calculated
+        only once, config is not expected to be changed after that.
+
+        :return: Hex digest.
+        :rtype: str
+        """
+        if self._digest is None:
+            self._digest = scd.cache.make_key(
+                self.raw, self.extra_context, self.explicit_version_scheme)
+
+        return self._digest
+
+    @property
+    def key(self):
+        """Canonical key of the config.
+
+        Configs with the same key are equal, so they share all
+        in-memory caches (compiled patterns, versions etc.).
+
+        :return: Path to the config and its digest.
+        :rtype: tuple[str, str]
+        """
+        return self.configpath, self.digest
+
+    @property
+    def cache_slot(self):
+        """Name of the slot of on-disk cache for this config.
+
+        Each config file has its own slot (see
+        :py:func:`scd.cache.save_slot`), so only the latest plan and
+        result of validation are kept.
+
+        :return: Name of the slot.
+        :rtype: str
+        """
+        return scd.cache.make_key(self.configpath)
+
+    @property
+    def plan_key(self):
+        """Key of the cached plan (see :py:attr:`plan`).
+
+        Plan depends only on files, patterns and defaults from config,
+        extra context and installed version plugins (they provide
+        search patterns). Version number is not a part of the key, so
+        version bump does not invalidate plan.
+
+        :return: Cache key.
+        :rtype: str
+        """
+        return scd.cache.make_key(
+            self.raw.get("files"), self.raw.get("search_patterns"),
+            self.raw.get("replacement_patterns"), self.raw.get("defaults"),
+            self.extra_context,
+            scd.utils.get_plugin_versions(scd.utils.VERSION_PLUGIN_NAMESPACE))
+
+    @property
+    def validation_key(self):
+        """Key of the cached result of successful validation.
+
+        Validation depends only on parsed content and schema (which
+        includes names of installed version plugins). Version number
+        is not a part of the key, so version bump does not require full
+        validation: only the number is checked (see
+        :py:func:`make_version_number_validator`).
+
+        :return: Cache key.
+        :rtype: str
+        """
+        return scd.cache.make_key(
+            strip_version_number(self.raw), make_v1_config_schema())
+
+    def save_plan(self, plan):
+        """Save plan into cache.
+
+        Plan is a mapping of file names (as in config) to the lists of
+        :py:attr:`scd.files.SearchReplace.spec`.
+
+        :param dict plan: Plan to save.
+        """
+        self.plan = plan
+        scd.cache.save_slot(self.project_directory, "plans", self.cache_slot,
+                            self.plan_key, plan)
+
     @property
     def project_directory(self):
         """Absolute path to the directory with config file.
@@ -217,17 +373,23 @@ class V1Config(Config):
         return self.raw["version"].get("scheme", "semver")
 
     @property
-    @scd.utils.lru_cache()
     def version(self):
         """Instance of :py:class:`scd.version.Version`.
 
-        This instance is created based on data from config file.
+        This instance is created based on data from config file. It is
+        cached until config is changed. If version scheme depends on VCS
+        (see :py:attr:`scd.version.Version.DEPENDS_ON_VCS`), it is also
+        recreated when state of VCS is changed.
 
         :return: Version
         :rtype: :py:class:`scd.version.Version`
         """
-        plugins = scd.utils.get_version_plugins()
-        return plugins[self.version_scheme](self)
+        vcs_state = None
+        plugin = scd.utils.get_version_plugin(self.version_scheme)
+        if plugin.DEPENDS_ON_VCS:
+            vcs_state = scd.utils.get_vcs_state(self.project_directory)
+
+        return make_version(self, vcs_state)
 
     @property
     def version_number(self):
@@ -240,16 +402,17 @@ class V1Config(Config):
 
     @property
     def files(self):
-        """A list of files defines in config file.
+        """A table of files defines in config file.
+
+        Table is built only once, files are sorted by their paths.
 
-        :return: List of file instances
-        :rtype: list[:py:class:`scd.files.File`]
+        :return: Table of file instances
+        :rtype: :py:class:`scd.files.FileTable`
         """
-        files = [
-            scd.files.File(name, conf, self)
-            for name, conf in self.raw["files"].items()
-        ]
-        return sorted(files, key=lambda item: item.path)
+        if self._files is None:
+            self._files = scd.files.FileTable.from_config(self)
+
+        return self._files
 
     @property
     def groups(self):
@@ -260,6 +423,25 @@ class V1Config(Config):
         """
         return self.raw.get("groups", {})
 
+    @property
+    def group_regexps(self):
+        """A mapping of compiled regular expressions of groups.
+
+        Expressions match filenames, relative to the project directory
+        (see :py:attr:`scd.files.File.filename`). They are compiled only
+        once.
+
+        :return: Mapping of group names to regular expressions.
+        :rtype: dict[str, regexp]
+        :raises ValueError: if some expression cannot be compiled.
+        """
+        if self._group_regexps is None:
+            self._group_regexps = {
+                name: make_group_regexp(pattern)
+                for name, pattern in self.groups.items()}
+
+        return self._group_regexps
+
     @property
     def replacement_patterns(self):
         """A mapping of replacement patterns (name/repl) from config file.
@@ -294,49 +476,153 @@ class V1Config(Config):
 
         :param list[str] required_groups: A list of mandatory groups
         :param list[str] required_files: A list of mandatory files
-        :return: A list of files after filtering.
-        :rtype: list[:py:class:`scd.files.File`]
+        :return: A table of files after filtering.
+        :rtype: :py:class:`scd.files.FileTable`
         """
-        required_files = {
-            os.path.abspath(item.name) for item in required_files}
+        files = self.files
+        required_groups = [
+            name for name in required_groups or () if name in self.groups]
+        if not required_groups and not required_files:
+            return files
+
+        positions = None
         if required_groups:
-            required_groups = [
-                os.path.join(self.project_directory, value + "$")
-                for key, value in self.groups.items()
-                if key in required_groups]
+            positions = set()
+            for name in required_groups:
+                positions.update(files.get_group_positions(name))
+
+        if required_files:
+            paths = (os.path.abspath(item.name) for item in required_files)
+            file_positions = {
+                files.index[path] for path in paths if path in files.index}
+            if positions is None:
+                positions = file_positions
+            else:
+                positions &= file_positions
+
+        return files.select(sorted(positions))
+
+
+@scd.utils.lru_cache()
+def make_version(config, vcs_state):
+    """Create version instance for config.
+
+    :param config: Config to make version for.
+    :type config: :py:class:`Config`
+    :param vcs_state: State of VCS (see
+        :py:func:`scd.utils.get_vcs_state`) or ``None`` if version does
+        not depend on it. It is used only as a part of cache key.
+    :return: Version
+    :rtype: :py:class:`scd.version.Version`
+    """
+    plugin = scd.utils.get_version_plugin(config.version_scheme)
+
+    return plugin(config)
 
-        def filterfunc(item):
-            if required_groups:
-                for glob in required_groups:
-                    if re.match(glob, item.path):
-                        break
-                else:
-                    return False
-            if required_files:
-                return item.path in required_files
-            return True
 
-        files = filter(filterfunc, self.files)
-        files = list(files)
+@scd.utils.lru_cache()
+def make_group_regexp(pattern):
+    """Compile regular expression of the group.
 
-        return files
+    ``$`` is appended implicitly, so pattern has to match the whole
+    filename.
+
+    :param str pattern: Pattern of the group from config.
+    :return: Compiled regular expression.
+    :rtype: regexp
+    :raises ValueError: if pattern cannot be compiled.
+    """
+    try:
+        return re.compile("(?:{0})$".format(pattern))
+    except Exception as exc:
+        logging.error("Group pattern: %s, error: %s", pattern, exc)
+        raise ValueError("Cannot parse group pattern {0}".format(pattern))
 
 
-def get_parsers():
+@scd.utils.lru_cache()
+def make_v1_config_schema():
+    """Return complete JSON schema of configuration (ver 1).
+
+    This is :py:data:`V1_CONFIG_SCHEMA` with names of available version
+    schemes. Plugins are not loaded to get their names.
+
+    :return: JSON schema.
+    :rtype: dict
+    """
+    schema = copy.deepcopy(V1_CONFIG_SCHEMA)
+    scheme = schema["properties"]["version"]["properties"]["scheme"]
+    scheme["enum"] = sorted(scd.utils.get_version_plugin_names())
+
+    return schema
+
+
+@scd.utils.lru_cache()
+def make_compiled_validator():
+    """Return compiled validator of configuration (ver 1).
+
+    :return: Validation function (see
+        :py:func:`scd.validator.compile_schema`) or ``None`` if schema
+        cannot be compiled.
+    :rtype: callable or None
+    """
+    try:
+        return scd.validator.compile_schema(make_v1_config_schema())
+    except ValueError as exc:
+        logging.debug("Cannot compile config schema: %s", exc)
+
+    return None
+
+
+@scd.utils.lru_cache()
+def make_version_number_validator():
+    """Return compiled validator of version number from config.
+
+    :return: Validation function (see
+        :py:func:`scd.validator.compile_schema`).
+    :rtype: callable
+    """
+    return scd.validator.compile_schema(
+        V1_CONFIG_SCHEMA["properties"]["version"]["properties"]["number"])
+
+
+def strip_version_number(config):
+    """Return copy of parsed config without version number.
+
+    :param dict config: Parsed configuration.
+    :return: Shallow copy of configuration.
+    :rtype: dict
+    """
+    version = config.get("version")
+    if not isinstance(version, dict):
+        return config
+
+    stripped = dict(config)
+    stripped["version"] = dict(version)
+    stripped["version"].pop("number", None)
+
+    return stripped
+
+
+def get_parsers(extension=None):
     """Function to detect locally available parsers.
 
+    :param str extension: Extension of the config file. If it is known
+        (see :py:data:`PARSER_EXTENSIONS`), only suitable parser is
+        returned.
     :return: A list of available parsers for config files.
     :rtype: list[:py:class:`Parser`]
     """
-    parsers = [Parser("JSON", get_json_parser())]
-
-    toml_parser = get_toml_parser()
-    if toml_parser:
-        parsers.append(Parser("TOML", toml_parser))
-
-    yaml_parser = get_yaml_parser()
-    if yaml_parser:
-        parsers.append(Parser("YAML", yaml_parser))
+    required_name = PARSER_EXTENSIONS.get(extension)
+    parsers = []
+
+    for name, factory in (("JSON", get_json_parser),
+                          ("TOML", get_toml_parser),
+                          ("YAML", get_yaml_parser)):
+        if required_name not in (None, name):
+            continue
+        func = factory()
+        if func:
+            parsers.append(Parser(name, func))
 
     return parsers
 
@@ -366,7 +652,8 @@ def get_yaml_parser():
     """Function which detects what parser should be used for parsing YAMLs.
 
     It uses following logic: if `PyYAML <http://pyyaml.org/>`_ is
-    available, it would be used, otherwise it will try for `ruamel.yaml
+    available, it would be used (with LibYAML based loader, if
+    possible), otherwise it will try for `ruamel.yaml
     <https://bitbucket.org/ruamel/yaml>`_.
 
     :return: YAML parser or ``None`` if nothing found.
@@ -384,8 +671,13 @@ def get_yaml_parser():
             logging.debug("Use ruamel.yaml for YAML config parser.")
             return ruamel.yaml.safe_load
     else:
-        logging.debug("Use PyYAML for YAML config parser.")
-        return yaml.safe_load
+        loader = getattr(yaml, "CSafeLoader", None)
+        if loader is None:
+            logging.debug("Use PyYAML for YAML config parser.")
+            return yaml.safe_load
+
+        logging.debug("Use PyYAML with LibYAML for YAML config parser.")
+        return functools.partial(yaml.load, Loader=loader)
 
 
 def get_toml_parser():
@@ -409,6 +701,9 @@ def get_toml_parser():
 def parse(fileobj, version_scheme, extra_context):
     """Function which parses given file-like object with config data.
 
+    Parser is chosen by extension of the file. If extension is unknown,
+    all available parsers are tried one by one.
+
     :param fileobj: Open file object for parsing.
     :type fileobj: file-like object
     :param str or None version_scheme: Explicit version scheme to use.
@@ -422,12 +717,14 @@ def parse(fileobj, version_scheme, extra_context):
     if not isinstance(content, six.string_types):
         content = content.decode("utf-8")
 
-    for parser in get_parsers():
+    extension = os.path.splitext(fileobj.name)[-1].lower()
+    for parser in get_parsers(extension):
         try:
             parsed = parser.func(content)
             logging.info("Parsed config as %s", parser.name)
-            logging.debug("Parsed config content:\n%s",
-                          json.dumps(parsed, sort_keys=True, indent=4))
+            if logging.getLogger().isEnabledFor(logging.DEBUG):
+                logging.debug("Parsed config content:\n%s",
+                              json.dumps(parsed, sort_keys=True, indent=4))
         except Exception as exc:
             logging.debug("Cannot parse %s: %s", parser.name, exc)
         else:
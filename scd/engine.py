@@ -0,0 +1,599 @@
+# -*- coding: utf-8 -*-
+"""Processing engine which applies search/replacements to file content.
+
+Naive processing of the file is simple: take each line and apply each
+:py:class:`scd.files.SearchReplace` to it. Unfortunately, it means that
+for a file with P patterns and L lines we have P×L regular expression
+substitutions, even if there is nothing to replace at all (and this is
+the most common case: usually version is mentioned in 1-2 lines of the
+file).
+
+Engine builds all searches of the file into one combined regular
+expression and scans the whole content with it once. Only lines, touched
+by any match, are processed with the original per-line logic, so result
+is exactly the same as with naive approach. Result is a list of
+non-overlapping ``(start, end, replacement)`` edits which are applied
+to the content in one rebuild.
+
+Big files (see :py:data:`MMAP_THRESHOLD`) are not decoded at all: they
+are mapped into memory with :py:mod:`mmap` and scanned with bytes
+version of combined pattern. Only those lines which may be changed are
+decoded and processed.
+
+Result is streamed into temporary file with
+:py:class:`scd.utils.AtomicWriter`, so memory is bounded even for
+big files and crash during writing does not corrupt them.
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import codecs
+import contextlib
+import heapq
+import locale
+import logging
+import mmap
+import os
+import re
+
+import scd.files
+import scd.utils
+
+
+MMAP_THRESHOLD = 1024 * 1024
+"""Files of this size (in bytes) and bigger are processed with mmap."""
+
+CHUNK_SIZE = 1024 * 1024
+"""Approximate size of chunks, used for streaming processing of files."""
+
+ASCII_COMPATIBLE_ENCODINGS = frozenset([
+    "ascii", "utf-8", "iso8859-1", "iso8859-15", "cp1251", "cp1252",
+    "koi8-r"])
+"""Encodings where ASCII characters are encoded with the same bytes."""
+
+UNSAFE_BYTES_REGEXP = re.compile(br"[\x1c-\x1f\x80-\xff]")
+"""Regular expression for bytes which are treated differently in bytes mode.
+
+Bytes pattern works with bytes, not characters, so lines with non-ASCII
+characters are always processed in text mode. ``\\x1c-\\x1f`` are
+whitespaces for unicode patterns, but not for bytes ones.
+"""
+
+
+UNSAFE_CONSTRUCTS_REGEXP = re.compile(
+    r"""
+    \(\?<!         # negative lookbehind may see previous line
+    | \(\?!        # negative lookahead may see next line
+    | \\[AZ]       # string anchors are line anchors in line mode
+    | \(\?P=       # named backreference
+    | \(\?\(       # conditional group
+    | \\[1-9]      # numbered backreference
+    | \(\?[aiLmsux]+\)  # global inline flags
+    """,
+    re.VERBOSE)
+"""Regular expression to detect patterns which cannot be combined.
+
+If search pattern contains any of these constructs, it is not possible
+to guarantee that combined pattern finds everything what original one
+finds line by line. In that case engine falls back to line by line
+processing.
+"""
+
+NAMED_GROUP_REGEXP = re.compile(r"\(\?P<\w+>")
+"""Regular expression to find named groups in the pattern.
+
+Named groups are converted to non-capturing ones in combined pattern,
+because different searches may use the same names (e.g. if both
+uses ``{{ semver }}``).
+"""
+
+
+class Engine(object):
+    """Engine which processes text with a list of search/replacements.
+
+    Engine works with already rendered replacements so it has no
+    references to templates or version and can be sent to another
+    process.
+
+    :param substitutions: A list of search patterns and rendered
+        replacements to apply.
+    :type substitutions: list[tuple[regexp, str]]
+    """
+
+    __slots__ = "substitutions", "matcher", "bytes_matcher"
+
+    @classmethod
+    def from_patterns(cls, patterns, version):
+        """Create engine for search/replacements and given version.
+
+        :param patterns: A list of search/replacements to apply.
+        :type patterns: list[:py:class:`scd.files.SearchReplace`]
+        :param version: Version instance to use.
+        :type version: :py:class:`scd.version.Version`
+        :return: Engine instance.
+        :rtype: :py:class:`Engine`
+        :raises ValueError: if there is no enough context to render
+            replacements.
+        """
+        return cls(
+            (sr.search, sr.get_replacement(sr.replace, version))
+            for sr in patterns)
+
+    def __init__(self, substitutions):
+        self.substitutions = tuple(substitutions)
+        self.matcher = make_matcher(
+            tuple(search for search, _ in self.substitutions))
+        self.bytes_matcher = make_bytes_matcher(self.matcher)
+
+    def __reduce__(self):
+        return self.__class__, (self.substitutions,)
+
+    def __str__(self):
+        return (
+            "<{0.__class__.__name__}(substitutions={1}, "
+            "combined={2})>").format(
+                self,
+                [(search.pattern, replacement)
+                 for search, replacement in self.substitutions],
+                self.matcher is not None)
+
+    __repr__ = __str__
+
+    def process(self, text):
+        """Process text.
+
+        :param text: Text to process (as a rule, the whole content
+            of the file). If this is mapped file, then result is bytes.
+        :type text: str or :py:class:`mmap.mmap`
+        :return: Processed text. If nothing is changed, then ``text``
+            is returned as is.
+        :rtype: str or bytes
+        """
+        return apply_edits(text, self.edits(text))
+
+    def edits(self, text):
+        """Generator of edits, required to process the text.
+
+        :param text: Text to process.
+        :type text: str or :py:class:`mmap.mmap`
+        :return: Non-overlapping sorted edits. For mapped files,
+            replacements are bytes.
+        :rtype: iterator[tuple[int, int, str or bytes]]
+        """
+        encoding = None
+        if isinstance(text, mmap.mmap):
+            encoding = get_encoding()
+
+        for start, end in self.candidate_lines(text):
+            line = text[start:end]
+            if encoding is not None:
+                line = line.decode(encoding)
+
+            processed_line = line
+            for search, replacement in self.substitutions:
+                processed_line = scd.files.substitute(
+                    search, replacement, processed_line)
+            if processed_line == line:
+                continue
+
+            if encoding is not None:
+                processed_line = processed_line.encode(encoding)
+            yield start, end, processed_line
+
+    def candidate_lines(self, text):
+        """Generator of lines which may contain something to replace.
+
+        :param text: Text to process.
+        :type text: str or :py:class:`mmap.mmap`
+        :return: Spans of lines (including trailing newline).
+        :rtype: iterator[tuple[int, int]]
+        """
+        newline = b"\n" if isinstance(text, mmap.mmap) else "\n"
+
+        for start, end in self.candidate_regions(text):
+            while start < end:
+                line_end = text.find(newline, start, end)
+                line_end = end if line_end < 0 else line_end + 1
+                yield start, line_end
+                start = line_end
+
+    def candidate_regions(self, text):
+        """Generator of regions which may contain something to replace.
+
+        First of all, searches are filtered by their prefilters (see
+        :py:func:`scd.files.make_prefilter`): if some search cannot
+        match anywhere in the text, it is not used. If every remaining
+        search has a cheap condition (required literal or digit),
+        only lines with such conditions are scanned with combined
+        pattern.
+
+        :param text: Text to process.
+        :type text: str or :py:class:`mmap.mmap`
+        :return: Sorted non-overlapping spans of whole lines.
+        :rtype: iterator[tuple[int, int]]
+        """
+        prefilters = [
+            scd.files.make_prefilter(search)
+            for search, _ in self.substitutions]
+        if isinstance(text, mmap.mmap):
+            encoding = get_encoding()
+            prefilters = [pf.encode(encoding) for pf in prefilters]
+
+        active = [
+            (substitution[0], pf)
+            for substitution, pf in zip(self.substitutions, prefilters)
+            if pf.match(text)]
+        if not active:
+            return iter(())
+
+        matcher = make_matcher(tuple(search for search, _ in active))
+        if isinstance(text, mmap.mmap):
+            matcher = make_bytes_matcher(matcher)
+        gate = make_gate(tuple(pf for _, pf in active))
+
+        if gate is not None:
+            regions = gated_regions(gate, matcher, text)
+        elif matcher is not None:
+            regions = match_regions(matcher, text)
+        else:
+            regions = [(0, len(text))]
+
+        if isinstance(text, mmap.mmap):
+            regions = heapq.merge(regions, unsafe_regions(text))
+
+        return merge_regions(regions)
+
+    def can_map(self, path):
+        """Check if file can be processed in mapped mode.
+
+        Only big files are mapped, file should be in ASCII-compatible
+        encoding and has no ``\\r`` (universal newlines cannot be
+        emulated in bytes mode).
+
+        :param str path: Path to the file.
+        :return: Can file be mapped or not.
+        :rtype: bool
+        """
+        if self.bytes_matcher is None:
+            return False
+        if os.path.getsize(path) < max(1, MMAP_THRESHOLD):
+            return False
+        if get_encoding() not in ASCII_COMPATIBLE_ENCODINGS:
+            return False
+
+        with map_file(path) as content:
+            return content.find(b"\r") < 0
+
+
+@scd.utils.lru_cache()
+def make_matcher(searches):
+    """Function, which combines search patterns into the single one.
+
+    :param tuple searches: Compiled regular expressions to combine.
+    :return: Combined regular expression or ``None`` if patterns
+        cannot be combined safely.
+    :rtype: regexp or None
+    """
+    if not searches:
+        return None
+
+    flags = {search.flags for search in searches}
+    if len(flags) != 1:
+        logging.debug("Searches have different flags, cannot combine.")
+        return None
+    flags = flags.pop()
+
+    parts = []
+    for search in searches:
+        if UNSAFE_CONSTRUCTS_REGEXP.search(search.pattern):
+            logging.debug("Search %r cannot be combined.", search.pattern)
+            return None
+
+        pattern = NAMED_GROUP_REGEXP.sub("(?:", search.pattern)
+        if flags & re.VERBOSE:
+            pattern = "\n" + pattern + "\n"
+        parts.append("(?:{0})".format(pattern))
+
+    try:
+        return re.compile("|".join(parts), flags | re.MULTILINE)
+    except Exception as exc:
+        logging.debug("Cannot combine searches: %s", exc)
+        return None
+
+
+@scd.utils.lru_cache()
+def make_bytes_matcher(matcher):
+    """Function, which makes bytes version of combined pattern.
+
+    :param matcher: Combined pattern, made by :py:func:`make_matcher`.
+    :type matcher: regexp or None
+    :return: Bytes regular expression or ``None`` if it is not
+        possible to build it (e.g pattern has non-ASCII characters).
+    :rtype: regexp or None
+    """
+    if matcher is None:
+        return None
+
+    try:
+        pattern = matcher.pattern.encode("ascii")
+        return re.compile(pattern, matcher.flags & ~re.UNICODE)
+    except Exception as exc:
+        logging.debug("Cannot make bytes pattern: %s", exc)
+        return None
+
+
+@scd.utils.lru_cache()
+def make_gate(prefilters):
+    """Function, which combines gates of prefilters into the single one.
+
+    :param tuple prefilters: Prefilters of searches.
+    :return: Regular expression which matches if any prefilter may
+        match or ``None`` if some prefilter has no gate.
+    :rtype: regexp or None
+    """
+    gates = [prefilter.gate for prefilter in prefilters]
+    if not gates or None in gates:
+        return None
+
+    separator = b"|" if isinstance(gates[0], bytes) else "|"
+
+    return re.compile(separator.join(gates))
+
+
+def gated_regions(gate, matcher, text):
+    """Generator of regions (whole lines) which satisfy the gate.
+
+    :param regexp gate: Regular expression made by :py:func:`make_gate`.
+    :param matcher: Regular expression to scan lines found by gate.
+        If ``None``, then every line found by gate is a region.
+    :type matcher: regexp or None
+    :param text: Text to scan.
+    :type text: str or :py:class:`mmap.mmap`
+    :return: Sorted spans of regions.
+    :rtype: iterator[tuple[int, int]]
+    """
+    newline = b"\n" if isinstance(text, mmap.mmap) else "\n"
+    position = 0
+
+    while True:
+        match = gate.search(text, position)
+        if match is None:
+            return
+
+        start = text.rfind(newline, 0, match.start()) + 1
+        position = text.find(newline, match.start())
+        position = len(text) if position < 0 else position + 1
+
+        if matcher is None:
+            yield start, position
+        else:
+            for region in match_regions(matcher, text, start, position):
+                yield region
+
+
+def match_regions(matcher, text, start=0, end=None):
+    """Generator of regions (whole lines) touched by matcher.
+
+    :param regexp matcher: Regular expression to use.
+    :param text: Text to scan.
+    :type text: str or :py:class:`mmap.mmap`
+    :param int start: Position where to start scanning.
+    :param int end: Position where to stop scanning.
+    :return: Sorted spans of regions.
+    :rtype: iterator[tuple[int, int]]
+    """
+    newline = b"\n" if isinstance(text, mmap.mmap) else "\n"
+    if end is None:
+        end = len(text)
+
+    for match in matcher.finditer(text, start, end):
+        start = text.rfind(newline, 0, match.start()) + 1
+        end = text.find(newline, max(match.start(), match.end() - 1))
+        end = len(text) if end < 0 else end + 1
+        yield start, end
+
+
+def unsafe_regions(content):
+    """Generator of lines with bytes from :py:data:`UNSAFE_BYTES_REGEXP`.
+
+    :param content: Mapped file to scan.
+    :type content: :py:class:`mmap.mmap`
+    :return: Sorted spans of lines.
+    :rtype: iterator[tuple[int, int]]
+    """
+    position = 0
+
+    while True:
+        match = UNSAFE_BYTES_REGEXP.search(content, position)
+        if match is None:
+            return
+
+        start = content.rfind(b"\n", 0, match.start()) + 1
+        position = content.find(b"\n", match.start())
+        position = len(content) if position < 0 else position + 1
+        yield start, position
+
+
+def merge_regions(regions):
+    """Merge overlapping regions.
+
+    :param regions: Regions, sorted by their start.
+    :type regions: iterable[tuple[int, int]]
+    :return: Sorted non-overlapping regions.
+    :rtype: iterator[tuple[int, int]]
+    """
+    region_start = region_end = None
+
+    for start, end in regions:
+        if region_end is not None and start < region_end:
+            region_end = max(region_end, end)
+            continue
+        if region_end is not None:
+            yield region_start, region_end
+        region_start, region_end = start, end
+
+    if region_end is not None:
+        yield region_start, region_end
+
+
+def process_mapped_file(engine, path, dry_run):
+    """Process file in mapped mode (see :py:meth:`Engine.can_map`).
+
+    :param engine: Engine to process file with.
+    :type engine: :py:class:`Engine`
+    :param str path: Path to the file.
+    :param bool dry_run: Do not save file.
+    :return: Was file changed or not (even if it was not saved).
+    :rtype: bool
+    """
+    changed = False
+    position = 0
+
+    with scd.utils.AtomicWriter(path, "wb") as writer, \
+            map_file(path) as content:
+        for start, end, replacement in engine.edits(content):
+            changed = True
+            if not dry_run:
+                copy_bytes(content, position, start, writer)
+                writer.write(replacement)
+                position = end
+
+        if changed and not dry_run:
+            copy_bytes(content, position, len(content), writer)
+
+    return changed
+
+
+def process_text_file(engine, path, dry_run):
+    """Process file in text mode.
+
+    File is processed by chunks of whole lines, so memory is bounded
+    and result is the same as processing of the whole content at
+    once.
+
+    :param engine: Engine to process file with.
+    :type engine: :py:class:`Engine`
+    :param str path: Path to the file.
+    :param bool dry_run: Do not save file.
+    :return: Was file changed or not (even if it was not saved).
+    :rtype: bool
+    """
+    changed = False
+    consumed = 0
+
+    with scd.utils.AtomicWriter(path, "wt") as writer, \
+            open(path, "rt") as filefp:
+        for chunk in read_chunks(filefp):
+            edits = list(engine.edits(chunk))
+            if edits and not changed and not dry_run:
+                copy_text(path, consumed, writer)
+            changed = changed or bool(edits)
+            if changed and not dry_run:
+                writer.write(apply_edits(chunk, edits))
+            consumed += len(chunk)
+
+    return changed
+
+
+def read_chunks(filefp):
+    """Generator of chunks of whole lines from the file.
+
+    :param filefp: File, open in text mode.
+    :type filefp: file-like object
+    :return: Chunks of text, approximately :py:data:`CHUNK_SIZE` each.
+    :rtype: iterator[str]
+    """
+    while True:
+        lines = filefp.readlines(CHUNK_SIZE)
+        if not lines:
+            return
+        yield "".join(lines)
+
+
+def copy_text(path, length, writer):
+    """Copy the beginning of text file into writer.
+
+    :param str path: Path to the file.
+    :param int length: The number of characters to copy.
+    :param writer: Writer to copy to.
+    :type writer: :py:class:`scd.utils.AtomicWriter`
+    """
+    with open(path, "rt") as filefp:
+        while length > 0:
+            data = filefp.read(min(length, CHUNK_SIZE))
+            if not data:
+                return
+            writer.write(data)
+            length -= len(data)
+
+
+def copy_bytes(content, start, end, writer):
+    """Copy region of mapped file into writer.
+
+    :param content: Mapped file.
+    :type content: :py:class:`mmap.mmap`
+    :param int start: Start of the region.
+    :param int end: End of the region.
+    :param writer: Writer to copy to.
+    :type writer: :py:class:`scd.utils.AtomicWriter`
+    """
+    for offset in range(start, end, CHUNK_SIZE):
+        writer.write(content[offset:min(end, offset + CHUNK_SIZE)])
+
+
+@contextlib.contextmanager
+def map_file(path):
+    """Context manager which maps file into memory (read-only).
+
+    :param str path: Path to the file.
+    :return: Mapped file.
+    :rtype: :py:class:`mmap.mmap`
+    """
+    with open(path, "rb") as filefp:
+        content = mmap.mmap(filefp.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield content
+        finally:
+            content.close()
+
+
+def get_encoding():
+    """Return normalized name of encoding, used for text files.
+
+    :return: Name of the encoding.
+    :rtype: str
+    """
+    encoding = locale.getpreferredencoding(False)
+    try:
+        return codecs.lookup(encoding).name
+    except LookupError:
+        return encoding
+
+
+def apply_edits(text, edits):
+    """Apply edits to the text in one rebuild.
+
+    :param text: Original text.
+    :type text: str or :py:class:`mmap.mmap`
+    :param edits: Sorted non-overlapping edits.
+    :type edits: iterable[tuple[int, int, str or bytes]]
+    :return: Text with edits applied.
+    :rtype: str or bytes
+    """
+    chunks = []
+    position = 0
+
+    for start, end, replacement in edits:
+        chunks.append(text[position:start])
+        chunks.append(replacement)
+        position = end
+
+    if not chunks:
+        return text
+
+    chunks.append(text[position:])
+
+    return chunks[0][:0].join(chunks)
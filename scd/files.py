@@ -6,21 +6,31 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import collections
 import logging
 import os
 import os.path
 import re
 
-import jinja2
-import jinja2.meta
 import six
 
+import scd.cache
 import scd.utils
+import scd.walk
 
 try:
     from collections.abc import Hashable
+    from collections.abc import Sequence
 except Exception as exc:
     from collections import Hashable
+    from collections import Sequence
+
+try:
+    import re._constants as sre_constants
+    import re._parser as sre_parse
+except ImportError:
+    import sre_constants
+    import sre_parse
 
 
 DEFAULT_REPLACEMENTS = {
@@ -29,6 +39,44 @@ DEFAULT_REPLACEMENTS = {
 }
 """A mapping of default replacements."""
 
+DIGIT_REGEXP = re.compile(r"\d", re.UNICODE)
+"""Regular expression to check if text has any digit."""
+
+BYTES_DIGIT_REGEXP = re.compile(br"[0-9\x80-\xff]")
+"""Regular expression to check if bytes may have any digit.
+
+Non-ASCII digits are encoded with non-ASCII bytes so any of them
+may be a part of some digit.
+"""
+
+REPEAT_OPCODES = frozenset(
+    getattr(sre_constants, name)
+    for name in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT")
+    if hasattr(sre_constants, name))
+"""Opcodes of parsed regular expression for repetitions."""
+
+SIMPLE_TEMPLATE_VARIABLE_REGEXP = re.compile(
+    r"\{\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}\}")
+"""Regular expression for variable reference in simple template."""
+
+JINJA_MARKERS = ("{{", "{%", "{#", "\r")
+"""If text of template has any of these, it is not simple one.
+
+Carriage returns are there because Jinja2 normalizes newlines.
+"""
+
+JINJA_RESERVED_NAMES = frozenset([
+    "and", "elif", "else", "false", "False", "for", "if", "in", "is",
+    "none", "None", "not", "or", "true", "True"])
+"""Names which are constants or keywords in Jinja2 expressions."""
+
+TEMPLATES_PROJECT_DIRECTORY = None
+"""Directory of the project, compiled templates are cached there.
+
+Templates are cached only if on-disk cache is enabled (see
+:py:mod:`scd.cache`), CLI sets this to the directory of config.
+"""
+
 
 @six.python_2_unicode_compatible
 class SearchReplace(Hashable):
@@ -46,6 +94,8 @@ class SearchReplace(Hashable):
     def get_replacement(replace, version):
         """Return rendered template, taken context from version.
 
+        Only variables, required by template, are taken from context.
+
         :param replace: Template for replacement.
         :type replace: :py:class:`jinja2.Template`
         :param version: Version instance, where template takes context.
@@ -55,13 +105,27 @@ class SearchReplace(Hashable):
         :rtype: str
         """
         context = version.context
-        missed_names = replace.required_vars - set(context)
+        missed_names = [
+            name for name in replace.required_vars if name not in context]
         if missed_names:
             logging.error("Cannot find replacement vars %s",
                           sorted(missed_names))
             raise ValueError("Cannot find replacement vars")
 
-        return replace.render(**context)
+        return replace.render(
+            {name: context[name] for name in replace.required_vars})
+
+    @classmethod
+    def from_spec(cls, spec):
+        """Create instance from specification, made by :py:attr:`spec`.
+
+        :param list spec: Specification of search/replacement.
+        :return: Search/replacement instance.
+        :rtype: :py:class:`SearchReplace`
+        """
+        search, flags, replace = spec
+
+        return cls(re.compile(search, flags), make_template(replace))
 
     def __init__(self, search, replace):
         self.search = search
@@ -78,6 +142,18 @@ class SearchReplace(Hashable):
         return hash("|".join(
             [str(hash(self.search)), str(hash(self.replace))]))
 
+    @property
+    def spec(self):
+        """JSON serializable specification of search/replacement.
+
+        This is a pattern and flags of search regular expression and
+        source of replacement template.
+
+        :return: Specification.
+        :rtype: list
+        """
+        return [self.search.pattern, self.search.flags, self.replace.source]
+
     def process(self, version, text):
         """Process text according to given version.
 
@@ -92,13 +168,73 @@ class SearchReplace(Hashable):
         :rtype: str
         """
         replacement = self.get_replacement(self.replace, version)
-        modified_text = self.search.sub(replacement, text)
 
-        if text != modified_text:
-            logging.info("Modify %r to %r",
-                         text.strip(), modified_text.strip())
+        return substitute(self.search, replacement, text)
 
-        return modified_text
+
+class Prefilter(collections.namedtuple(
+        "Prefilter", ["literals", "digit", "min_length"])):
+    """Cheap necessary condition for the search pattern to match.
+
+    If text does not satisfy prefilter, then search pattern does not
+    match the text for sure. If it does, pattern may match or may not.
+    Such checks are way cheaper than running complex regular
+    expressions (e.g. PEP440 one) on every line of the file.
+
+    :param tuple literals: Substrings which text must have.
+    :param digit: Regular expression for required digit (``None`` if
+        it is not required).
+    :type digit: regexp or None
+    :param int min_length: Minimal length of the text.
+    """
+
+    __slots__ = ()
+
+    @property
+    def gate(self):
+        """The most selective condition as a regular expression.
+
+        :return: Pattern of regular expression or ``None`` if
+            prefilter has no conditions on content.
+        :rtype: str or bytes or None
+        """
+        if self.literals:
+            return re.escape(max(self.literals, key=len))
+        if self.digit is not None:
+            return self.digit.pattern
+
+    def match(self, text):
+        """Check if text satisfy prefilter.
+
+        :param text: Text to check.
+        :type text: str or bytes or :py:class:`mmap.mmap`
+        :return: If text satisfy prefilter or not.
+        :rtype: bool
+        """
+        if len(text) < self.min_length:
+            return False
+        if self.digit is not None and self.digit.search(text) is None:
+            return False
+
+        return all(text.find(literal) >= 0 for literal in self.literals)
+
+    def encode(self, encoding):
+        """Make prefilter which checks bytes, not text.
+
+        :param str encoding: Encoding of the bytes.
+        :return: Prefilter for bytes in given encoding.
+        :rtype: :py:class:`Prefilter`
+        """
+        literals = []
+        for literal in self.literals:
+            try:
+                literals.append(literal.encode(encoding))
+            except UnicodeError:
+                continue
+
+        digit = BYTES_DIGIT_REGEXP if self.digit is not None else None
+
+        return self.__class__(tuple(literals), digit, self.min_length)
 
 
 @six.python_2_unicode_compatible
@@ -110,20 +246,31 @@ class File(Hashable):
     one need to emit a list of :py:class:`SearchReplace` instances for a
     file.
 
+    As a rule, files are taken from :py:class:`FileTable` which has
+    their paths calculated already.
+
     :param str name: The name of the file from config (as is, not absolute
         one)
     :param config: Instance of used config.
     :type config: :py:class:`scd.config.Config`
     :param list data: A contents of search/replacement parts of the
         config.
+    :param filename: Relative filename (see :py:func:`make_filename`),
+        calculated if ``None``.
+    :type filename: str or None
+    :param path: Absolute path to the file, calculated if ``None``.
+    :type path: str or None
     """
 
-    __slots__ = "name", "config", "data"
+    __slots__ = "name", "config", "data", "filename", "path"
 
-    def __init__(self, name, data, config):
+    def __init__(self, name, data, config, filename=None, path=None):
         self.name = name
         self.config = config
         self.data = data
+        self.filename = filename or make_filename(name)
+        self.path = path or os.path.join(
+            config.project_directory, self.filename)
 
     def __hash__(self):
         return hash(self.path)
@@ -136,26 +283,13 @@ class File(Hashable):
     __repr__ = __str__
 
     @property
-    def filename(self):
-        r"""Relative filename of the file.
-
-        The most cool part about this property is that such
-        name is platform independent: on Windows it might be
-        :file:`docs\conf.py`, on Linux: :file:`docs/conf.py`. That cool.
+    def pattern_table(self):
+        """Table of search patterns and replacements of the config.
 
-        :return: Native platform filename
-        :rtype: str
+        :return: Shared table of the config.
+        :rtype: :py:class:`PatternTable`
         """
-        return os.path.join(*self.name.split("/"))
-
-    @property
-    def path(self):
-        """Absolute path to the file for current platform.
-
-        :return: Native platform absolute path.
-        :rtype: str
-        """
-        return os.path.join(self.config.project_directory, self.filename)
+        return make_pattern_table(self.config)
 
     @property
     def default_replacements(self):
@@ -167,7 +301,11 @@ class File(Hashable):
         :return: Mapping of replacements.
         :rtype: dict[str, str]
         """
-        return {k: make_template(v) for k, v in DEFAULT_REPLACEMENTS.items()}
+        table = self.pattern_table
+
+        return {
+            name: table.get_default_replace_pattern(name)
+            for name in DEFAULT_REPLACEMENTS}
 
     @property
     def all_replacements(self):
@@ -182,12 +320,11 @@ class File(Hashable):
         :return: Mapping of replacements.
         :rtype: dict[str, str]
         """
-        replacements = self.default_replacements.copy()
-        replacements.update(
-            (k, make_template(v))
-            for k, v in self.config.replacement_patterns.items())
+        table = self.pattern_table
 
-        return replacements
+        return {
+            name: table.get_replace_pattern(name)
+            for name in table.replacement_names}
 
     @property
     def default_search_patterns(self):
@@ -199,10 +336,11 @@ class File(Hashable):
         :return: Mapping of patterns.
         :rtype: dict[str, str]
         """
+        table = self.pattern_table
+
         return {
-            name: make_pattern("{{ %s }}" % name, self.config)
-            for name in scd.utils.get_version_plugins()
-        }
+            name: table.get_default_search_pattern(name)
+            for name in scd.utils.get_version_plugin_names()}
 
     @property
     def all_search_patterns(self):
@@ -217,12 +355,11 @@ class File(Hashable):
         :return: Mapping of patterns.
         :rtype: dict[str, str]
         """
-        patterns = self.default_search_patterns.copy()
-        patterns.update(
-            (k, make_pattern(v, self.config))
-            for k, v in self.config.search_patterns.items())
+        table = self.pattern_table
 
-        return patterns
+        return {
+            name: table.get_search_pattern(name)
+            for name in table.search_names}
 
     @property
     def default_search_pattern(self):
@@ -231,7 +368,7 @@ class File(Hashable):
         :return: Default search pattern
         :rtype: Regular expression
         """
-        return self.all_search_patterns[self.config.defaults["search"]]
+        return self.pattern_table.default_search_pattern
 
     @property
     def default_replace_pattern(self):
@@ -240,63 +377,535 @@ class File(Hashable):
         :return: Default replacement pattern
         :rtype: :py:class:`jinja2.Template`
         """
-        return self.all_replacements[self.config.defaults["replacement"]]
+        return self.pattern_table.default_replace_pattern
+
+    def get_search_pattern(self, name):
+        """Return search pattern by its name.
+
+        This is the same as ``all_search_patterns[name]`` but only
+        required pattern is compiled.
+
+        :param str name: Name of the search pattern.
+        :return: Search pattern
+        :rtype: Regular expression
+        :raises KeyError: if there is no such pattern.
+        """
+        return self.pattern_table.get_search_pattern(name)
+
+    def get_replace_pattern(self, name):
+        """Return replacement template by its name.
+
+        This is the same as ``all_replacements[name]`` but only
+        required template is compiled.
+
+        :param str name: Name of the replacement.
+        :return: Replacement pattern
+        :rtype: :py:class:`jinja2.Template`
+        :raises KeyError: if there is no such replacement.
+        """
+        return self.pattern_table.get_replace_pattern(name)
 
     @property
     def patterns(self):
         """A list of search/replacements for a file, based on config.
 
+        Instances are shared between all files of the config (see
+        :py:class:`PatternTable`).
+
         :return: List of instances for file management.
         :rtype: list[:py:class:`SearchReplace`]
         """
-        patterns = []
+        table = self.pattern_table
+
+        return [table.get_search_replace(item) for item in self.data]
 
-        for item in self.data:
-            if item == "default":
-                patterns.append(SearchReplace(
-                    self.default_search_pattern,
-                    self.default_replace_pattern))
-                continue
 
-            if "search_raw" in item:
-                search_pattern = make_pattern(item["search_raw"], self.config)
-            elif "search" in item:
-                search_pattern = self.all_search_patterns[item["search"]]
-            else:
-                search_pattern = self.default_search_pattern
+class FileTable(Sequence):
+    """Immutable table of files, defined in config.
 
-            if "replace_raw" in item:
-                replacement_pattern = make_template(item["replace_raw"])
-            elif "replace" in item:
-                replacement_pattern = self.all_replacements[item["replace"]]
-            else:
-                replacement_pattern = self.default_replace_pattern
+    Names, paths and data of files are stored in parallel tuples,
+    sorted by absolute path. :py:class:`File` instances are created only
+    when they are accessed, paths are calculated once for the table.
+
+    :param config: Instance of used config.
+    :type config: :py:class:`scd.config.Config`
+    :param tuple[str] names: Names of files from config.
+    :param tuple[str] filenames: Relative filenames.
+    :param tuple[str] paths: Absolute paths.
+    :param tuple[list] data: Search/replacement parts of files.
+    """
+
+    __slots__ = (
+        "config", "names", "filenames", "paths", "data", "index",
+        "group_index")
+
+    @classmethod
+    def from_config(cls, config):
+        """Create table of all files from config.
+
+        Globs and directories are expanded (see :py:mod:`scd.walk`),
+        files from config explicitly take precedence over them.
+
+        :param config: Instance of used config.
+        :type config: :py:class:`scd.config.Config`
+        :return: Table of files.
+        :rtype: :py:class:`FileTable`
+        """
+        project_directory = config.project_directory
+        entries = config.raw["files"]
+        sources = {
+            name: name for name in entries
+            if not scd.walk.is_glob(name, project_directory)}
+        globs = [name for name in entries if name not in sources]
+        for name, glob in scd.walk.expand(project_directory, globs).items():
+            sources.setdefault(name, glob)
+
+        rows = []
+        for name, source in sources.items():
+            filename = make_filename(name)
+            data = entries[source]
+            rows.append((
+                os.path.join(project_directory, filename),
+                name, filename, data))
+        rows.sort(key=lambda row: row[0])
+
+        if not rows:
+            return cls(config, (), (), (), ())
+
+        paths, names, filenames, data = zip(*rows)
+
+        return cls(config, names, filenames, paths, data)
+
+    def __init__(self, config, names, filenames, paths, data):
+        self.config = config
+        self.names = names
+        self.filenames = filenames
+        self.paths = paths
+        self.data = data
+        self.index = {path: position for position, path in enumerate(paths)}
+        self.group_index = {}
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return self.select(range(len(self))[position])
+
+        return File(self.names[position], self.data[position], self.config,
+                    self.filenames[position], self.paths[position])
+
+    def __repr__(self):
+        return "<{0.__class__.__name__}(paths={0.paths!r})>".format(self)
+
+    def get(self, path):
+        """Return file by its absolute path.
+
+        :param str path: Absolute path to the file.
+        :return: File or ``None`` if there is no such file in the table.
+        :rtype: :py:class:`File` or None
+        """
+        position = self.index.get(path)
+        if position is not None:
+            return self[position]
+
+    def get_group_positions(self, name):
+        """Return positions of the files, which belong to the group.
+
+        Positions are calculated on the first request, only filenames
+        are matched (no :py:class:`File` instances are created).
+
+        :param str name: Name of the group from config.
+        :return: Positions of the files in ascending order.
+        :rtype: tuple[int]
+        :raises KeyError: if there is no such group.
+        """
+        if name in self.group_index:
+            return self.group_index[name]
+
+        match = self.config.group_regexps[name].match
+        positions = self.group_index[name] = tuple(
+            position for position, filename in enumerate(self.filenames)
+            if match(filename))
+
+        return positions
+
+    def select(self, positions):
+        """Make table with files on given positions only.
+
+        :param positions: Positions of the files, in ascending order.
+        :type positions: list[int]
+        :return: Table of selected files.
+        :rtype: :py:class:`FileTable`
+        """
+        return self.__class__(
+            self.config,
+            tuple(self.names[position] for position in positions),
+            tuple(self.filenames[position] for position in positions),
+            tuple(self.paths[position] for position in positions),
+            tuple(self.data[position] for position in positions))
+
+
+class PatternTable(object):
+    """Table of resolved search patterns and replacements of the config.
+
+    Each named pattern or replacement is resolved and compiled only
+    once, on first access. Search/replacements of files are made of
+    entries of this table, so files with the same items share the same
+    :py:class:`SearchReplace` instances.
+
+    :param config: Instance of used config.
+    :type config: :py:class:`scd.config.Config`
+    """
+
+    __slots__ = "config", "searches", "replacements", "search_replaces"
+
+    def __init__(self, config):
+        self.config = config
+        self.searches = {}
+        self.replacements = {}
+        self.search_replaces = {}
+
+    def __repr__(self):
+        return (
+            "<{0.__class__.__name__}(searches={1}, replacements={2})>").format(
+                self, sorted(self.searches), sorted(self.replacements))
+
+    @property
+    def search_names(self):
+        """Names of all search patterns.
+
+        :return: Names of patterns from config and version plugins.
+        :rtype: frozenset[str]
+        """
+        return frozenset(self.config.search_patterns) | \
+            scd.utils.get_version_plugin_names()
+
+    @property
+    def replacement_names(self):
+        """Names of all replacements.
+
+        :return: Names of replacements from config and default ones.
+        :rtype: frozenset[str]
+        """
+        return frozenset(self.config.replacement_patterns) | \
+            frozenset(DEFAULT_REPLACEMENTS)
+
+    @property
+    def default_search_pattern(self):
+        """Default search pattern from config.
+
+        :return: Default search pattern
+        :rtype: Regular expression
+        """
+        return self.get_search_pattern(self.config.defaults["search"])
+
+    @property
+    def default_replace_pattern(self):
+        """Default replacement template from config.
+
+        :return: Default replacement pattern
+        :rtype: :py:class:`jinja2.Template`
+        """
+        return self.get_replace_pattern(self.config.defaults["replacement"])
+
+    def get_search_pattern(self, name):
+        """Return search pattern by its name.
+
+        Patterns from config take precedence over default ones.
+
+        :param str name: Name of the search pattern.
+        :return: Search pattern
+        :rtype: Regular expression
+        :raises KeyError: if there is no such pattern.
+        """
+        if name in self.searches:
+            return self.searches[name]
+
+        if name in self.config.search_patterns:
+            pattern = make_pattern(
+                self.config.search_patterns[name], self.config)
+        else:
+            pattern = self.get_default_search_pattern(name)
 
-            patterns.append(SearchReplace(search_pattern, replacement_pattern))
+        self.searches[name] = pattern
 
-        return patterns
+        return pattern
+
+    def get_default_search_pattern(self, name):
+        """Return search pattern of version plugin.
+
+        :param str name: Name of the version plugin.
+        :return: Search pattern
+        :rtype: Regular expression
+        :raises KeyError: if there is no such plugin.
+        """
+        if name not in scd.utils.get_version_plugin_names():
+            raise KeyError(name)
+
+        return make_pattern("{{ %s }}" % name, self.config)
+
+    def get_replace_pattern(self, name):
+        """Return replacement template by its name.
+
+        Replacements from config take precedence over default ones.
+
+        :param str name: Name of the replacement.
+        :return: Replacement pattern
+        :rtype: :py:class:`jinja2.Template`
+        :raises KeyError: if there is no such replacement.
+        """
+        if name in self.replacements:
+            return self.replacements[name]
+
+        if name in self.config.replacement_patterns:
+            template = make_template(self.config.replacement_patterns[name])
+        else:
+            template = self.get_default_replace_pattern(name)
+
+        self.replacements[name] = template
+
+        return template
+
+    def get_default_replace_pattern(self, name):
+        """Return default replacement template by its name.
+
+        :param str name: Name of the replacement (see
+            :py:data:`DEFAULT_REPLACEMENTS`).
+        :return: Replacement pattern
+        :rtype: :py:class:`jinja2.Template`
+        :raises KeyError: if there is no such replacement.
+        """
+        return make_template(DEFAULT_REPLACEMENTS[name])
+
+    def get_search_replace(self, item):
+        """Return search/replacement for the item of file from config.
+
+        :param item: Item of file, ``default`` or mapping with search
+            and replacement.
+        :type item: str or dict[str, str]
+        :return: Search/replacement instance.
+        :rtype: :py:class:`SearchReplace`
+        """
+        if item == "default":
+            item = {}
+
+        if "search_raw" in item:
+            search_key = "search_raw", item["search_raw"]
+        else:
+            search_key = "search", item.get(
+                "search", self.config.defaults["search"])
+
+        if "replace_raw" in item:
+            replace_key = "replace_raw", item["replace_raw"]
+        else:
+            replace_key = "replace", item.get(
+                "replace", self.config.defaults["replacement"])
+
+        key = search_key, replace_key
+        if key in self.search_replaces:
+            return self.search_replaces[key]
+
+        if search_key[0] == "search_raw":
+            search = make_pattern(search_key[1], self.config)
+        else:
+            search = self.get_search_pattern(search_key[1])
+
+        if replace_key[0] == "replace_raw":
+            replace = make_template(replace_key[1])
+        else:
+            replace = self.get_replace_pattern(replace_key[1])
+
+        search_replace = self.search_replaces[key] = SearchReplace(
+            search, replace)
+
+        return search_replace
+
+
+def substitute(search, replacement, text):
+    """Replace all occurences of search pattern in text.
+
+    :param regexp search: Search regular expression.
+    :param str replacement: Rendered replacement.
+    :param str text: Text to process.
+    :return: Processed text.
+    :rtype: str
+    """
+    modified_text = search.sub(replacement, text)
+
+    if text != modified_text:
+        logging.info("Modify %r to %r", text.strip(), modified_text.strip())
+
+    return modified_text
+
+
+class SimpleTemplate(object):
+    """Template, made only of text and references to variables.
+
+    Such template is rendered with simple string concatenation, output
+    is the same as output of :py:class:`jinja2.Template` (undefined
+    variables are rendered as empty strings, trailing newline is
+    removed).
+
+    :param str source: Text of template.
+    :param list parts: A list of pairs of text and name of variable
+        after it (``None`` for the last part).
+    """
+
+    __slots__ = "source", "parts", "required_vars"
+
+    def __init__(self, source, parts):
+        self.source = source
+        self.parts = parts
+        self.required_vars = frozenset(
+            name for _, name in parts if name is not None)
+
+    def __repr__(self):
+        return "<{0.__class__.__name__}({0.source!r})>".format(self)
+
+    def render(self, *args, **kwargs):
+        """Render template.
+
+        It accepts the same arguments as :py:class:`dict`.
+
+        :return: Rendered text.
+        :rtype: str
+        """
+        context = dict(*args, **kwargs)
+        chunks = []
+
+        for text, name in self.parts:
+            chunks.append(text)
+            if name is not None:
+                chunks.append(six.text_type(context.get(name, "")))
+
+        return "".join(chunks)
 
 
 @scd.utils.lru_cache()
 def make_template(template):
     """Function for creating template instance from text template.
 
+    If template is simple (see :py:class:`SimpleTemplate`), Jinja2 is
+    not used at all.
+
     :param str template: Text template to process.
     :return: Correct template instance, based on given text.
-    :rtype: :py:class:`jinja2.Template`
+    :rtype: :py:class:`jinja2.Template` or :py:class:`SimpleTemplate`
     """
-    tpl = jinja2.Template(template)
-    tpl.required_vars = jinja2.meta.find_undeclared_variables(
-        tpl.environment.parse(template))
+    tpl = make_simple_template(template)
+    if tpl is not None:
+        return tpl
+
+    project_directory = None
+    if scd.cache.ENABLED:
+        project_directory = TEMPLATES_PROJECT_DIRECTORY
+
+    environment = get_environment(project_directory)
+    tpl = environment.get_template(template)
+    tpl.source = template
+    tpl.required_vars = get_required_vars(
+        environment, template, project_directory)
 
     return tpl
 
 
+@scd.utils.lru_cache()
+def get_environment(project_directory):
+    """Return Jinja2 environment for templates.
+
+    Names of templates in this environment are their sources. If
+    on-disk cache is enabled, environment has bytecode cache, so
+    templates are not compiled again on next runs.
+
+    :param project_directory: Directory of the project (``None`` if
+        bytecode cache should not be used).
+    :type project_directory: str or None
+    :return: Jinja2 environment.
+    :rtype: :py:class:`jinja2.Environment`
+    """
+    import jinja2
+
+    bytecode_cache = None
+    if project_directory is not None:
+        try:
+            scd.cache.ensure_directory(project_directory, "jinja")
+        except (IOError, OSError) as exc:
+            logging.warning("Cannot create cache for templates: %s", exc)
+        else:
+            bytecode_cache = jinja2.FileSystemBytecodeCache(os.path.join(
+                scd.cache.get_directory(project_directory), "jinja"))
+
+    return jinja2.Environment(
+        loader=jinja2.FunctionLoader(six.text_type),
+        bytecode_cache=bytecode_cache)
+
+
+def get_required_vars(environment, template, project_directory):
+    """Return names of variables, required by Jinja2 template.
+
+    Template has to be parsed to find them, so names are cached in
+    on-disk cache.
+
+    :param environment: Jinja2 environment of template.
+    :type environment: :py:class:`jinja2.Environment`
+    :param str template: Text of template.
+    :param project_directory: Directory of the project (``None`` if
+        on-disk cache should not be used).
+    :type project_directory: str or None
+    :return: Names of variables.
+    :rtype: set[str]
+    """
+    import jinja2.meta
+
+    key = None
+    if project_directory is not None:
+        key = scd.cache.make_key(template)
+        names = scd.cache.load(project_directory, "templates", key)
+        if names is not None:
+            return set(names)
+
+    names = jinja2.meta.find_undeclared_variables(environment.parse(template))
+    if key is not None:
+        scd.cache.save(project_directory, "templates", key, sorted(names))
+
+    return names
+
+
+def make_simple_template(template):
+    """Make simple template if possible.
+
+    :param str template: Text template to process.
+    :return: Template or ``None`` if template is not simple.
+    :rtype: :py:class:`SimpleTemplate` or None
+    """
+    parts = []
+    position = 0
+
+    for matcher in SIMPLE_TEMPLATE_VARIABLE_REGEXP.finditer(template):
+        name = matcher.group(1)
+        if name in JINJA_RESERVED_NAMES:
+            return None
+        parts.append([template[position:matcher.start()], name])
+        position = matcher.end()
+    parts.append([template[position:], None])
+
+    for text, _ in parts:
+        if any(marker in text for marker in JINJA_MARKERS):
+            return None
+
+    if parts[-1][0].endswith("\n"):
+        parts[-1][0] = parts[-1][0][:-1]
+
+    return SimpleTemplate(template, [tuple(part) for part in parts])
+
+
 @scd.utils.lru_cache()
 def make_pattern(base_pattern, config):
     """Function, which creates regular expression based on given pattern.
 
-    Also, it injects all predefined search regexps like ``pep440`` etc.
+    Also, it injects predefined search regexps like ``pep440`` etc.
+    Only plugins, referenced by pattern, are loaded.
 
     :param str base_pattern: Pattern to transform to regular expression
         instance.
@@ -304,17 +913,19 @@ def make_pattern(base_pattern, config):
     :rtype: regexp
     :raises ValueError: if pattern cannot be parsed.
     """
+    pattern = make_template(base_pattern)
     patterns = config.extra_context.copy()
-    for name, data in scd.utils.get_version_plugins().items():
+    plugin_names = scd.utils.get_version_plugin_names()
+    for name in sorted(pattern.required_vars & plugin_names):
+        data = scd.utils.get_version_plugin(name)
         if not hasattr(data, "REGEXP"):
-            logging.warning("Plugin %s has no regexp, skip.")
+            logging.warning("Plugin %s has no regexp, skip.", name)
             continue
         if not hasattr(data.REGEXP, "pattern"):
-            logging.warning("Plugin %s regexp is not a pattern, skip.")
+            logging.warning("Plugin %s regexp is not a pattern, skip.", name)
             continue
         patterns[name] = data.REGEXP.pattern
 
-    pattern = make_template(base_pattern)
     missed_names = pattern.required_vars - set(patterns)
     if missed_names:
         logging.error("Cannot find required names %s in pattern",
@@ -332,6 +943,160 @@ def make_pattern(base_pattern, config):
     return pattern
 
 
+def make_filename(name):
+    r"""Make relative filename from the name of file in config.
+
+    The most cool part about this function is that such name is platform
+    independent: on Windows it might be :file:`docs\conf.py`, on Linux:
+    :file:`docs/conf.py`. That cool.
+
+    :param str name: Name of the file from config (``/`` is a separator).
+    :return: Native platform filename
+    :rtype: str
+    """
+    return os.path.join(*name.split("/"))
+
+
+@scd.utils.lru_cache()
+def make_pattern_table(config):
+    """Function, which creates table of patterns for the config.
+
+    :param config: Instance of used config.
+    :type config: :py:class:`scd.config.Config`
+    :return: Empty table, patterns are resolved on demand.
+    :rtype: :py:class:`PatternTable`
+    """
+    return PatternTable(config)
+
+
+@scd.utils.lru_cache()
+def make_prefilter(pattern):
+    """Function, which extracts prefilter from compiled search pattern.
+
+    :param regexp pattern: Compiled search pattern.
+    :return: Necessary condition for the pattern to match.
+    :rtype: :py:class:`Prefilter`
+    """
+    try:
+        parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+    except Exception as exc:
+        logging.debug("Cannot analyze pattern %r: %s", pattern.pattern, exc)
+        return Prefilter((), None, 0)
+
+    state = getattr(parsed, "state", None) or parsed.pattern
+    ignore_case = bool(state.flags & re.IGNORECASE)
+    literals, digit = analyze_pattern(parsed, ignore_case)
+
+    return Prefilter(
+        tuple(sorted(literals)),
+        DIGIT_REGEXP if digit else None,
+        parsed.getwidth()[0])
+
+
+def analyze_pattern(parsed, ignore_case):
+    """Collect requirements of parsed regular expression.
+
+    :param parsed: Parsed pattern (or its part).
+    :type parsed: :py:class:`sre_parse.SubPattern`
+    :param bool ignore_case: Is case insensitive matching is used.
+    :return: A set of required literals and is digit required or not.
+    :rtype: tuple[set[str], bool]
+    """
+    literals = set()
+    digit = False
+    run = []
+
+    for opcode, value in parsed:
+        if opcode == sre_constants.LITERAL:
+            char = six.unichr(value)
+            digit = digit or is_digit(char)
+            if not ignore_case:
+                run.append(char)
+                continue
+
+        if run:
+            literals.add("".join(run))
+            run = []
+
+        if opcode == sre_constants.IN:
+            digit = digit or is_digit_set(value)
+            continue
+
+        sub_literals, sub_digit = analyze_subpattern(
+            opcode, value, ignore_case)
+        literals.update(sub_literals)
+        digit = digit or sub_digit
+
+    if run:
+        literals.add("".join(run))
+
+    return literals, digit
+
+
+def analyze_subpattern(opcode, value, ignore_case):
+    """Collect requirements of compound item of parsed regular expression.
+
+    :param opcode: Opcode of the item.
+    :param value: Value of the item.
+    :param bool ignore_case: Is case insensitive matching is used.
+    :return: A set of required literals and is digit required or not.
+    :rtype: tuple[set[str], bool]
+    """
+    if opcode == sre_constants.SUBPATTERN:
+        if len(value) > 2 and value[1] & re.IGNORECASE:
+            ignore_case = True
+        return analyze_pattern(value[-1], ignore_case)
+
+    if opcode in REPEAT_OPCODES:
+        if value[0] >= 1:
+            return analyze_pattern(value[-1], ignore_case)
+    elif opcode == sre_constants.ASSERT:
+        return analyze_pattern(value[-1], ignore_case)
+    elif opcode == getattr(sre_constants, "ATOMIC_GROUP", None):
+        return analyze_pattern(value, ignore_case)
+    elif opcode == sre_constants.BRANCH:
+        branches = [
+            analyze_pattern(branch, ignore_case) for branch in value[-1]]
+        return (
+            set.intersection(*[branch[0] for branch in branches]),
+            all(branch[1] for branch in branches))
+
+    return set(), False
+
+
+def is_digit(char):
+    """Check if character is matched by ``\\d``.
+
+    :param str char: Character to check.
+    :return: Is it digit or not.
+    :rtype: bool
+    """
+    return DIGIT_REGEXP.match(char) is not None
+
+
+def is_digit_set(items):
+    """Check if character set of parsed regular expression has only digits.
+
+    :param list items: Items of the set.
+    :return: Does set contain only digits or not.
+    :rtype: bool
+    """
+    for opcode, value in items:
+        if opcode == sre_constants.LITERAL:
+            if not is_digit(six.unichr(value)):
+                return False
+        elif opcode == sre_constants.RANGE:
+            if value[0] < ord("0") or value[1] > ord("9"):
+                return False
+        elif opcode == sre_constants.CATEGORY:
+            if value != sre_constants.CATEGORY_DIGIT:
+                return False
+        else:
+            return False
+
+    return True
+
+
 def validate_access(files):
     """Function, which validates access to the files.
 
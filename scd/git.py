@@ -0,0 +1,1067 @@
+# -*- coding: utf-8 -*-
+"""In-process reader of Git repositories.
+
+Git flavored versions need a few facts about repository: commit of
+``HEAD``, nearest tag and number of commits since it. Running ``git``
+for each of them costs fork/exec which dominates runtime of scd in
+containers, so this module reads :file:`.git` directory directly: loose
+and packed refs, loose objects and pack files (with deltas).
+
+:py:meth:`Repository.describe` implements the same algorithm as
+``git describe --tags``, so results are the same as with Git.
+
+Only repositories with SHA-1 objects and files backend of refs are
+supported, :py:class:`Repository` raises :py:exc:`ValueError` for
+others (and for broken ones). Callers are expected to fall back to
+``git`` in that case.
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import binascii
+import fnmatch
+import heapq
+import logging
+import mmap
+import os
+import os.path
+import re
+import struct
+import zlib
+
+
+GIT_DIRECTORY_NAME = ".git"
+"""Name of the Git directory in the working tree."""
+
+DEFAULT_ABBREV = 7
+"""Minimal length of abbreviated commit SHA."""
+
+MAX_SYMREF_DEPTH = 5
+"""How many symbolic refs may be followed to resolve a ref."""
+
+MAX_DESCRIBE_CANDIDATES = 10
+"""Default number of candidate tags of ``git describe``."""
+
+PACK_CACHE_SIZE = 256
+"""How many objects each pack keeps as possible bases of deltas."""
+
+UNSUPPORTED_CONFIG_REGEXP = re.compile(
+    r"^\s*(?:objectformat\s*=\s*(?!sha1\b)|refstorage\s*=\s*(?!files\b))",
+    re.IGNORECASE | re.MULTILINE)
+"""Regular expression for config options which are not supported."""
+
+OBJ_OFS_DELTA = 6
+"""Type of pack entry, which is a delta to the entry at offset."""
+
+OBJ_REF_DELTA = 7
+"""Type of pack entry, which is a delta to the object with SHA."""
+
+OBJECT_TYPES = {1: b"commit", 2: b"tree", 3: b"blob", 4: b"tag"}
+"""Mapping of types of pack entries to the types of objects."""
+
+SEEN = 1
+"""Flag of commits, visited by :py:meth:`Repository.describe`."""
+
+INCLUDED = 1
+"""Flag of commits, reachable from the newer commit."""
+
+EXCLUDED = 2
+"""Flag of commits, reachable from the older commit."""
+
+
+class Pack(object):
+    """Pack file with its index.
+
+    Both files are memory mapped, objects are read on demand.
+
+    :param str index_path: Path to the :file:`.idx` file.
+    :raises ValueError: if index has unknown format.
+    """
+
+    __slots__ = (
+        "index_path", "index", "pack", "version", "count", "fanout", "cache")
+
+    def __init__(self, index_path):
+        self.index_path = index_path
+        self.index = map_file(index_path)
+        self.pack = None
+        self.cache = {}
+
+        if self.index[:4] == b"\377tOc":
+            self.version = struct.unpack(">I", self.index[4:8])[0]
+            if self.version != 2:
+                raise ValueError("Unsupported pack index version {0}".format(
+                    self.version))
+            fanout_offset = 8
+        else:
+            self.version = 1
+            fanout_offset = 0
+
+        self.fanout = struct.unpack(
+            ">256I", self.index[fanout_offset:fanout_offset + 1024])
+        self.count = self.fanout[-1]
+
+    def get_sha(self, position):
+        """Return binary SHA of the object on given position of index.
+
+        :param int position: Position of the object in index.
+        :return: Binary SHA.
+        :rtype: bytes
+        """
+        if self.version == 2:
+            start = 1032 + 20 * position
+        else:
+            start = 1028 + 24 * position
+
+        return self.index[start:start + 20]
+
+    def get_offset(self, position):
+        """Return offset of the object in pack file.
+
+        :param int position: Position of the object in index.
+        :return: Offset.
+        :rtype: int
+        """
+        if self.version == 1:
+            start = 1024 + 24 * position
+            return struct.unpack(">I", self.index[start:start + 4])[0]
+
+        start = 1032 + 24 * self.count + 4 * position
+        offset = struct.unpack(">I", self.index[start:start + 4])[0]
+        if offset & 0x80000000:
+            start = 1032 + 28 * self.count + 8 * (offset & 0x7fffffff)
+            offset = struct.unpack(">Q", self.index[start:start + 8])[0]
+
+        return offset
+
+    def bisect(self, sha):
+        """Find position of the object in index.
+
+        :param bytes sha: Binary SHA.
+        :return: Position of the object or position where it should be.
+        :rtype: int
+        """
+        first = bytearray(sha[:1])[0]
+        low = self.fanout[first - 1] if first else 0
+        high = self.fanout[first]
+
+        while low < high:
+            middle = (low + high) // 2
+            if self.get_sha(middle) < sha:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    def find(self, sha):
+        """Find offset of the object in pack file.
+
+        :param bytes sha: Binary SHA.
+        :return: Offset or ``None`` if there is no such object in pack.
+        :rtype: int or None
+        """
+        position = self.bisect(sha)
+        if position < self.count and self.get_sha(position) == sha:
+            return self.get_offset(position)
+
+    def get_neighbours(self, sha):
+        """Return SHAs of objects which are next to given one in index.
+
+        :param bytes sha: Binary SHA.
+        :return: A list of binary SHAs (without given one).
+        :rtype: list[bytes]
+        """
+        position = self.bisect(sha)
+        neighbours = []
+
+        for index in (position - 1, position, position + 1):
+            if 0 <= index < self.count:
+                neighbour = self.get_sha(index)
+                if neighbour != sha:
+                    neighbours.append(neighbour)
+
+        return neighbours
+
+    def read_header(self, offset):
+        """Read header of the pack entry.
+
+        :param int offset: Offset of the entry in pack file.
+        :return: Type of the entry, size of its data, offset of
+            compressed data and base of delta (offset or binary SHA,
+            ``None`` for non-deltas).
+        :rtype: tuple
+        """
+        data = self.pack
+        byte = bytearray(data[offset:offset + 1])[0]
+        kind = (byte >> 4) & 7
+        size = byte & 15
+        shift = 4
+        position = offset + 1
+        while byte & 0x80:
+            byte = bytearray(data[position:position + 1])[0]
+            size |= (byte & 0x7f) << shift
+            shift += 7
+            position += 1
+
+        base = None
+        if kind == OBJ_OFS_DELTA:
+            byte = bytearray(data[position:position + 1])[0]
+            distance = byte & 0x7f
+            position += 1
+            while byte & 0x80:
+                byte = bytearray(data[position:position + 1])[0]
+                distance = ((distance + 1) << 7) | (byte & 0x7f)
+                position += 1
+            base = offset - distance
+        elif kind == OBJ_REF_DELTA:
+            base = data[position:position + 20]
+            position += 20
+        elif kind not in OBJECT_TYPES:
+            raise ValueError("Unknown type {0} of pack entry".format(kind))
+
+        return kind, size, position, base
+
+    def read(self, offset, repository):
+        """Read object from pack file.
+
+        Chains of deltas are resolved iteratively, recently read objects
+        are kept as possible bases of next deltas.
+
+        :param int offset: Offset of the entry in pack file.
+        :param repository: Repository of the pack (to read bases of
+            deltas by SHA).
+        :type repository: :py:class:`Repository`
+        :return: Type of the object and its content.
+        :rtype: tuple[bytes, bytes]
+        :raises ValueError: if object cannot be read.
+        """
+        if self.pack is None:
+            self.pack = map_file(self.index_path[:-4] + ".pack")
+
+        deltas = []
+        while offset not in self.cache:
+            kind, size, position, base = self.read_header(offset)
+            if kind == OBJ_OFS_DELTA:
+                deltas.append((offset, position, size))
+                offset = base
+                continue
+            if kind == OBJ_REF_DELTA:
+                deltas.append((offset, position, size))
+                kind, content = repository.read_object(base)
+            else:
+                content = inflate(self.pack, position, size)
+                self.remember(offset, kind, content)
+            break
+        else:
+            kind, content = self.cache[offset]
+
+        kind = OBJECT_TYPES.get(kind, kind)
+        for offset, position, size in reversed(deltas):
+            content = apply_delta(content, inflate(self.pack, position, size))
+            self.remember(offset, kind, content)
+
+        return kind, content
+
+    def remember(self, offset, kind, content):
+        """Keep object as a possible base of next deltas.
+
+        :param int offset: Offset of the entry in pack file.
+        :param kind: Type of the object.
+        :param bytes content: Content of the object.
+        """
+        if len(self.cache) >= PACK_CACHE_SIZE:
+            self.cache.clear()
+        self.cache[offset] = kind, content
+
+
+class Repository(object):
+    """Git repository, read without ``git`` executable.
+
+    :param str git_dir: Path to the :file:`.git` directory (or to the
+        :file:`.git` file of worktree).
+    :raises ValueError: if repository is not supported.
+    """
+
+    def __init__(self, git_dir):
+        git_dir, common_dir = get_git_dirs(git_dir)
+        if not os.path.isfile(os.path.join(git_dir, "HEAD")):
+            raise ValueError("{0} is not a Git directory".format(git_dir))
+
+        self.git_dir = git_dir
+        self.common_dir = common_dir
+
+        config = read_text(os.path.join(self.common_dir, "config")) or ""
+        if UNSUPPORTED_CONFIG_REGEXP.search(config):
+            raise ValueError("Unsupported format of repository {0}".format(
+                git_dir))
+
+        self.object_dirs = get_object_dirs(
+            os.path.join(self.common_dir, "objects"))
+        shallow = read_text(os.path.join(self.common_dir, "shallow"))
+        self.shallow = frozenset((shallow or "").split())
+        self._packs = None
+        self._packed_refs = None
+        self._tags = None
+        self._commits = {}
+
+    def __repr__(self):
+        return "<{0.__class__.__name__}({0.git_dir!r})>".format(self)
+
+    @property
+    def packs(self):
+        """A list of pack files of repository.
+
+        :return: Packs.
+        :rtype: list[:py:class:`Pack`]
+        """
+        if self._packs is None:
+            packs = []
+            for directory in self.object_dirs:
+                pack_dir = os.path.join(directory, "pack")
+                try:
+                    names = sorted(os.listdir(pack_dir))
+                except OSError:
+                    continue
+                for name in names:
+                    if name.endswith(".idx") and name[:-4] + ".pack" in names:
+                        packs.append(Pack(os.path.join(pack_dir, name)))
+            self._packs = packs
+
+        return self._packs
+
+    @property
+    def packed_refs(self):
+        """A mapping of packed refs.
+
+        :return: Mapping of full ref names to pairs of SHA and peeled
+            SHA (``None`` if it is unknown if ref has to be peeled).
+        :rtype: dict[str, tuple[str, str or None]]
+        """
+        if self._packed_refs is None:
+            refs = {}
+            last = None
+            traits = ()
+            content = read_text(os.path.join(self.common_dir, "packed-refs"))
+            for line in (content or "").splitlines():
+                if line.startswith("# pack-refs with:"):
+                    traits = line[17:].split()
+                if not line or line.startswith("#"):
+                    continue
+                if line.startswith("^"):
+                    if last is not None:
+                        refs[last] = refs[last][0], line[1:].strip()
+                    continue
+
+                sha, _, last = line.partition(" ")
+                last = last.strip()
+                peeled = None
+                if "fully-peeled" in traits or (
+                        "peeled" in traits and last.startswith("refs/tags/")):
+                    peeled = sha
+                refs[last] = sha, peeled
+            self._packed_refs = refs
+
+        return self._packed_refs
+
+    def resolve(self, ref="HEAD"):
+        """Return SHA of the object, ref points to.
+
+        :param str ref: Full name of the ref (e.g. ``HEAD`` or
+            ``refs/heads/master``).
+        :return: Hex SHA or ``None`` if ref does not exist (e.g. branch
+            without commits).
+        :rtype: str or None
+        :raises ValueError: if symbolic refs are too deep.
+        """
+        for _ in range(MAX_SYMREF_DEPTH):
+            directory = self.git_dir if "/" not in ref else self.common_dir
+            content = read_text(os.path.join(directory, *ref.split("/")))
+            if content is None:
+                return self.packed_refs.get(ref, (None, None))[0]
+
+            content = content.strip()
+            if not content.startswith("ref:"):
+                return content
+            ref = content[4:].strip()
+
+        raise ValueError("Too deep symbolic refs")
+
+    def get_tags(self):
+        """Return all tags of repository.
+
+        Tags are read only once.
+
+        :return: Mapping of tag names (without ``refs/tags/``) to pairs
+            of tag SHA and SHA of the object tag points to (``None`` if
+            it is unknown).
+        :rtype: dict[str, tuple[str, str or None]]
+        """
+        if self._tags is not None:
+            return self._tags
+
+        tags = {}
+        for ref, (sha, peeled) in self.packed_refs.items():
+            if ref.startswith("refs/tags/"):
+                tags[ref[10:]] = sha, peeled
+
+        tags_dir = os.path.join(self.common_dir, "refs", "tags")
+        for dirpath, _, filenames in os.walk(tags_dir):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, tags_dir).replace(os.sep, "/")
+                sha = (read_text(path) or "").strip()
+                if len(sha) == 40:
+                    tags[name] = sha, None
+        self._tags = tags
+
+        return tags
+
+    def read_object(self, sha):
+        """Read object of repository.
+
+        :param sha: SHA of the object (hex or binary).
+        :type sha: str or bytes
+        :return: Type of the object and its content.
+        :rtype: tuple[bytes, bytes]
+        :raises ValueError: if object cannot be found or read.
+        """
+        if len(sha) == 20:
+            binary_sha = bytes(sha)
+            sha = binascii.hexlify(binary_sha).decode("ascii")
+        else:
+            binary_sha = binascii.unhexlify(sha)
+
+        for directory in self.object_dirs:
+            path = os.path.join(directory, sha[:2], sha[2:])
+            try:
+                with open(path, "rb") as fp:
+                    data = zlib.decompress(fp.read())
+            except (IOError, OSError):
+                continue
+            except zlib.error as exc:
+                raise ValueError("Cannot read object {0}: {1}".format(
+                    sha, exc))
+            header, _, content = data.partition(b"\0")
+            return header.split(b" ", 1)[0], content
+
+        for pack in self.packs:
+            offset = pack.find(binary_sha)
+            if offset is not None:
+                try:
+                    return pack.read(offset, self)
+                except (zlib.error, struct.error, IndexError) as exc:
+                    raise ValueError("Cannot read object {0}: {1}".format(
+                        sha, exc))
+
+        raise ValueError("Cannot find object {0}".format(sha))
+
+    def peel(self, sha):
+        """Resolve tag objects to the object they point to.
+
+        :param str sha: Hex SHA of the object.
+        :return: Hex SHA of the first object, which is not a tag, and
+            date of the outermost tag (``None`` if object is not a tag).
+        :rtype: tuple[str, int or None]
+        """
+        date = None
+
+        for _ in range(MAX_SYMREF_DEPTH):
+            kind, content = self.read_object(sha)
+            if kind != b"tag":
+                break
+            headers = parse_headers(content)
+            sha = headers[b"object"][0].decode("ascii")
+            if date is None:
+                date = get_date(headers.get(b"tagger"))
+
+        return sha, date
+
+    def get_commit(self, sha):
+        """Return parents and committer date of commit.
+
+        Commits listed in :file:`shallow` file have no parents.
+
+        :param str sha: Hex SHA of the commit.
+        :return: Parents (hex SHAs) and committer date.
+        :rtype: tuple[tuple[str], int]
+        :raises ValueError: if object is not a commit.
+        """
+        if sha in self._commits:
+            return self._commits[sha]
+
+        kind, content = self.read_object(sha)
+        if kind != b"commit":
+            raise ValueError("Object {0} is not a commit".format(sha))
+
+        headers = parse_headers(content)
+        parents = ()
+        if sha not in self.shallow:
+            parents = tuple(
+                parent.decode("ascii") for parent in headers.get(
+                    b"parent", ()))
+        commit = self._commits[sha] = (
+            parents, get_date(headers.get(b"committer")) or 0)
+
+        return commit
+
+    def get_tag_names(self, matcher="*"):
+        """Return names of tags for commits, like ``git describe`` does.
+
+        If commit has several tags, annotated tags are preferred, newer
+        annotated tags are preferred over older ones. Dates of tags are
+        read only in that case.
+
+        :param str matcher: Glob of tag names.
+        :return: Mapping of commit SHAs to tag names and flags if tags
+            are annotated.
+        :rtype: dict[str, tuple[str, bool]]
+        """
+        names = {}
+        dates = {}
+
+        def get_tag_date(sha):
+            if sha not in dates:
+                try:
+                    dates[sha] = self.peel(sha)[1] or 0
+                except ValueError:
+                    dates[sha] = 0
+            return dates[sha]
+
+        for name, (sha, peeled) in sorted(self.get_tags().items()):
+            if not fnmatch.fnmatchcase(name, matcher):
+                continue
+
+            if peeled is None:
+                try:
+                    peeled, date = self.peel(sha)
+                except ValueError:
+                    continue
+                if date is not None:
+                    dates[sha] = date
+            annotated = peeled != sha
+
+            current = names.get(peeled)
+            if current is None or (annotated and not current[1]) or (
+                    annotated and
+                    get_tag_date(sha) > get_tag_date(current[2])):
+                names[peeled] = name, annotated, sha
+
+        return {
+            sha: (name, annotated)
+            for sha, (name, annotated, _) in names.items()}
+
+    def describe(self, matcher="*", candidates=MAX_DESCRIBE_CANDIDATES,
+                 first_parent=False, max_commits=None):
+        """Find the nearest tag, like ``git describe --tags`` does.
+
+        If ``max_commits`` is set, no more than this number of commits
+        is visited. If tag cannot be chosen or distance cannot be
+        counted within them, ``None`` is returned: partial results are
+        never returned.
+
+        :param str matcher: Glob of tag names (like ``--match``).
+        :param int candidates: Number of candidate tags to consider
+            (like ``--candidates``).
+        :param bool first_parent: Follow only the first parent of merge
+            commits (like ``--first-parent``).
+        :param max_commits: Maximal number of commits to visit.
+        :type max_commits: int or None
+        :return: Name of the tag and number of commits since it or
+            ``None`` if nothing is found (or ``HEAD`` has no commits).
+        :rtype: tuple[str, int] or None
+        :raises ValueError: if repository cannot be read.
+        """
+        head = self.resolve("HEAD")
+        if head is None:
+            return None
+
+        tag_names = self.get_tag_names(matcher)
+        if head in tag_names:
+            return tag_names[head][0], 0
+        if candidates < 1:
+            return None
+
+        flags = {head: SEEN}
+        queue = CommitQueue(self)
+        queue.push(head)
+        matches = []
+        annotated = False
+        seen_commits = 0
+        gave_up_on = None
+
+        while queue:
+            if max_commits is not None and seen_commits >= max_commits:
+                logging.warning(
+                    "Tags cannot be described within %d commits",
+                    max_commits)
+                return None
+            sha = queue.pop()
+            seen_commits += 1
+
+            if sha in tag_names:
+                if len(matches) >= candidates:
+                    gave_up_on = sha
+                    break
+                flag = 1 << (len(matches) + 1)
+                matches.append([seen_commits - 1, len(matches), flag, sha])
+                flags[sha] |= flag
+                annotated = annotated or tag_names[sha][1]
+
+            for match in matches:
+                if not flags[sha] & match[2]:
+                    match[0] += 1
+
+            if annotated and not queue:
+                best_depth = min(match[0] for match in matches)
+                best_within = 0
+                for match in matches:
+                    if match[0] == best_depth:
+                        best_within |= match[2]
+                if flags[sha] & best_within == best_within:
+                    break
+
+            parents = self.get_commit(sha)[0]
+            if first_parent:
+                parents = parents[:1]
+            for parent in parents:
+                if not flags.get(parent, 0) & SEEN:
+                    queue.push(parent)
+                flags[parent] = flags.get(parent, 0) | flags[sha]
+
+        if not matches:
+            return None
+
+        best = min(matches)
+        if gave_up_on is not None:
+            queue.push(gave_up_on)
+        if max_commits is not None:
+            max_commits -= seen_commits
+        depth = self.finish_depth(
+            queue, flags, best[2], first_parent, max_commits)
+        if depth is None:
+            logging.warning(
+                "Distance to %s cannot be counted within %d commits",
+                tag_names[best[3]][0], seen_commits + max_commits)
+            return None
+
+        return tag_names[best[3]][0], best[0] + depth
+
+    def finish_depth(self, queue, flags, flag, first_parent,
+                     max_commits=None):
+        """Count remaining commits, not reachable from the best tag.
+
+        :param queue: Queue of commits to visit.
+        :type queue: :py:class:`CommitQueue`
+        :param dict flags: Flags of visited commits.
+        :param int flag: Flag of the best tag.
+        :param bool first_parent: Follow only the first parent.
+        :param max_commits: Maximal number of commits to visit.
+        :type max_commits: int or None
+        :return: Number of commits or ``None`` if they cannot be
+            counted within the limit.
+        :rtype: int or None
+        """
+        depth = 0
+
+        while queue:
+            if max_commits is not None:
+                if max_commits <= 0 and \
+                        not all(flags[item] & flag for item in queue):
+                    return None
+                max_commits -= 1
+            sha = queue.pop()
+            if flags[sha] & flag:
+                if all(flags[item] & flag for item in queue):
+                    break
+            else:
+                depth += 1
+
+            parents = self.get_commit(sha)[0]
+            if first_parent:
+                parents = parents[:1]
+            for parent in parents:
+                if not flags.get(parent, 0) & SEEN:
+                    queue.push(parent)
+                flags[parent] = flags.get(parent, 0) | flags[sha]
+
+        return depth
+
+    def count_commits(self, head, first_parent=False, max_commits=None):
+        """Count commits, reachable from head.
+
+        This is the same as ``git rev-list --count head``.
+
+        :param str head: Hex SHA of the commit.
+        :param bool first_parent: Follow only the first parent of merge
+            commits.
+        :param max_commits: Maximal number of commits to count.
+        :type max_commits: int or None
+        :return: Number of commits or ``None`` if there are more than
+            ``max_commits`` of them.
+        :rtype: int or None
+        :raises ValueError: if repository cannot be read.
+        """
+        seen = set([head])
+        stack = [head]
+
+        while stack:
+            if max_commits is not None and len(seen) > max_commits:
+                return None
+            parents = self.get_commit(stack.pop())[0]
+            if first_parent:
+                parents = parents[:1]
+            for parent in parents:
+                if parent not in seen:
+                    seen.add(parent)
+                    stack.append(parent)
+
+        if max_commits is not None and len(seen) > max_commits:
+            return None
+        return len(seen)
+
+    def get_new_commits(self, head, base):
+        """Return commits, reachable from head but not from base.
+
+        This is the same as ``git rev-list base..head``.
+
+        :param str head: Hex SHA of the newer commit.
+        :param str base: Hex SHA of the older commit.
+        :return: A list of hex SHAs or ``None`` if base is not an
+            ancestor of head.
+        :rtype: list[str] or None
+        :raises ValueError: if repository cannot be read.
+        """
+        flags = {head: INCLUDED}
+        flags[base] = flags[base] | EXCLUDED if base in flags else EXCLUDED
+        queue = CommitQueue(self)
+        queue.push(head)
+        if base != head:
+            queue.push(base)
+
+        while queue and not all(flags[sha] & EXCLUDED for sha in queue):
+            sha = queue.pop()
+            for parent in self.get_commit(sha)[0]:
+                parent_flags = flags.get(parent, 0) | flags[sha]
+                if flags.get(parent) != parent_flags:
+                    flags[parent] = parent_flags
+                    queue.push(parent)
+
+        if not flags[base] & INCLUDED:
+            return None
+
+        return [sha for sha, value in flags.items() if value == INCLUDED]
+
+    def abbreviate(self, sha):
+        """Return the shortest unique abbreviation of SHA.
+
+        Length is calculated like Git does: it depends on the number of
+        packed objects and it is never less than
+        :py:data:`DEFAULT_ABBREV`.
+
+        :param str sha: Hex SHA.
+        :return: Abbreviated SHA.
+        :rtype: str
+        """
+        count = sum(pack.count for pack in self.packs)
+        length = max(DEFAULT_ABBREV, (count.bit_length() + 1) // 2)
+        binary_sha = binascii.unhexlify(sha)
+
+        neighbours = []
+        for pack in self.packs:
+            neighbours.extend(pack.get_neighbours(binary_sha))
+        for directory in self.object_dirs:
+            try:
+                names = os.listdir(os.path.join(directory, sha[:2]))
+            except OSError:
+                continue
+            neighbours.extend(
+                binascii.unhexlify(sha[:2] + name) for name in names
+                if len(name) == 38 and sha[:2] + name != sha)
+
+        for neighbour in neighbours:
+            neighbour = binascii.hexlify(neighbour).decode("ascii")
+            common = 0
+            while common < len(sha) and sha[common] == neighbour[common]:
+                common += 1
+            length = max(length, common + 1)
+
+        return sha[:length]
+
+
+class CommitQueue(object):
+    """Queue of commits, ordered by committer date (newest first).
+
+    Commits with the same date are popped in order of insertion, like
+    in Git.
+
+    :param repository: Repository of commits.
+    :type repository: :py:class:`Repository`
+    """
+
+    __slots__ = "repository", "heap", "counter"
+
+    def __init__(self, repository):
+        self.repository = repository
+        self.heap = []
+        self.counter = 0
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __iter__(self):
+        return (item[2] for item in self.heap)
+
+    def push(self, sha):
+        """Add commit to the queue.
+
+        :param str sha: Hex SHA of the commit.
+        """
+        date = self.repository.get_commit(sha)[1]
+        heapq.heappush(self.heap, (-date, self.counter, sha))
+        self.counter += 1
+
+    def pop(self):
+        """Remove the newest commit from the queue.
+
+        :return: Hex SHA of the commit.
+        :rtype: str
+        """
+        return heapq.heappop(self.heap)[2]
+
+
+def find_toplevel(directory):
+    """Find top level directory of the working tree.
+
+    This is the same as ``git rev-parse --show-toplevel``, but without
+    ``git``.
+
+    :param str directory: Directory within working tree.
+    :return: Path to the top level directory or ``None`` if directory
+        is not within working tree.
+    :rtype: str or None
+    """
+    directory = os.path.abspath(directory)
+
+    while True:
+        if os.path.exists(os.path.join(directory, GIT_DIRECTORY_NAME)):
+            return directory
+
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
+def get_git_dirs(git_dir):
+    """Resolve Git directory and common directory of repository.
+
+    :file:`.git` of worktrees and submodules is a file which points to
+    the real Git directory. Worktrees share refs and objects with the
+    main repository (common directory).
+
+    :param str git_dir: Path to the :file:`.git` directory or file.
+    :return: Paths to the Git directory and the common directory.
+    :rtype: tuple[str, str]
+    :raises ValueError: if :file:`.git` file has incorrect format.
+    """
+    if os.path.isfile(git_dir):
+        git_dir = read_gitfile(git_dir)
+
+    common_dir = git_dir
+    commondir = read_text(os.path.join(git_dir, "commondir"))
+    if commondir:
+        common_dir = os.path.normpath(
+            os.path.join(git_dir, commondir.strip()))
+
+    return git_dir, common_dir
+
+
+def read_gitfile(path):
+    """Read path to the Git directory from :file:`.git` file.
+
+    :param str path: Path to the :file:`.git` file.
+    :return: Path to the Git directory.
+    :rtype: str
+    :raises ValueError: if file has incorrect format.
+    """
+    content = (read_text(path) or "").strip()
+    if not content.startswith("gitdir:"):
+        raise ValueError("Incorrect format of {0}".format(path))
+
+    return os.path.normpath(os.path.join(
+        os.path.dirname(path), content[7:].strip()))
+
+
+def get_object_dirs(objects_dir):
+    """Return object directory and its alternates.
+
+    :param str objects_dir: Path to the :file:`objects` directory.
+    :return: A list of object directories.
+    :rtype: list[str]
+    """
+    directories = [objects_dir]
+    alternates = read_text(os.path.join(objects_dir, "info", "alternates"))
+
+    for line in (alternates or "").splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            directories.append(
+                os.path.normpath(os.path.join(objects_dir, line)))
+
+    return directories
+
+
+def read_text(path):
+    """Read text file.
+
+    :param str path: Path to the file.
+    :return: Content of the file or ``None`` if it cannot be read.
+    :rtype: str or None
+    """
+    try:
+        with open(path, "rb") as fp:
+            return fp.read().decode("utf-8")
+    except (IOError, OSError, UnicodeError):
+        return None
+
+
+def map_file(path):
+    """Map file into memory.
+
+    :param str path: Path to the file.
+    :return: Memory mapped file.
+    :rtype: :py:class:`mmap.mmap`
+    :raises ValueError: if file cannot be mapped.
+    """
+    try:
+        with open(path, "rb") as fp:
+            return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    except (IOError, OSError, ValueError) as exc:
+        raise ValueError("Cannot map {0}: {1}".format(path, exc))
+
+
+def inflate(data, offset, size):
+    """Decompress zlib stream from the pack file.
+
+    :param data: Content of the pack file.
+    :type data: :py:class:`mmap.mmap`
+    :param int offset: Offset of the stream.
+    :param int size: Size of decompressed data.
+    :return: Decompressed data.
+    :rtype: bytes
+    :raises ValueError: if stream is broken.
+    """
+    decompressor = zlib.decompressobj()
+    chunk = max(size + 1024, 4096)
+    chunks = []
+    length = 0
+
+    while not decompressor.unused_data and length < size:
+        compressed = data[offset:offset + chunk]
+        if not compressed:
+            break
+        offset += len(compressed)
+        chunks.append(decompressor.decompress(compressed))
+        length += len(chunks[-1])
+    chunks.append(decompressor.flush())
+
+    content = b"".join(chunks)
+    if len(content) != size:
+        raise ValueError("Broken pack entry")
+
+    return content
+
+
+def apply_delta(base, delta):
+    """Apply delta to the base object.
+
+    :param bytes base: Content of the base object.
+    :param bytes delta: Delta.
+    :return: Content of the object.
+    :rtype: bytes
+    :raises ValueError: if delta is broken.
+    """
+    delta = bytearray(delta)
+    position = 0
+    sizes = []
+
+    for _ in range(2):
+        size = shift = 0
+        while True:
+            byte = delta[position]
+            position += 1
+            size |= (byte & 0x7f) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        sizes.append(size)
+
+    if sizes[0] != len(base):
+        raise ValueError("Base size does not match delta")
+
+    chunks = []
+    while position < len(delta):
+        opcode = delta[position]
+        position += 1
+
+        if opcode & 0x80:
+            offset = size = 0
+            for bit in range(4):
+                if opcode & (1 << bit):
+                    offset |= delta[position] << (8 * bit)
+                    position += 1
+            for bit in range(3):
+                if opcode & (1 << (4 + bit)):
+                    size |= delta[position] << (8 * bit)
+                    position += 1
+            chunks.append(base[offset:offset + (size or 0x10000)])
+        elif opcode:
+            chunks.append(bytes(delta[position:position + opcode]))
+            position += opcode
+        else:
+            raise ValueError("Unknown delta opcode")
+
+    content = b"".join(chunks)
+    if len(content) != sizes[1]:
+        raise ValueError("Result size does not match delta")
+
+    return content
+
+
+def parse_headers(content):
+    """Parse headers of commit or tag object.
+
+    :param bytes content: Content of the object.
+    :return: Mapping of header names to the lists of values.
+    :rtype: dict[bytes, list[bytes]]
+    """
+    headers = {}
+
+    for line in content.split(b"\n\n", 1)[0].split(b"\n"):
+        if not line or line.startswith(b" "):
+            continue
+        name, _, value = line.partition(b" ")
+        headers.setdefault(name, []).append(value)
+
+    return headers
+
+
+def get_date(values):
+    """Extract timestamp from ``committer`` or ``tagger`` header.
+
+    :param values: Values of the header.
+    :type values: list[bytes] or None
+    :return: Timestamp or ``None`` if header is absent or broken.
+    :rtype: int or None
+    """
+    if not values:
+        return None
+
+    try:
+        return int(values[0].rsplit(b" ", 2)[1])
+    except (IndexError, ValueError):
+        return None
@@ -12,13 +12,15 @@ import os
 import os.path
 import sys
 
-import pkg_resources
 import six
 
+import scd.cache
 import scd.config
+import scd.engine
 import scd.files
+import scd.git
 import scd.utils
-import scd.version
+import scd.walk
 
 try:
     import colorama
@@ -82,16 +84,32 @@ def main():
     OPTIONS = get_options()
     configure_logging()
     logging.debug("Options: %s", OPTIONS)
+    scd.config.STRICT_VALIDATION = OPTIONS.strict_validate
+    if OPTIONS.cache_size is not None:
+        scd.utils.configure_caches(OPTIONS.cache_size)
 
     if OPTIONS.own_version:
-        dist = pkg_resources.get_distribution("scd")
-        print(dist.version)
+        metadata = scd.utils.get_metadata_module()
+        print(metadata.version("scd"))
         return
 
+    try:
+        run()
+    finally:
+        if OPTIONS.stats:
+            print_cache_stats()
+            print_walk_stats()
+            print_vcs_stats()
+
+
+def run():
+    """Process files according to :py:data:`OPTIONS`."""
+
     config = scd.config.parse(
         guess_configfile(),
         OPTIONS.version_scheme,
         dict(OPTIONS.extra_context))
+    scd.files.TEMPLATES_PROJECT_DIRECTORY = config.project_directory
     logging.info("Version is %s", config.version.full)
 
     if OPTIONS.replace_version:
@@ -105,15 +123,21 @@ def main():
     if not scd.files.validate_access(all_files):
         logging.error("Cannot process all files, so nothing to do.")
 
-    for fileobj in all_files:
-        logging.info("Start to process %s", fileobj.path)
-        logging.debug("File object: %s", fileobj)
-        process_file(fileobj, config)
+    plan = make_plan(all_files, config)
+    if OPTIONS.jobs > 1:
+        process_files(plan, OPTIONS.jobs, OPTIONS.processes, OPTIONS.dry_run)
+    else:
+        for path, engine in plan:
+            process_path(path, engine, OPTIONS.dry_run)
 
 
 def get_options():
     """Return parsed commandline arguments.
 
+    On-disk cache is enabled here (unless ``--no-cache`` is set), so
+    version scheme is checked after that: names of version plugins are
+    taken from the cached index of entry points.
+
     :return: Parsed commandline arguments
     :rtype: :py:class:`argparse.Namespace`
     """
@@ -153,11 +177,45 @@ def get_options():
         nargs=argparse.ZERO_OR_MORE,
         default=[],
         help="groups to use for additional filtering.")
+    parser.add_argument(
+        "-j", "--jobs",
+        metavar="N",
+        type=argparse_positive_int,
+        default=1,
+        help="process files with N workers in parallel.")
+    parser.add_argument(
+        "--processes",
+        action="store_true",
+        default=False,
+        help="use processes instead of threads for parallel jobs.")
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        default=False,
+        help="do not use on-disk cache.")
+    parser.add_argument(
+        "--strict-validate",
+        action="store_true",
+        default=False,
+        help="always validate config, even if it is validated already.")
+    parser.add_argument(
+        "--cache-size",
+        metavar="N",
+        type=argparse_positive_int,
+        default=None,
+        help="maximal number of values in each in-memory cache.")
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        default=False,
+        help=("print statistics of caches, file walks and VCS discoveries "
+              "to stderr."))
     parser.add_argument(
         "-s", "--version-scheme",
+        metavar="SCHEME",
         default=None,
-        choices=sorted(scd.utils.get_version_plugins()),
-        help="override version-scheme from config.")
+        help="override version-scheme from config (name of installed "
+             "version plugin, e.g. semver or git_pep440).")
 
     verbosity = parser.add_mutually_exclusive_group()
     verbosity.add_argument(
@@ -179,7 +237,19 @@ def get_options():
             "Path to the files where to make version bumping. "
             "If nothing is set, all filenames in config will be used."))
 
-    return parser.parse_args()
+    options = parser.parse_args()
+    scd.cache.ENABLED = not options.no_cache
+
+    if options.version_scheme is not None:
+        plugin_names = scd.utils.get_version_plugin_names()
+        if options.version_scheme not in plugin_names:
+            parser.error(
+                "argument -s/--version-scheme: invalid choice: {0!r} "
+                "(choose from {1})".format(
+                    options.version_scheme,
+                    ", ".join(sorted(plugin_names))))
+
+    return options
 
 
 def argparse_extra_context_var(arg):
@@ -189,6 +259,181 @@ def argparse_extra_context_var(arg):
     return arg.split("=", 1)
 
 
+def argparse_positive_int(arg):
+    try:
+        number = int(arg)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError("should be positive integer.")
+    return number
+
+
+def print_cache_stats():
+    """Print statistics of in-memory caches to stderr."""
+    print("{0:<40} {1:>8} {2:>8} {3:>9} {4:>6} {5:>7}".format(
+        "cache", "hits", "misses", "evictions", "size", "maxsize"),
+        file=sys.stderr)
+    for stats in scd.utils.get_cache_stats():
+        print("{0.name:<40} {0.hits:>8} {0.misses:>8} {0.evictions:>9} "
+              "{0.size:>6} {0.maxsize:>7}".format(stats), file=sys.stderr)
+
+
+def print_walk_stats():
+    """Print statistics of walks over project directory to stderr."""
+    if not scd.walk.STATS:
+        return
+
+    print("{0:<40} {1:>11} {2:>8} {3:>9}".format(
+        "walk", "directories", "files", "seconds"), file=sys.stderr)
+    for stats in scd.walk.STATS:
+        print("{0.root:<40} {0.directories:>11} {0.files:>8} "
+              "{0.duration:>9.3f}".format(stats), file=sys.stderr)
+
+
+def print_vcs_stats():
+    """Print statistics of VCS discoveries to stderr."""
+    # scd.version is imported by entrypoints only if version is used.
+    version_module = sys.modules.get("scd.version")
+    if version_module is None or not version_module.STATS:
+        return
+
+    print("{0:<40} {1:>11} {2:>9}".format(
+        "vcs", "method", "seconds"), file=sys.stderr)
+    for stats in version_module.STATS:
+        print("{0.git_dir:<40} {0.method:>11} "
+              "{0.duration:>9.3f}".format(stats), file=sys.stderr)
+
+
+def make_plan(files, config):
+    """Make a plan of file processing.
+
+    Plan is built in advance so all patterns and replacements are
+    compiled and rendered before any file is processed. Workers get
+    plan and do not access config at all.
+
+    Search/replacements of files are cached (see
+    :py:meth:`scd.config.Config.save_plan`), so next run does not
+    need to render and analyze templates again.
+
+    :param files: Files to process.
+    :type files: :py:class:`scd.files.FileTable`
+    :param config: Parsed configuration.
+    :type config: :py:class:`scd.config.Config`
+    :return: A list of paths and engines to process them.
+    :rtype: list[tuple[str, :py:class:`scd.engine.Engine`]]
+    :raises ValueError: if there is no enough context to render
+        replacements.
+    """
+    plan = []
+    specs = dict(config.plan)
+    version = config.version
+
+    for position, (name, path) in enumerate(zip(files.names, files.paths)):
+        if name in specs:
+            logging.debug("Use cached plan for %s", path)
+            patterns = [
+                scd.files.SearchReplace.from_spec(spec)
+                for spec in specs[name]]
+        else:
+            fileobj = files[position]
+            logging.debug("File object: %s", fileobj)
+            patterns = fileobj.patterns
+            specs[name] = [sr.spec for sr in patterns]
+
+        plan.append((
+            path, scd.engine.Engine.from_patterns(patterns, version)))
+
+    if specs != config.plan:
+        config.save_plan(specs)
+
+    return plan
+
+
+def process_files(plan, jobs, processes, dry_run):
+    """Process files from plan in parallel.
+
+    The largest files are scheduled first. Logs of each file are
+    buffered and emitted in the same order as files are listed in
+    plan. If processing of some file fails, the first error (in plan
+    order) is raised.
+
+    :param plan: Plan, made by :py:func:`make_plan`.
+    :type plan: list[tuple[str, :py:class:`scd.engine.Engine`]]
+    :param int jobs: The number of workers.
+    :param bool processes: Use processes instead of threads.
+    :param bool dry_run: Do not save files.
+    """
+    tasks = [
+        (index, path, engine, dry_run)
+        for index, (path, engine) in enumerate(plan)]
+    tasks.sort(key=lambda task: get_size(task[1]), reverse=True)
+
+    # multiprocessing is slow to import and most runs do not need it.
+    import multiprocessing
+    import multiprocessing.pool
+
+    if processes:
+        pool = multiprocessing.Pool(
+            jobs,
+            initializer=initialize_worker,
+            initargs=(logging.getLogger().getEffectiveLevel(),))
+    else:
+        pool = multiprocessing.pool.ThreadPool(jobs)
+
+    try:
+        results = pool.map(process_task, tasks, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+    for _, records, exc in sorted(results, key=lambda result: result[0]):
+        scd.utils.replay_logs(records)
+        if exc is not None:
+            raise exc
+
+
+def initialize_worker(level):
+    """Initializer of worker processes for :py:func:`process_files`.
+
+    :param int level: Logging level to use.
+    """
+    logging.getLogger().setLevel(level)
+
+
+def process_task(task):
+    """Worker function of :py:func:`process_files`.
+
+    :param tuple task: Index of the file in plan, path, engine and
+        dry run flag.
+    :return: Index of the file in plan, log records and exception
+        (``None`` if everything is ok).
+    :rtype: tuple
+    """
+    index, path, engine, dry_run = task
+
+    with scd.utils.capture_logs() as records:
+        try:
+            process_path(path, engine, dry_run)
+        except Exception as exc:
+            return index, records, exc
+
+    return index, records, None
+
+
+def get_size(path):
+    """Return size of the file or 0 if it is not accessible.
+
+    :param str path: Path to the file.
+    :return: Size of the file in bytes.
+    :rtype: int
+    """
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
 def process_file(fileobj, config):
     """Function, which is responsible for processing of file.
 
@@ -197,25 +442,35 @@ def process_file(fileobj, config):
     :param config: Parsed configuration.
     :type config: :py:class:`scd.config.Config`
     """
-    need_to_save = False
-    file_result = []
-
-    with open(fileobj.path, "rt") as filefp:
-        for line in filefp:
-            original_line = line
-            for sr in fileobj.patterns:
-                line = sr.process(config.version, line)
-            if original_line != line:
-                need_to_save = True
-            if not OPTIONS.dry_run:
-                file_result.append(line)
-
-    if not OPTIONS.dry_run and need_to_save:
-        logging.debug("Need to save %s", fileobj.path)
-        with open(fileobj.path, "wt") as filefp:
-            filefp.writelines(file_result)
+    engine = scd.engine.Engine.from_patterns(fileobj.patterns, config.version)
+    process_path(fileobj.path, engine, OPTIONS.dry_run)
+
+
+def process_path(path, engine, dry_run):
+    """Function, which processes file with given engine.
+
+    :param str path: Path to the file.
+    :param engine: Engine to process file with.
+    :type engine: :py:class:`scd.engine.Engine`
+    :param bool dry_run: Do not save file.
+    :return: Was file changed or not (even if it was not saved).
+    :rtype: bool
+    """
+    logging.info("Start to process %s", path)
+    logging.debug("Engine: %s", engine)
+
+    if engine.can_map(path):
+        logging.debug("Process %s in mapped mode", path)
+        need_to_save = scd.engine.process_mapped_file(engine, path, dry_run)
+    else:
+        need_to_save = scd.engine.process_text_file(engine, path, dry_run)
+
+    if not dry_run and need_to_save:
+        logging.debug("Saved %s", path)
     else:
-        logging.debug("No need to save %s", fileobj.path)
+        logging.debug("No need to save %s", path)
+
+    return need_to_save
 
 
 def guess_configfile():
@@ -230,9 +485,9 @@ def guess_configfile():
 
     config = search_config_in_directory(os.getcwd())
     if not config:
-        result = scd.utils.execute(["git", "rev-parse", "--show-toplevel"])
-        if result["code"] == os.EX_OK:
-            config = search_config_in_directory(result["stdout"][0])
+        toplevel = scd.git.find_toplevel(os.getcwd())
+        if toplevel is not None:
+            config = search_config_in_directory(toplevel)
 
     if not config:
         raise ValueError("Cannot find configfile.")
@@ -6,47 +6,251 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import unicode_literals
 
-import functools
+import collections
+import contextlib
+import importlib
 import logging
 import os
+import os.path
+import re
+import shutil
 import subprocess
+import sys
+import tempfile
+import threading
+import weakref
 
-import pkg_resources
 import six
 
 
 VERSION_PLUGIN_NAMESPACE = "scd.version"
 """Entrypoint namespace for version plugins."""
 
+ENTRY_POINT_REFERENCE_REGEXP = re.compile(
+    r"^\s*(?P<module>[\w.]+)\s*(?::\s*(?P<attr>[\w.]+))?", re.UNICODE)
+"""Regular expression to parse entrypoint object reference."""
 
-if six.PY34:
-    lru_cache = functools.lru_cache
-else:
-    def lru_cache(*args, **kwargs):
-        """Implementation of LRU cache.
+LOG_BUFFER = threading.local()
+"""Thread local storage for buffered log records."""
+
+CACHE_SIZE = 1024
+"""Default maximal number of values in each cache (see :py:func:`lru_cache`).
+"""
+
+CACHES = weakref.WeakSet()
+"""All caches, created by :py:func:`lru_cache`."""
+
+KWARGS_MARKER = object()
+"""Separator of positional and keyword arguments in cache keys."""
+
+
+CacheStats = collections.namedtuple(
+    "CacheStats", ["name", "hits", "misses", "evictions", "size", "maxsize"])
+"""Statistics of :py:class:`LRUCache`.
 
-        This is a simple fallback implementation of such cache for
-        Python 2.7, in 3.3 and later :py:func:`functools.lru_cache` is
-        used instead.
+:param str name: Name of the cache (name of cached function).
+:param int hits: How many times value was taken from cache.
+:param int misses: How many times value was calculated.
+:param int evictions: How many values were evicted because cache was
+    full.
+:param int size: Current number of values in cache.
+:param int maxsize: Maximal number of values in cache.
+"""
+
+
+class LRUCache(object):
+    """Bounded LRU cache with statistics.
+
+    All caches of scd are instances of this class (see
+    :py:func:`lru_cache`), so they could be resized, cleared and
+    inspected at once. It is safe to use from several threads.
+
+    :param str name: Name of the cache.
+    :param int maxsize: Maximal number of values in cache.
+    """
+
+    def __init__(self, name, maxsize):
+        self.name = name
+        self.maxsize = maxsize
+        self.values = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key, func):
+        """Return cached value or calculate it with ``func``.
+
+        :param key: Key of the value.
+        :param callable func: Function to calculate value if it is not
+            cached.
+        :return: Value.
+        """
+        with self.lock:
+            if key in self.values:
+                self.hits += 1
+                value = self.values.pop(key)
+                self.values[key] = value
+                return value
+            self.misses += 1
+
+        value = func()
+        with self.lock:
+            value = self.values.setdefault(key, value)
+            self.shrink()
+
+        return value
+
+    def resize(self, maxsize):
+        """Change maximal size of the cache.
+
+        :param int maxsize: New maximal number of values in cache.
         """
-        cache = {}
+        with self.lock:
+            self.maxsize = maxsize
+            self.shrink()
 
-        def outer_decorator(func):
-            @six.wraps(func)
-            def inner_decorator(*fargs, **fkwargs):
-                key = "\x00".join(
-                    six.text_type(hash(farg)) for farg in fargs)
-                key += "\x00".join(
-                    six.text_type(k) + "\x00" + six.text_type(hash(v))
-                    for k, v in sorted(fkwargs.items()))
-                if key in cache:
-                    return cache[key]
+    def shrink(self):
+        while len(self.values) > self.maxsize:
+            self.values.popitem(last=False)
+            self.evictions += 1
 
-                cache[key] = func(*fargs, **fkwargs)
-                return cache[key]
+    def clear(self):
+        """Remove all values from cache and reset statistics."""
+        with self.lock:
+            self.values.clear()
+            self.hits = self.misses = self.evictions = 0
 
-            return inner_decorator
-        return outer_decorator
+    @property
+    def stats(self):
+        """Statistics of the cache.
+
+        :return: Statistics
+        :rtype: :py:class:`CacheStats`
+        """
+        with self.lock:
+            return CacheStats(self.name, self.hits, self.misses,
+                              self.evictions, len(self.values), self.maxsize)
+
+
+def lru_cache(maxsize=None):
+    """Decorator which caches results of the function.
+
+    This is similar to :py:func:`functools.lru_cache`, but cache is
+    :py:class:`LRUCache`, which is registered in :py:data:`CACHES`.
+    Decorated function has ``cache`` attribute and ``cache_clear``
+    method.
+
+    :param int maxsize: Maximal number of cached values. By default,
+        :py:data:`CACHE_SIZE` is used.
+    """
+    def decorator(func):
+        cache = LRUCache(
+            "{0}.{1}".format(func.__module__, func.__name__),
+            CACHE_SIZE if maxsize is None else maxsize)
+        CACHES.add(cache)
+
+        @six.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = args
+            if kwargs:
+                key += (KWARGS_MARKER,) + tuple(sorted(kwargs.items()))
+            return cache.get(key, lambda: func(*args, **kwargs))
+
+        wrapper.cache = cache
+        wrapper.cache_clear = cache.clear
+
+        return wrapper
+
+    return decorator
+
+
+def configure_caches(maxsize):
+    """Set maximal size of all caches.
+
+    :param int maxsize: Maximal number of values in each cache.
+    """
+    global CACHE_SIZE
+
+    CACHE_SIZE = maxsize
+    for cache in list(CACHES):
+        cache.resize(maxsize)
+
+
+def clear_caches():
+    """Remove all values from all caches."""
+    for cache in list(CACHES):
+        cache.clear()
+
+
+def get_cache_stats():
+    """Return statistics of all caches.
+
+    :return: A list of statistics, sorted by cache name.
+    :rtype: list[:py:class:`CacheStats`]
+    """
+    return sorted(cache.stats for cache in list(CACHES))
+
+
+def get_vcs_state(directory):
+    """Fingerprint of VCS state of the repository.
+
+    It does not execute any commands and does not look into each ref:
+    content of ``HEAD`` and of the branch it points to, state of
+    :file:`packed-refs` and :file:`shallow` files and modification
+    times of directories with loose tags (they are changed when tag is
+    created, moved or removed) are enough. This is cheap enough to do
+    on each access to the version.
+
+    Repository is found like Git does it (see
+    :py:func:`scd.git.find_toplevel`), :file:`.git` files of worktrees
+    and submodules are resolved.
+
+    :param str directory: Path to the directory of the project.
+    :return: State of VCS files.
+    :rtype: tuple
+    """
+    import scd.git
+
+    toplevel = scd.git.find_toplevel(directory) or directory
+    try:
+        git_dir, common_dir = scd.git.get_git_dirs(
+            os.path.join(toplevel, scd.git.GIT_DIRECTORY_NAME))
+    except ValueError:
+        return (toplevel,)
+
+    head = scd.git.read_text(os.path.join(git_dir, "HEAD"))
+    head = (head or "").strip()
+    ref = None
+    if head.startswith("ref:"):
+        ref = scd.git.read_text(
+            os.path.join(common_dir, *head[4:].strip().split("/")))
+
+    state = [toplevel, head, ref]
+    for path in (os.path.join(common_dir, "packed-refs"),
+                 os.path.join(common_dir, "shallow")):
+        state.append(get_stat_state(path))
+
+    tags_dir = os.path.join(common_dir, "refs", "tags")
+    for root, dirnames, _ in os.walk(tags_dir):
+        dirnames.sort()
+        state.append((root, get_stat_state(root)))
+
+    return tuple(state)
+
+
+def get_stat_state(path):
+    """State of the file or directory which changes when it is modified.
+
+    :param str path: Path to the file or directory.
+    :return: Inode, modification time and size (all ``None`` if there
+        is no such file).
+    :rtype: tuple
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None, None, None
+
+    return stat.st_ino, stat.st_mtime, stat.st_size
 
 
 def execute(command):
@@ -98,7 +302,285 @@ def execute(command):
         "stderr": stderr.split("\n")}
 
 
+class AtomicWriter(object):
+    """Writer which replaces file atomically.
+
+    Content is streamed into temporary file in the same directory as
+    target. Temporary file is created on the first write, so if
+    nothing is written, target is not touched at all. On successful
+    exit from context manager, temporary file is synced to disk and
+    atomically replaces target (with the same permissions, if target
+    exists). If exception happens, temporary file is removed.
+
+    .. code-block:: python
+
+        with AtomicWriter("setup.py", "wt") as writer:
+            writer.write("content")
+
+    :param str path: Path to the file to replace.
+    :param str mode: Mode to open temporary file with (``wt`` or
+        ``wb``).
+    """
+
+    __slots__ = "path", "mode", "temp_path", "fileobj"
+
+    def __init__(self, path, mode):
+        self.path = os.path.realpath(path)
+        self.mode = mode
+        self.temp_path = None
+        self.fileobj = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+
+    def write(self, data):
+        """Write data into temporary file.
+
+        :param data: Data to write.
+        :type data: str or bytes
+        """
+        if self.fileobj is None:
+            self.open()
+        self.fileobj.write(data)
+
+    def open(self):
+        """Create temporary file."""
+        dirname, basename = os.path.split(self.path)
+        descriptor, self.temp_path = tempfile.mkstemp(
+            prefix="." + basename + ".", suffix=".scd", dir=dirname)
+        self.fileobj = os.fdopen(descriptor, self.mode)
+        logging.debug("Write %s into %s", self.path, self.temp_path)
+
+    def commit(self):
+        """Replace target with temporary file (if anything was written)."""
+        if self.fileobj is None:
+            return
+
+        try:
+            self.fileobj.flush()
+            os.fsync(self.fileobj.fileno())
+            self.fileobj.close()
+            if os.path.exists(self.path):
+                shutil.copymode(self.path, self.temp_path)
+            replace_file(self.temp_path, self.path)
+        except Exception:
+            self.discard()
+            raise
+        finally:
+            self.fileobj = None
+
+    def discard(self):
+        """Remove temporary file."""
+        if self.fileobj is not None:
+            self.fileobj.close()
+            self.fileobj = None
+
+        if self.temp_path is not None and os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+            logging.debug("Remove %s", self.temp_path)
+
+
+if hasattr(os, "replace"):
+    replace_file = os.replace
+else:
+    replace_file = os.rename
+
+
+class LogBufferFilter(logging.Filter):
+    """Logging filter which buffers records of :py:func:`capture_logs`.
+
+    Records are buffered only for the thread which activates capturing,
+    all other threads log as usual.
+    """
+
+    def filter(self, record):
+        records = getattr(LOG_BUFFER, "records", None)
+        if records is None:
+            return True
+
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info)
+            record.exc_info = None
+        record.msg = record.getMessage()
+        record.args = None
+        records.append(record)
+
+        return False
+
+
+@contextlib.contextmanager
+def capture_logs():
+    """Context manager which buffers log records of the current thread.
+
+    This is useful if work is done in parallel, but logs should be
+    emitted in deterministic order. Buffered records can be sent to
+    another process and emitted with :py:func:`replay_logs`.
+
+    :return: A list where records are collected.
+    :rtype: list[:py:class:`logging.LogRecord`]
+    """
+    root = logging.getLogger()
+    if not any(isinstance(flt, LogBufferFilter) for flt in root.filters):
+        root.addFilter(LogBufferFilter())
+
+    LOG_BUFFER.records = []
+    try:
+        yield LOG_BUFFER.records
+    finally:
+        LOG_BUFFER.records = None
+
+
+def replay_logs(records):
+    """Emit log records, collected by :py:func:`capture_logs`.
+
+    :param records: Records to emit.
+    :type records: list[:py:class:`logging.LogRecord`]
+    """
+    root = logging.getLogger()
+    for record in records:
+        root.handle(record)
+
+
+EntryPoint = collections.namedtuple(
+    "EntryPoint", ["name", "reference", "distribution"])
+"""Entrypoint from the index (see :py:func:`get_entry_points`).
+
+:param str name: Name of the entrypoint.
+:param str reference: Object reference, like ``package.module:Class``.
+:param str distribution: Name and version of the distribution, which
+    provides entrypoint.
+"""
+
+
 @lru_cache()
+def get_entry_points(namespace):
+    """Index of entrypoints in given namespace.
+
+    Scanning metadata of all installed distributions is slow in large
+    virtualenvs, so index is stored in user cache (see
+    :py:mod:`scd.cache`). It is invalidated if any directory in
+    :py:data:`sys.path` is changed (i.e. some distribution is
+    installed or removed).
+
+    :param str namespace: The name of namespace to use.
+    :return: Mapping of entrypoint names to entrypoints.
+    :rtype: dict[str, :py:class:`EntryPoint`]
+    """
+    import scd.cache
+
+    key = scd.cache.make_key(namespace, sys.executable, get_path_state())
+    index = scd.cache.load(None, "entry_points", key)
+    if index is None:
+        index = collect_entry_points(namespace)
+        scd.cache.save(None, "entry_points", key, index)
+
+    return {
+        name: EntryPoint(name, reference, distribution)
+        for name, (reference, distribution) in index.items()}
+
+
+def collect_entry_points(namespace):
+    """Collect entrypoints in given namespace from installed distributions.
+
+    If the same entrypoint is provided by several distributions, the
+    first one in :py:data:`sys.path` wins.
+
+    :param str namespace: The name of namespace to use.
+    :return: Mapping of entrypoint names to pairs of object reference
+        and distribution.
+    :rtype: dict[str, list[str]]
+    """
+    metadata = get_metadata_module()
+    index = {}
+
+    for dist in metadata.distributions():
+        distribution = "{0} {1}".format(dist.metadata["Name"], dist.version)
+        for entry_point in dist.entry_points:
+            if entry_point.group == namespace:
+                index.setdefault(
+                    entry_point.name, [entry_point.value, distribution])
+
+    return index
+
+
+def get_path_state():
+    """State of :py:data:`sys.path` directories.
+
+    :return: A list of paths and their modification times (``None`` if
+        path is absent).
+    :rtype: list[list]
+    """
+    state = []
+
+    for path in sys.path:
+        try:
+            mtime = os.stat(path or os.curdir).st_mtime
+        except OSError:
+            mtime = None
+        state.append([path, mtime])
+
+    return state
+
+
+def get_metadata_module():
+    """Return module to access distribution metadata.
+
+    This is :py:mod:`importlib.metadata` or its backport for old
+    Pythons.
+    """
+    try:
+        import importlib.metadata as importlib_metadata
+    except ImportError:
+        import importlib_metadata
+
+    return importlib_metadata
+
+
+def load_reference(reference):
+    """Import object by entrypoint reference.
+
+    :param str reference: Object reference, like
+        ``package.module:Class`` (extras are ignored).
+    :return: Imported object.
+    :raises ValueError: if reference is not valid.
+    """
+    matcher = ENTRY_POINT_REFERENCE_REGEXP.match(reference)
+    if not matcher:
+        raise ValueError("Incorrect object reference {0}".format(reference))
+
+    obj = importlib.import_module(matcher.group("module"))
+    for attr in (matcher.group("attr") or "").split("."):
+        if attr:
+            obj = getattr(obj, attr)
+
+    return obj
+
+
+@lru_cache()
+def get_plugin(namespace, name):
+    """Load plugin by its name.
+
+    Only module of this plugin is imported.
+
+    :param str namespace: The name of namespace to use.
+    :param str name: The name of plugin.
+    :return: Loaded plugin.
+    :raises ValueError: if there is no such plugin.
+    """
+    entry_points = get_entry_points(namespace)
+    if name not in entry_points:
+        raise ValueError("Unknown plugin {0} in {1}".format(name, namespace))
+
+    return load_reference(entry_points[name].reference)
+
+
 def get_plugins(namespace):
     """A mapping of plugins (loaded) in given namespace.
 
@@ -106,14 +588,50 @@ def get_plugins(namespace):
     :return: Mapping for plugins (key is the name and value is loaded plugin).
     :rtype: dict
     """
-    plugins = {}
+    return {
+        name: get_plugin(namespace, name)
+        for name in get_entry_points(namespace)}
+
+
+@lru_cache()
+def get_plugin_versions(namespace):
+    """A list of distributions, which provide plugins in given namespace.
+
+    This is useful to know if some plugin is updated.
+
+    :param str namespace: The name of namespace to use.
+    :return: Sorted list of plugin names and versions of their
+        distributions.
+    :rtype: list[str]
+    """
+    return sorted(
+        "{0}={1}".format(entry_point.name, entry_point.distribution)
+        for entry_point in get_entry_points(namespace).values())
+
 
-    for plugin in pkg_resources.iter_entry_points(namespace):
-        plugins[plugin.name] = plugin.load()
+def get_plugin_names(namespace):
+    """A set of plugin names in given namespace.
 
-    return plugins
+    Plugins are not loaded, so this is cheaper than
+    :py:func:`get_plugins`.
+
+    :param str namespace: The name of namespace to use.
+    :return: Names of plugins.
+    :rtype: frozenset[str]
+    """
+    return frozenset(get_entry_points(namespace))
 
 
 def get_version_plugins():
     """A mapping of scd version plugins."""
     return get_plugins(VERSION_PLUGIN_NAMESPACE)
+
+
+def get_version_plugin(name):
+    """Load scd version plugin by its name."""
+    return get_plugin(VERSION_PLUGIN_NAMESPACE, name)
+
+
+def get_version_plugin_names():
+    """A set of scd version plugin names."""
+    return get_plugin_names(VERSION_PLUGIN_NAMESPACE)
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""Compiled validator of JSON schemas.
+
+:py:mod:`jsonschema` interprets schema on each validation: it walks
+schema and instance together, creates error objects for each failed
+branch of ``oneOf``/``anyOf`` etc. This is really slow if config has
+thousands of files.
+
+This module compiles schema into a tree of closures which only answer
+the question if instance is valid or not. Errors are not collected at
+all: if instance is invalid, :py:mod:`jsonschema` should be used to get
+human-readable messages. Since configs are valid almost always, this
+is much faster in practice.
+
+Only a subset of `Draft V4
+<https://tools.ietf.org/html/draft-wright-json-schema-00>`_ keywords is
+supported (enough for config schema), :py:func:`compile_schema` raises
+:py:exc:`ValueError` if schema uses something else.
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import numbers
+
+import six
+
+
+TYPE_CHECKERS = {
+    "array": lambda instance: isinstance(instance, list),
+    "boolean": lambda instance: isinstance(instance, bool),
+    "integer": lambda instance: (
+        isinstance(instance, six.integer_types) and
+        not isinstance(instance, bool)),
+    "null": lambda instance: instance is None,
+    "number": lambda instance: (
+        isinstance(instance, numbers.Number) and
+        not isinstance(instance, bool)),
+    "object": lambda instance: isinstance(instance, dict),
+    "string": lambda instance: isinstance(instance, six.string_types)
+}
+"""A mapping of JSON types to functions which check Python values."""
+
+ANNOTATION_KEYWORDS = frozenset((
+    "$schema", "id", "title", "description", "default"))
+"""Keywords which do not affect validation."""
+
+
+def compile_schema(schema):
+    """Compile JSON schema into validation function.
+
+    :param dict schema: JSON schema to compile.
+    :return: Function which accepts instance and returns ``True`` if
+        it is valid, ``False`` otherwise.
+    :rtype: callable
+    :raises ValueError: if schema uses unsupported keywords.
+    """
+    if not isinstance(schema, dict):
+        raise ValueError("Schema should be an object, got {0!r}".format(
+            schema))
+
+    checks = []
+    for keyword in sorted(schema, key=lambda item: item != "type"):
+        if keyword in ANNOTATION_KEYWORDS:
+            continue
+        if keyword not in KEYWORD_COMPILERS:
+            raise ValueError("Unsupported keyword {0}".format(keyword))
+
+        check = KEYWORD_COMPILERS[keyword](schema[keyword], schema)
+        if check is not None:
+            checks.append(check)
+
+    if not checks:
+        return lambda instance: True
+    if len(checks) == 1:
+        return checks[0]
+
+    def check_all(instance):
+        for check in checks:
+            if not check(instance):
+                return False
+        return True
+
+    return check_all
+
+
+def compile_type(types, schema):
+    if isinstance(types, six.string_types):
+        types = [types]
+
+    unknown_types = set(types) - set(TYPE_CHECKERS)
+    if unknown_types:
+        raise ValueError("Unsupported types {0}".format(
+            sorted(unknown_types)))
+
+    checkers = [TYPE_CHECKERS[name] for name in types]
+    if len(checkers) == 1:
+        return checkers[0]
+
+    return lambda instance: any(checker(instance) for checker in checkers)
+
+
+def compile_enum(enum, schema):
+    return lambda instance: instance in enum
+
+
+def compile_required(required, schema):
+    def check(instance):
+        if not isinstance(instance, dict):
+            return True
+        for name in required:
+            if name not in instance:
+                return False
+        return True
+
+    return check
+
+
+def compile_properties(properties, schema):
+    compiled = [
+        (name, compile_schema(subschema))
+        for name, subschema in sorted(properties.items())]
+
+    def check(instance):
+        if not isinstance(instance, dict):
+            return True
+        for name, subcheck in compiled:
+            if name in instance and not subcheck(instance[name]):
+                return False
+        return True
+
+    return check
+
+
+def compile_additional_properties(additional, schema):
+    known = frozenset(schema.get("properties", ()))
+
+    if additional is True:
+        return None
+    if additional is False:
+        return lambda instance: (
+            not isinstance(instance, dict) or not (set(instance) - known))
+
+    subcheck = compile_schema(additional)
+
+    def check(instance):
+        if not isinstance(instance, dict):
+            return True
+        for name, value in instance.items():
+            if name not in known and not subcheck(value):
+                return False
+        return True
+
+    return check
+
+
+def compile_items(items, schema):
+    if not isinstance(items, dict):
+        raise ValueError("Only single schema for items is supported")
+
+    subcheck = compile_schema(items)
+
+    def check(instance):
+        if not isinstance(instance, list):
+            return True
+        for item in instance:
+            if not subcheck(item):
+                return False
+        return True
+
+    return check
+
+
+def compile_one_of(subschemas, schema):
+    subchecks = [compile_schema(subschema) for subschema in subschemas]
+
+    def check(instance):
+        matched = False
+        for subcheck in subchecks:
+            if subcheck(instance):
+                if matched:
+                    return False
+                matched = True
+        return matched
+
+    return check
+
+
+def compile_any_of(subschemas, schema):
+    subchecks = [compile_schema(subschema) for subschema in subschemas]
+
+    return lambda instance: any(subcheck(instance) for subcheck in subchecks)
+
+
+def compile_not(subschema, schema):
+    subcheck = compile_schema(subschema)
+
+    return lambda instance: not subcheck(instance)
+
+
+def compile_minimum(minimum, schema):
+    if schema.get("exclusiveMinimum", False):
+        return lambda instance: (
+            not TYPE_CHECKERS["number"](instance) or instance > minimum)
+
+    return lambda instance: (
+        not TYPE_CHECKERS["number"](instance) or instance >= minimum)
+
+
+def compile_maximum(maximum, schema):
+    if schema.get("exclusiveMaximum", False):
+        return lambda instance: (
+            not TYPE_CHECKERS["number"](instance) or instance < maximum)
+
+    return lambda instance: (
+        not TYPE_CHECKERS["number"](instance) or instance <= maximum)
+
+
+def compile_exclusive_limit(exclusive, schema):
+    return None
+
+
+def compile_multiple_of(multiple, schema):
+    def check(instance):
+        if not TYPE_CHECKERS["number"](instance):
+            return True
+        if isinstance(multiple, float):
+            quotient = instance / multiple
+            return int(quotient) == quotient
+        return not instance % multiple
+
+    return check
+
+
+KEYWORD_COMPILERS = {
+    "additionalProperties": compile_additional_properties,
+    "anyOf": compile_any_of,
+    "enum": compile_enum,
+    "exclusiveMaximum": compile_exclusive_limit,
+    "exclusiveMinimum": compile_exclusive_limit,
+    "items": compile_items,
+    "maximum": compile_maximum,
+    "minimum": compile_minimum,
+    "multipleOf": compile_multiple_of,
+    "not": compile_not,
+    "oneOf": compile_one_of,
+    "properties": compile_properties,
+    "required": compile_required,
+    "type": compile_type
+}
+"""A mapping of supported schema keywords to their compilers.
+
+Each compiler accepts keyword value and the whole (sub)schema and
+returns a check function or ``None`` if nothing should be checked.
+"""
@@ -18,6 +18,12 @@ Currently, it ``scd.version`` has following defined entrypoints:
 +------------+-----------------------+
 | git_semver | :py:class:`GitSemVer` |
 +------------+-----------------------+
+
+Template context of the version is lazy (see :py:class:`Context`).
+Plugins declare names of context variables in
+:py:attr:`Version.CHEAP_CONTEXT_KEYS` and
+:py:attr:`Version.EXPENSIVE_CONTEXT_KEYS`, and values are calculated
+only if some template requires them.
 """
 
 
@@ -26,42 +32,68 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import abc
+import collections
 import logging
 import os
 import os.path
 import re
+import time
 
 import packaging.version
 import semver
 import six
 
+import scd.cache
+import scd.git
 import scd.utils
 
 try:
-    from collections.abc import Hashable
+    from collections.abc import Hashable, Mapping
 except ImportError:
-    from collections import Hashable
+    from collections import Hashable, Mapping
+
+
+DEFAULT_DESCRIBE_OPTIONS = {
+    "candidates": scd.git.MAX_DESCRIBE_CANDIDATES,
+    "first_parent": False,
+    "max_commits": None,
+    "shallow": "fail"
+}
+"""Default options of ``describe`` in ``version`` section of config."""
+
+STATS = []
+"""A list of :py:class:`VCSStats` of discoveries, made within this run."""
+
+VCSStats = collections.namedtuple(
+    "VCSStats", ["git_dir", "method", "duration"])
+"""Statistics of a single VCS discovery.
+
+:param str git_dir: Path to the :file:`.git` directory of repository.
+:param str method: How result was obtained: ``cache`` (on-disk cache),
+    ``incremental`` (cached result is updated with new commits),
+    ``describe`` (repository is read in-process) or ``git`` (``git``
+    is executed).
+:param float duration: Duration of the discovery in seconds.
+"""
 
 
 class GitMixin(Hashable):
     """Mixin to add Git flavor for :py:class:`Version` classes."""
 
+    DEPENDS_ON_VCS = True
+
     def __init__(self, *args, **kwargs):
         git_dir = os.path.join(self._config.project_directory, ".git")
         git_matcher = self._config.raw["version"].get("tag_glob", "v*")
-        self.distance = git_distance(git_dir, git_matcher)
-        if self.distance == 0:
-            self.tag = ""
-        else:
-            self.tag = git_tag(git_dir)
+        git_options = self._config.raw["version"].get("describe", {})
+        self.distance, self.tag = git_metadata(
+            git_dir, git_matcher, git_options)
 
-    def __hash__(self):
-        return hash("|".join([
-            self.__class__.__name__,
-            six.text_type(self.base_number),
-            six.text_type(self.distance),
-            six.text_type(self.tag)
-        ]))
+    def get_digest_parts(self):
+        parts = super(GitMixin, self).get_digest_parts()
+        parts.extend([self.distance, self.tag])
+
+        return parts
 
 
 @six.python_2_unicode_compatible
@@ -83,20 +115,74 @@ class Version(Hashable):
     Each subclass has it's own regexp.
     """
 
+    CHEAP_CONTEXT_KEYS = frozenset(["base"])
+    """Names of context variables which are cheap to calculate.
+
+    Each name is an attribute of the instance, its value is calculated
+    each time when template requires it.
+    """
+
+    EXPENSIVE_CONTEXT_KEYS = frozenset(["full"])
+    """Names of context variables which are expensive to calculate.
+
+    Each name is an attribute of the instance, its value is calculated
+    only once, when some template requires it.
+    """
+
+    DEPENDS_ON_VCS = False
+    """Does version depend on the state of VCS or not.
+
+    Versions of such classes are recreated if state of repository is
+    changed (see :py:func:`scd.utils.get_vcs_state`).
+    """
+
     def __init__(self, config):
         self.base_number = six.text_type(config.version_number)
         self._config = config
+        self._context = Context(self, config.extra_context)
+        self._digest = None
 
     def __hash__(self):
-        return hash("|".join([
-            self.__class__.__name__,
-            six.text_type(self.base_number)
-        ]))
+        return hash(self.digest)
+
+    def __eq__(self, other):
+        return isinstance(other, Version) and self.digest == other.digest
+
+    def __ne__(self, other):
+        return not self == other
 
     def __str__(self):
         return "<{0.__class__.__name__}(base_number={0.base_number})>".format(
             self.base_number)
 
+    @property
+    def digest(self):
+        """Canonical digest of the version.
+
+        It depends on the class, config (see
+        :py:attr:`scd.config.Config.digest`) and, for VCS flavored
+        versions, state of repository. Equal versions have the same
+        digests.
+
+        :return: Hex digest.
+        :rtype: str
+        """
+        if self._digest is None:
+            self._digest = scd.cache.make_key(*self.get_digest_parts())
+
+        return self._digest
+
+    def get_digest_parts(self):
+        """Return a list of values which identify version.
+
+        Subclasses which have other sources of version (e.g. VCS)
+        should extend this list.
+
+        :return: A list of JSON serializable values.
+        :rtype: list
+        """
+        return [self.__class__.__name__, self._config.digest]
+
     @property
     def base(self):
         """Base number from config. Literally, as defined there.
@@ -117,14 +203,17 @@ class Version(Hashable):
         raise NotImplementedError()
 
     @property
-    @abc.abstractmethod
     def context(self):
         """Context for :py:class:`jinja2.Template`.
 
+        Context is lazy: variables (see :py:attr:`CHEAP_CONTEXT_KEYS`
+        and :py:attr:`EXPENSIVE_CONTEXT_KEYS`) are calculated only if
+        they are requested. Extra context from config overrides them.
+
         :return: A mapping of context variables.
-        :rtype: dict[str, str or int]
+        :rtype: :py:class:`Context`
         """
-        raise NotImplementedError()
+        return self._context
 
 
 @six.python_2_unicode_compatible
@@ -134,6 +223,14 @@ class SemVer(Version):
     For details, please check http://semver.org/.
     """
 
+    CHEAP_CONTEXT_KEYS = frozenset([
+        "base", "build", "major", "minor", "next_major", "next_minor",
+        "next_patch", "patch", "prerelease", "prev_major", "prev_minor",
+        "prev_patch"])
+    EXPENSIVE_CONTEXT_KEYS = frozenset([
+        "full", "next_build", "next_prerelease", "prev_build",
+        "prev_prerelease"])
+
     TEXT_VERSION_REGEXP = re.compile(r"\d+(?=\D*$)")
     """Regular expression matched latest number in the string."""
 
@@ -198,30 +295,6 @@ class SemVer(Version):
 
     __repr__ = __str__
 
-    @property
-    def context(self):
-        to_return = {
-            "full": self.full,
-            "base": self.base,
-            "major": self.major,
-            "next_major": self.next_major,
-            "prev_major": self.prev_major,
-            "minor": self.minor,
-            "next_minor": self.next_minor,
-            "prev_minor": self.prev_minor,
-            "patch": self.patch,
-            "next_patch": self.next_patch,
-            "prev_patch": self.prev_patch,
-            "prerelease": self.prerelease,
-            "next_prerelease": self.next_prerelease,
-            "prev_prerelease": self.prev_prerelease,
-            "build": self.build,
-            "next_build": self.next_build,
-            "prev_build": self.prev_build}
-        to_return.update(self._config.extra_context)
-
-        return to_return
-
     @property
     def full(self):
         number = "{0.major}.{0.minor}.{0.patch}".format(self)
@@ -417,6 +490,13 @@ class PEP440(Version):
     For details, please check :pep:`440`.
     """
 
+    CHEAP_CONTEXT_KEYS = frozenset([
+        "base", "dev", "epoch", "major", "minor", "next_dev", "next_major",
+        "next_minor", "next_patch", "next_post", "next_prerelease", "patch",
+        "post", "prerelease", "prerelease_type", "prev_dev", "prev_major",
+        "prev_minor", "prev_patch", "prev_post", "prev_prerelease"])
+    EXPENSIVE_CONTEXT_KEYS = frozenset(["full", "local", "maximum"])
+
     REGEXP = packaging.version.VERSION_PATTERN.strip()
     REGEXP = re.compile(REGEXP, re.VERBOSE | re.IGNORECASE)
 
@@ -427,37 +507,6 @@ class PEP440(Version):
         if isinstance(self.parsed, six.string_types):
             raise ValueError("Incorrect version {0}".format(self.base_number))
 
-    @property
-    def context(self):
-        to_return = {
-            "full": self.full,
-            "base": self.base,
-            "epoch": self.epoch,
-            "major": self.major,
-            "maximum": self.maximum,
-            "next_major": self.next_major,
-            "prev_major": self.prev_major,
-            "minor": self.minor,
-            "next_minor": self.next_minor,
-            "prev_minor": self.prev_minor,
-            "patch": self.patch,
-            "next_patch": self.next_patch,
-            "prev_patch": self.prev_patch,
-            "prerelease": self.prerelease,
-            "prerelease_type": self.prerelease_type,
-            "next_prerelease": self.next_prerelease,
-            "prev_prerelease": self.prev_prerelease,
-            "dev": self.dev,
-            "local": self.local,
-            "next_dev": self.next_dev,
-            "prev_dev": self.prev_dev,
-            "post": self.post,
-            "next_post": self.next_post,
-            "prev_post": self.prev_post}
-        to_return.update(self._config.extra_context)
-
-        return to_return
-
     @property
     def full(self):
         if self.epoch:
@@ -803,41 +852,314 @@ class GitPEP440(GitMixin, PEP440):
         return super(GitPEP440, self).local
 
 
-def git_distance(git_dir, matcher="v*"):
+class Context(Mapping):
+    """Lazy template context of the version.
+
+    Values of the context are calculated only when they are requested.
+    Values of expensive keys are memoized.
+
+    :param version: Version instance, its attributes are context values.
+    :type version: :py:class:`Version`
+    :param dict[str, str] extra_context: Additional context, it
+        overrides values of version.
+    """
+
+    __slots__ = "version", "extra_context", "values"
+
+    def __init__(self, version, extra_context):
+        self.version = version
+        self.extra_context = extra_context
+        self.values = {}
+
+    def __getitem__(self, key):
+        if key in self.extra_context:
+            return self.extra_context[key]
+        if key in self.values:
+            return self.values[key]
+        if key in self.version.EXPENSIVE_CONTEXT_KEYS:
+            value = self.values[key] = getattr(self.version, key)
+            return value
+        if key in self.version.CHEAP_CONTEXT_KEYS:
+            return getattr(self.version, key)
+
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return (
+            key in self.extra_context or
+            key in self.version.CHEAP_CONTEXT_KEYS or
+            key in self.version.EXPENSIVE_CONTEXT_KEYS)
+
+    def __iter__(self):
+        keys = set(self.extra_context)
+        keys.update(self.version.CHEAP_CONTEXT_KEYS)
+        keys.update(self.version.EXPENSIVE_CONTEXT_KEYS)
+
+        return iter(keys)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+def git_metadata(git_dir, matcher="v*", options=None):
+    """Return a number of commits since latest matched tag and Git tag.
+
+    Both values are obtained at once: with a single pass over
+    repository, read in-process (see :py:func:`git_describe`), or, if
+    repository cannot be read, with a single ``git describe`` call.
+
+    :param str git_dir: Path to the :file:`.git` directory of
+        repository.
+    :param str matcher: Glob of the tag names to operate with.
+    :param dict options: Options of describe (see
+        :py:data:`DEFAULT_DESCRIBE_OPTIONS`).
+    :return: The number of commits (``None`` if nothing is found) and
+        commit SHA in short form (empty if ``HEAD`` is tagged, ``None``
+        if cannot find any).
+    :rtype: tuple[int or None, str or None]
+    """
+    try:
+        described = git_describe(git_dir, matcher, options)
+    except ValueError as exc:
+        logging.debug("Cannot read repository %s, use git: %s", git_dir, exc)
+        started_at = time.time()
+        distance, abbrev = git_describe_external(git_dir, matcher, options)
+        record_vcs_stats(git_dir, "git", started_at)
+    else:
+        if described is None:
+            return None, None
+        _, distance, abbrev = described
+
+    return distance, "" if distance == 0 else abbrev
+
+
+def git_distance(git_dir, matcher="v*", options=None):
     """Return a number of commits since latest matched tag.
 
+    Repository is read in-process (see :py:mod:`scd.git`), ``git`` is
+    executed only if repository cannot be read.
+
     :param str git_dir: Path to the :file:`.git` directory of
         repository.
     :param str matcher: Glob of the tag names to operate with.
+    :param dict options: Options of describe (see
+        :py:data:`DEFAULT_DESCRIBE_OPTIONS`).
     :return: The number of commits or ``None`` if nothing is found.
     :rtype: int or None
     """
+    return git_metadata(git_dir, matcher, options)[0]
+
+
+def git_describe_external(git_dir, matcher="v*", options=None):
+    """Describe ``HEAD`` of repository with the nearest tag using ``git``.
+
+    ``max_commits`` option is ignored: ``git describe`` cannot be
+    limited.
+
+    :param str git_dir: Path to the :file:`.git` directory of
+        repository.
+    :param str matcher: Glob of the tag names to operate with.
+    :param dict options: Options of describe (see
+        :py:data:`DEFAULT_DESCRIBE_OPTIONS`).
+    :return: The number of commits since the tag (``None`` if nothing
+        is found) and abbreviated SHA of ``HEAD`` (``None`` if
+        repository has no commits).
+    :rtype: tuple[int or None, str or None]
+    """
+    options = dict(DEFAULT_DESCRIBE_OPTIONS, **(options or {}))
     command = ["git", "--git-dir", git_dir,
-               "describe", "--tags", "--match", matcher]
+               "describe", "--tags", "--long", "--always",
+               "--match", matcher,
+               "--candidates", str(options["candidates"])]
+    if options["first_parent"]:
+        command.append("--first-parent")
     try:
-        result = scd.utils.execute(command)
-    except ValueError:
+        output = scd.utils.execute(command)["stdout"][0]
+    except (ValueError, IndexError):
+        return None, None
+
+    chunks = output.rsplit("-", 2)
+    if len(chunks) == 3 and chunks[1].isdigit() and \
+            chunks[2].startswith("g"):
+        return int(chunks[1]), chunks[2][1:]
+
+    logging.debug("No tag is found by git, only SHA %s", output)
+    return git_count_external(git_dir, options), output
+
+
+def git_count_external(git_dir, options):
+    """Count commits of shallow repository using ``git``.
+
+    :param str git_dir: Path to the :file:`.git` directory of
+        repository.
+    :param dict options: Options of describe (see
+        :py:data:`DEFAULT_DESCRIBE_OPTIONS`).
+    :return: The number of commits or ``None`` if repository is not
+        shallow, ``shallow`` option is not ``count`` or there are more
+        than ``max_commits`` commits.
+    :rtype: int or None
+    """
+    if options["shallow"] != "count":
         return None
 
-    output = result["stdout"][0]
+    command = ["git", "--git-dir", git_dir,
+               "rev-parse", "--is-shallow-repository"]
     try:
-        distance = output.rsplit("-", 2)
-        if len(distance) == 1:
-            return 0
-        return int(distance[1])
-    except Exception as exc:
-        logging.debug("Cannot parse git result %s: %s", distance, exc)
+        if scd.utils.execute(command)["stdout"][0] != "true":
+            return None
+    except (ValueError, IndexError):
         return None
 
+    command = ["git", "--git-dir", git_dir, "rev-list", "--count"]
+    if options["first_parent"]:
+        command.append("--first-parent")
+    if options["max_commits"] is not None:
+        command.append("--max-count={0}".format(options["max_commits"] + 1))
+    command.append("HEAD")
+    try:
+        count = int(scd.utils.execute(command)["stdout"][0])
+    except (ValueError, IndexError):
+        return None
+
+    if options["max_commits"] is not None and count > options["max_commits"]:
+        logging.warning("More than %d commits, cannot count them",
+                        options["max_commits"])
+        return None
+
+    return count
+
+
+def git_describe(git_dir, matcher="v*", options=None):
+    """Describe ``HEAD`` of repository with the nearest matched tag.
+
+    Results are cached in on-disk cache of the project (see
+    :py:mod:`scd.cache`). If ``HEAD`` has not moved since the last run,
+    cached result is used as is. If new commits were added on top of it,
+    distance is updated by counting only them. Cached result is not
+    used if tags or shallow commits were changed, if ``HEAD`` was moved
+    elsewhere (e.g. reset) and if new commits have merges or matched
+    tags.
+
+    If no tag is found in shallow repository and ``shallow`` option is
+    ``count``, distance is the number of commits reachable from
+    ``HEAD``. Distance is never partial: if it cannot be counted within
+    ``max_commits`` commits, it is ``None``.
+
+    :param str git_dir: Path to the :file:`.git` directory of
+        repository.
+    :param str matcher: Glob of the tag names to operate with.
+    :param dict options: Options of describe (see
+        :py:data:`DEFAULT_DESCRIBE_OPTIONS`).
+    :return: Name of the tag, number of commits since it (both
+        ``None`` if nothing is found) and abbreviated SHA of ``HEAD``.
+        ``None`` is returned if repository has no commits.
+    :rtype: tuple[str or None, int or None, str] or None
+    :raises ValueError: if repository cannot be read.
+    """
+    started_at = time.time()
+    options = dict(DEFAULT_DESCRIBE_OPTIONS, **(options or {}))
+    repository = scd.git.Repository(git_dir)
+    head = repository.resolve("HEAD")
+    if head is None:
+        return None
+
+    git_dir = os.path.abspath(git_dir)
+    project_directory = os.path.dirname(git_dir)
+    key = scd.cache.make_key(git_dir, matcher, options)
+    tags = scd.cache.make_key(
+        repository.get_tags(), sorted(repository.shallow))
+
+    method = "cache"
+    loaded = scd.cache.load(project_directory, "describes", key)
+    if loaded is not None and loaded["tags"] == tags:
+        cached = update_description(repository, loaded, head, matcher)
+        if cached is not loaded:
+            method = "incremental"
+            if cached is not None and \
+                    options["max_commits"] is not None and \
+                    (cached["distance"] or 0) >= options["max_commits"]:
+                cached = None
+    else:
+        cached = None
+
+    if cached is None:
+        logging.debug("Describe %s from scratch", git_dir)
+        method = "describe"
+        tag, distance = repository.describe(
+            matcher, options["candidates"], options["first_parent"],
+            options["max_commits"]) or (None, None)
+        if tag is None and repository.shallow and \
+                options["shallow"] == "count":
+            distance = repository.count_commits(
+                head, options["first_parent"], options["max_commits"])
+        cached = {
+            "head": head,
+            "tags": tags,
+            "tag": tag,
+            "distance": distance,
+            "abbrev": repository.abbreviate(head)
+        }
+    if cached is not loaded:
+        scd.cache.save(project_directory, "describes", key, cached)
+    record_vcs_stats(git_dir, method, started_at)
+
+    return cached["tag"], cached["distance"], cached["abbrev"]
+
+
+def update_description(repository, cached, head, matcher):
+    """Update cached result of :py:func:`git_describe` for new ``HEAD``.
+
+    :param repository: Repository to describe.
+    :type repository: :py:class:`scd.git.Repository`
+    :param dict cached: Cached result.
+    :param str head: Hex SHA of the current ``HEAD``.
+    :param str matcher: Glob of the tag names to operate with.
+    :return: Updated result or ``None`` if it cannot be updated
+        incrementally.
+    :rtype: dict or None
+    """
+    if cached["head"] == head:
+        logging.debug("HEAD is not moved, use cached description")
+        return cached
+
+    new_commits = repository.get_new_commits(head, cached["head"])
+    if new_commits is None:
+        logging.debug("Cached HEAD is not an ancestor of HEAD")
+        return None
+
+    tag_names = repository.get_tag_names(matcher)
+    for sha in new_commits:
+        if sha in tag_names or len(repository.get_commit(sha)[0]) > 1:
+            logging.debug("New commit %s is a merge or tagged one", sha)
+            return None
+
+    logging.debug("Update cached description with %d new commits",
+                  len(new_commits))
+    updated = dict(cached, head=head, abbrev=repository.abbreviate(head))
+    if cached["distance"] is not None:
+        updated["distance"] = cached["distance"] + len(new_commits)
+
+    return updated
+
 
 def git_tag(git_dir):
     """Return a current Git commit sha for repository.
 
+    Repository is read in-process (see :py:mod:`scd.git`), ``git`` is
+    executed only if repository cannot be read.
+
     :param str git_dir: Path to the :file:`.git` directory of
         repository.
     :return: Commit SHA in short form or ``None`` if cannot find any.
     :rtype: str or None
     """
+    try:
+        repository = scd.git.Repository(git_dir)
+        head = repository.resolve("HEAD")
+        return repository.abbreviate(head) if head is not None else None
+    except ValueError as exc:
+        logging.debug("Cannot read repository %s, use git: %s", git_dir, exc)
+
     command = ["git", "--git-dir", git_dir, "rev-parse", "--short", "HEAD"]
 
     try:
@@ -846,3 +1168,18 @@ def git_tag(git_dir):
         return None
 
     return result["stdout"][0]
+
+
+def record_vcs_stats(git_dir, method, started_at):
+    """Record statistics of VCS discovery in :py:data:`STATS`.
+
+    :param str git_dir: Path to the :file:`.git` directory of
+        repository.
+    :param str method: How result was obtained (see
+        :py:class:`VCSStats`).
+    :param float started_at: Timestamp of the start of discovery.
+    """
+    stats = VCSStats(git_dir, method, time.time() - started_at)
+    STATS.append(stats)
+    logging.debug("VCS discovery of %s (%s) in %.3f seconds",
+                  stats.git_dir, stats.method, stats.duration)
@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+"""Expansion of glob and directory entries of config into files.
+
+Names in ``files`` section of config may be globs (like
+:file:`packages/*/package.json` or :file:`**/__init__.py`) or
+directories (names with trailing ``/``, all files within such
+directory are matched). They are expanded with a single walk over the
+project directory, all globs share it.
+
+Walk starts from the deepest directory which is common for all globs
+and does not go deeper than globs may match. VCS directories (see
+:py:data:`PRUNED_NAMES`) are never visited, files and directories,
+ignored by :file:`.gitignore` in the project directory, are skipped.
+
+Statistics of each walk is collected in :py:data:`STATS`.
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+import logging
+import os
+import os.path
+import re
+import time
+
+import scd.cache
+import scd.utils
+
+
+GLOB_CHARACTERS = frozenset("*?[")
+"""Characters which make name a glob."""
+
+BRACKET_EXPRESSION_REGEXP = re.compile(r"\[[!^]?\]?[^/\]]*\]")
+"""Regular expression for well-formed ``[...]`` expression of glob."""
+
+PRUNED_NAMES = frozenset([".git", ".hg", ".svn", scd.cache.DIRECTORY_NAME])
+"""Names of directories which are never visited."""
+
+IGNORE_FILENAME = ".gitignore"
+"""Name of the file with ignore rules in the project directory."""
+
+STATS = []
+"""A list of :py:class:`WalkStats` of walks, made within this run."""
+
+WalkStats = collections.namedtuple(
+    "WalkStats", ["root", "directories", "files", "duration"])
+"""Statistics of a single walk.
+
+:param str root: Directory where walk has started.
+:param int directories: Number of visited directories.
+:param int files: Number of checked files.
+:param float duration: Duration of the walk in seconds.
+"""
+
+
+class IgnoreRules(object):
+    """Rules to ignore files and directories.
+
+    Syntax is a subset of :file:`.gitignore` one: blank lines and
+    comments are skipped, ``!`` negates pattern, trailing ``/`` makes
+    pattern match only directories, pattern with ``/`` in the middle or
+    at the start is anchored to the project directory. The last matched
+    rule wins.
+
+    :param list rules: A list of tuples of regular expression,
+        negation flag and directory-only flag.
+    """
+
+    __slots__ = "rules",
+
+    @classmethod
+    def from_directory(cls, directory):
+        """Read rules from :py:data:`IGNORE_FILENAME` in the directory.
+
+        :param str directory: Path to the directory.
+        :return: Ignore rules (empty if there is no such file).
+        :rtype: :py:class:`IgnoreRules`
+        """
+        try:
+            with open(os.path.join(directory, IGNORE_FILENAME), "rb") as fp:
+                content = fp.read().decode("utf-8", "replace")
+        except (IOError, OSError):
+            return cls([])
+
+        return cls.from_lines(content.splitlines())
+
+    @classmethod
+    def from_lines(cls, lines):
+        """Parse rules from lines of ignore file.
+
+        :param list[str] lines: Lines of ignore file.
+        :return: Ignore rules.
+        :rtype: :py:class:`IgnoreRules`
+        """
+        rules = []
+
+        for line in lines:
+            line = line.rstrip()
+            if not line or line.startswith("#"):
+                continue
+
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            directory_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+
+            if "/" in line:
+                line = line.lstrip("/")
+            else:
+                line = "**/" + line
+
+            rules.append((make_glob_regexp(line), negate, directory_only))
+
+        return cls(rules)
+
+    def __init__(self, rules):
+        self.rules = rules
+
+    def match(self, name, is_directory):
+        """Check if file or directory should be ignored.
+
+        :param str name: POSIX path, relative to the project directory.
+        :param bool is_directory: Is it directory or not.
+        :return: Should it be ignored or not.
+        :rtype: bool
+        """
+        ignored = False
+
+        for regexp, negate, directory_only in self.rules:
+            if directory_only and not is_directory:
+                continue
+            if regexp.match(name):
+                ignored = not negate
+
+        return ignored
+
+
+def is_glob(name, directory=None):
+    """Check if name of the file from config is glob or directory.
+
+    ``[`` makes name a glob only if it starts well-formed bracket
+    expression. Name of existing file (e.g. :file:`docs/[draft].txt`)
+    is never a glob.
+
+    :param str name: Name of the file from config.
+    :param directory: Path to the project directory. If ``None``,
+        existence of the file is not checked.
+    :type directory: str or None
+    :return: Should name be expanded or not.
+    :rtype: bool
+    """
+    if name.endswith("/"):
+        return True
+    if "*" not in name and "?" not in name and \
+            not BRACKET_EXPRESSION_REGEXP.search(name):
+        return False
+    if directory is not None and \
+            os.path.isfile(os.path.join(directory, *name.split("/"))):
+        return False
+
+    return True
+
+
+@scd.utils.lru_cache()
+def make_glob_regexp(glob):
+    """Compile glob into regular expression.
+
+    ``*`` and ``?`` do not match ``/``, ``**`` segment matches any
+    number of directories. Trailing ``/`` means all files within the
+    directory.
+
+    :param str glob: Glob (POSIX path, relative to the project
+        directory).
+    :return: Regular expression which matches relative POSIX paths.
+    :rtype: regexp
+    """
+    if glob.endswith("/"):
+        glob += "**"
+
+    segments = glob.split("/")
+    chunks = []
+
+    for position, segment in enumerate(segments):
+        last = position == len(segments) - 1
+        if segment == "**":
+            chunks.append(".+" if last else "(?:[^/]+/)*")
+            continue
+
+        chunks.append(translate_segment(segment))
+        if not last:
+            chunks.append("/")
+
+    return re.compile("".join(chunks) + r"\Z", re.DOTALL)
+
+
+def translate_segment(segment):
+    """Translate single segment of glob into regular expression.
+
+    :param str segment: Segment of glob (it has no ``/``).
+    :return: Pattern of regular expression.
+    :rtype: str
+    """
+    chunks = []
+    position = 0
+
+    while position < len(segment):
+        char = segment[position]
+        position += 1
+
+        if char == "*":
+            chunks.append("[^/]*")
+        elif char == "?":
+            chunks.append("[^/]")
+        elif char == "[":
+            end = position
+            if segment[end:end + 1] in ("!", "^"):
+                end += 1
+            if segment[end:end + 1] == "]":
+                end += 1
+            end = segment.find("]", end)
+            if end < 0:
+                chunks.append(re.escape(char))
+                continue
+
+            body = segment[position:end].replace("\\", "\\\\")
+            position = end + 1
+            if body[0] in ("!", "^"):
+                body = "^/" + body[1:]
+            chunks.append("[{0}]".format(body))
+        else:
+            chunks.append(re.escape(char))
+
+    return "".join(chunks)
+
+
+def get_static_prefix(glob):
+    """Return segments of glob before the first wildcard one.
+
+    :param str glob: Glob from config.
+    :return: A list of directories where glob starts.
+    :rtype: list[str]
+    """
+    segments = glob.split("/")[:-1]
+    prefix = []
+
+    for segment in segments:
+        if any(char in GLOB_CHARACTERS for char in segment):
+            break
+        prefix.append(segment)
+
+    return prefix
+
+
+def get_max_depth(globs):
+    """Return maximal depth of the files, globs may match.
+
+    :param list[str] globs: Globs from config.
+    :return: Number of segments in relative path or ``None`` if
+        depth is not limited.
+    :rtype: int or None
+    """
+    depth = 0
+
+    for glob in globs:
+        if glob.endswith("/") or "**" in glob:
+            return None
+        depth = max(depth, glob.count("/") + 1)
+
+    return depth
+
+
+def expand(directory, globs):
+    """Find files in the directory, which are matched by globs.
+
+    If file is matched by several globs, the first one (in alphabetical
+    order) is taken.
+
+    :param str directory: Path to the project directory.
+    :param list[str] globs: Globs from config.
+    :return: A mapping of POSIX paths of files, relative to the
+        directory, to globs which match them.
+    :rtype: dict[str, str]
+    """
+    globs = sorted(globs)
+    if not globs:
+        return {}
+
+    regexps = [(glob, make_glob_regexp(glob)) for glob in globs]
+    prefixes = [get_static_prefix(glob) for glob in globs]
+    root = prefixes[0]
+    for prefix in prefixes[1:]:
+        common = 0
+        while common < min(len(root), len(prefix)) and \
+                root[common] == prefix[common]:
+            common += 1
+        root = root[:common]
+    max_depth = get_max_depth(globs)
+    ignore_rules = IgnoreRules.from_directory(directory)
+
+    matched = {}
+    directories = files = 0
+    started_at = time.time()
+    stack = ["/".join(root)]
+
+    while stack:
+        relative = stack.pop()
+        path = os.path.join(directory, *relative.split("/"))
+        try:
+            entries = list_directory(path)
+        except (IOError, OSError) as exc:
+            logging.debug("Cannot list directory %s: %s", path, exc)
+            continue
+        directories += 1
+
+        for name, is_directory, is_file in entries:
+            if name in PRUNED_NAMES:
+                continue
+
+            name = relative + "/" + name if relative else name
+            if ignore_rules.match(name, is_directory):
+                continue
+
+            if is_directory:
+                if max_depth is None or name.count("/") + 1 < max_depth:
+                    stack.append(name)
+            elif is_file:
+                files += 1
+                for glob, regexp in regexps:
+                    if regexp.match(name):
+                        matched[name] = glob
+                        break
+
+    stats = WalkStats(
+        os.path.join(directory, *root), directories, files,
+        time.time() - started_at)
+    STATS.append(stats)
+    logging.debug("Walk %s: %d directories, %d files in %.3f seconds",
+                  stats.root, stats.directories, stats.files, stats.duration)
+
+    return matched
+
+
+def list_directory(path):
+    """List entries of the directory.
+
+    Symlinks to directories are not followed.
+
+    :param str path: Path to the directory.
+    :return: A list of tuples of entry name and flags is it directory
+        and is it file.
+    :rtype: list[tuple[str, bool, bool]]
+    :raises OSError: if directory cannot be listed.
+    """
+    if not hasattr(os, "scandir"):
+        entries = []
+        for name in os.listdir(path):
+            entry_path = os.path.join(path, name)
+            is_directory = os.path.isdir(entry_path) and \
+                not os.path.islink(entry_path)
+            entries.append((name, is_directory, os.path.isfile(entry_path)))
+        return entries
+
+    entries = []
+    iterator = os.scandir(path)
+    try:
+        for entry in iterator:
+            try:
+                is_directory = entry.is_dir(follow_symlinks=False)
+                is_file = not is_directory and entry.is_file()
+            except OSError:
+                continue
+            entries.append((entry.name, is_directory, is_file))
+    finally:
+        if hasattr(iterator, "close"):
+            iterator.close()
+
+    return entries
@@ -12,7 +12,8 @@ REQUIREMENTS = [
     "packaging>=16,<17",
     "semver>=2,<3",
     "jsonschema>=2.5,<3",
-    "jinja2>=2.6,<3"
+    "jinja2>=2.6,<3",
+    "importlib_metadata>=0.12; python_version < '3.8'"
 ]
 """Requirements for scd project."""
 
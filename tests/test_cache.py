@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import datetime
+
+import mock
+import pytest
+
+import scd.cache
+import scd.config
+import scd.files
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(scd.cache, "ENABLED", True)
+
+
+def test_disabled(tmpdir):
+    scd.cache.save(tmpdir.strpath, "ns", "key", {"a": 1})
+
+    assert scd.cache.load(tmpdir.strpath, "ns", "key") is None
+    assert not tmpdir.listdir()
+
+
+def test_save_load(enabled, tmpdir):
+    scd.cache.save(tmpdir.strpath, "ns", "key", {"a": [1, "2"]})
+
+    assert scd.cache.load(tmpdir.strpath, "ns", "key") == {"a": [1, "2"]}
+    assert scd.cache.load(tmpdir.strpath, "ns", "key2") is None
+    assert scd.cache.load(tmpdir.strpath, "ns2", "key") is None
+
+    cache_dir = tmpdir.join(scd.cache.DIRECTORY_NAME)
+    assert cache_dir.join(".gitignore").read() == "*\n"
+
+
+def test_load_broken(enabled, tmpdir):
+    scd.cache.save(tmpdir.strpath, "ns", "key", {"a": 1})
+    tmpdir.join(scd.cache.DIRECTORY_NAME, "ns", "key.json").write("{")
+
+    assert scd.cache.load(tmpdir.strpath, "ns", "key") is None
+
+
+def test_save_failed(enabled, tmpdir):
+    tmpdir.join(scd.cache.DIRECTORY_NAME).write("")
+
+    scd.cache.save(tmpdir.strpath, "ns", "key", {"a": 1})
+    assert scd.cache.load(tmpdir.strpath, "ns", "key") is None
+
+
+def test_user_directory(enabled, monkeypatch, tmpdir):
+    monkeypatch.setenv("XDG_CACHE_HOME", tmpdir.strpath)
+    scd.cache.save(None, "ns", "key", {"a": 1})
+
+    assert scd.cache.get_user_directory() == tmpdir.join("scd").strpath
+    assert scd.cache.load(None, "ns", "key") == {"a": 1}
+    assert tmpdir.join("scd", "ns", "key.json").check(file=True)
+
+
+def test_make_key():
+    assert scd.cache.make_key({"a": 1, "b": 2}) == \
+        scd.cache.make_key({"b": 2, "a": 1})
+    assert scd.cache.make_key({"a": 1}) != scd.cache.make_key({"a": 2})
+    assert scd.cache.make_key(datetime.date(2017, 1, 1))
+
+
+def test_config_plan(enabled, config, tmp_project):
+    configpath = tmp_project.join("config.json").strpath
+    conf = scd.config.make_config(configpath, None, config, {})
+    assert conf.plan == {}
+
+    plan = {"full_version": [["\\d+", 32, "{{ full }}"]]}
+    conf.save_plan(plan)
+
+    with mock.patch.object(scd.config.Config, "validate_schema") as mocked:
+        conf = scd.config.make_config(configpath, None, config, {})
+        assert not mocked.called
+    assert conf.plan == plan
+
+    conf = scd.config.make_config(configpath, None, config, {"k": "v"})
+    assert conf.plan == {}
+
+
+def test_config_plan_version_bump(enabled, config, tmp_project):
+    configpath = tmp_project.join("config.json").strpath
+    plan = {"full_version": [["\\d+", 32, "{{ full }}"]]}
+    scd.config.make_config(configpath, None, config, {}).save_plan(plan)
+
+    config["version"]["number"] = "1.2.4"
+    conf = scd.config.make_config(configpath, None, config, {})
+    assert conf.plan == plan
+
+    config["search_patterns"]["new"] = "\\d+"
+    conf = scd.config.make_config(configpath, None, config, {})
+    assert conf.plan == {}
+    conf.save_plan(plan)
+    assert len(tmp_project.join(
+        scd.cache.DIRECTORY_NAME, "plans").listdir()) == 1
+
+
+def test_slot(enabled, tmpdir):
+    scd.cache.save_slot(tmpdir.strpath, "ns", "slot", "key1", 1)
+    assert scd.cache.load_slot(tmpdir.strpath, "ns", "slot", "key1") == 1
+
+    scd.cache.save_slot(tmpdir.strpath, "ns", "slot", "key2", 2)
+    assert scd.cache.load_slot(tmpdir.strpath, "ns", "slot", "key1") is None
+    assert scd.cache.load_slot(tmpdir.strpath, "ns", "slot", "key2") == 2
+    assert len(tmpdir.join(scd.cache.DIRECTORY_NAME, "ns").listdir()) == 1
+
+
+def test_config_validation(enabled, config, tmp_project, monkeypatch):
+    configpath = tmp_project.join("config.json").strpath
+    scd.config.make_config(configpath, None, config, {})
+    assert tmp_project.join(
+        scd.cache.DIRECTORY_NAME, "validations").listdir()
+
+    with mock.patch.object(scd.config.Config, "validate_schema") as mocked:
+        scd.config.make_config(configpath, None, config, {"k": "v"})
+        assert not mocked.called
+
+    monkeypatch.setattr(scd.config, "STRICT_VALIDATION", True)
+    with mock.patch.object(scd.config.Config, "validate_schema",
+                           return_value=[]) as mocked:
+        scd.config.make_config(configpath, None, config, {})
+        assert mocked.called
+
+    config["version"]["number"] = "1.2.4"
+    monkeypatch.setattr(scd.config, "STRICT_VALIDATION", False)
+    with mock.patch.object(scd.config.Config, "validate_schema",
+                           return_value=[]) as mocked:
+        scd.config.make_config(configpath, None, config, {})
+        assert not mocked.called
+
+    config["version"]["number"] = {}
+    with pytest.raises(ValueError):
+        scd.config.make_config(configpath, None, config, {})
+
+    config["version"]["number"] = "1.2.5"
+    config["defaults"]["search"] = "full"
+    with mock.patch.object(scd.config.Config, "validate_schema",
+                           return_value=[]) as mocked:
+        scd.config.make_config(configpath, None, config, {})
+        assert mocked.called
+    assert len(tmp_project.join(
+        scd.cache.DIRECTORY_NAME, "validations").listdir()) == 1
+
+
+def test_templates(enabled, monkeypatch, tmpdir):
+    import jinja2
+
+    template = "{% if post %}.post{{ post }}{% endif %}"
+    make_template = scd.files.make_template.__wrapped__
+    monkeypatch.setattr(
+        scd.files, "TEMPLATES_PROJECT_DIRECTORY", tmpdir.strpath)
+
+    tpl = make_template(template)
+    assert tpl.render(post=1) == ".post1"
+    assert tpl.required_vars == {"post"}
+    assert tmpdir.join(scd.cache.DIRECTORY_NAME, "jinja").listdir()
+
+    scd.files.get_environment.cache_clear()
+    with mock.patch.object(jinja2.Environment, "compile") as compiled, \
+            mock.patch.object(jinja2.Environment, "parse") as parsed:
+        tpl = make_template(template)
+        assert not compiled.called
+        assert not parsed.called
+
+    assert tpl.render(post=2) == ".post2"
+    assert tpl.required_vars == {"post"}
@@ -6,10 +6,14 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import json
+import logging
 
+import mock
 import pytest
 
 import scd.config
+import scd.utils
+import scd.version
 
 
 def test_ok(scheme, config, tmp_project):
@@ -47,7 +51,10 @@ def test_ok(scheme, config, tmp_project):
 @pytest.mark.parametrize("errors", (
     {"scheme": "qqq"},
     {"number": {}},
-    {"scheme": "qqq", "number": {}}
+    {"scheme": "qqq", "number": {}},
+    {"tag_glob": 1},
+    {"describe": {"candidates": -1}},
+    {"describe": {"shallow": "deepen"}}
 ))
 def test_invalid_schema(errors, config, tmp_project):
     config["version"].update(errors)
@@ -76,3 +83,126 @@ def test_parsing_bytes(tmp_project, config):
         conf = scd.config.parse(ffp, None, {})
 
     assert conf.raw == config
+
+
+@pytest.mark.parametrize("extension, names", (
+    (".json", ["JSON"]),
+    (".toml", ["TOML"]),
+    (".yaml", ["YAML"]),
+    (".yml", ["YAML"]),
+    (".cfg", ["JSON", "TOML", "YAML"]),
+    ("", ["JSON", "TOML", "YAML"]),
+    (None, ["JSON", "TOML", "YAML"])
+))
+def test_get_parsers(extension, names):
+    parsers = scd.config.get_parsers(extension)
+
+    assert [parser.name for parser in parsers] == names
+
+
+def test_parsing_by_extension(config, tmp_project):
+    content = tmp_project.join("config.yaml").read()
+
+    tmp_project.join("config.json").write(content)
+    with tmp_project.join("config.json").open() as ffp:
+        with pytest.raises(ValueError):
+            scd.config.parse(ffp, None, {})
+
+    tmp_project.join("config.cfg").write(content)
+    with tmp_project.join("config.cfg").open() as ffp:
+        assert scd.config.parse(ffp, None, {})
+
+
+def test_parsing_no_debug_dump(config, tmp_project, caplog):
+    with caplog.at_level(logging.INFO):
+        with mock.patch("scd.config.json.dumps") as mocked:
+            with tmp_project.join("config.json").open() as ffp:
+                scd.config.parse(ffp, None, {})
+
+    assert not mocked.called
+
+
+def test_config_key(config, tmp_project, monkeypatch):
+    configpath = tmp_project.join("config.json").strpath
+    conf1 = scd.config.make_config(configpath, None, config, {"k": "v"})
+    conf2 = scd.config.make_config(configpath, None, config, {"k": "v"})
+    conf3 = scd.config.make_config(configpath, None, config, {"k": "w"})
+
+    assert conf1 == conf2
+    assert hash(conf1) == hash(conf2)
+    assert conf1 != conf3
+    assert conf1.version is conf2.version
+    assert conf1.version != conf3.version
+    assert conf3.version.context["k"] == "w"
+
+    version = conf1.version
+    monkeypatch.setattr(scd.utils, "get_vcs_state", lambda directory: "new")
+    assert conf1.version is version
+
+
+def test_config_vcs_state(config, tmp_project, monkeypatch):
+    configpath = tmp_project.join("config.json").strpath
+    conf = scd.config.make_config(configpath, "git_semver", config, {})
+    vcs_state = mock.Mock(return_value="old")
+    monkeypatch.setattr(scd.utils, "get_vcs_state", vcs_state)
+    monkeypatch.setattr(scd.version, "git_metadata",
+                        lambda *args: (1, "abcdef0"))
+
+    version = conf.version
+    assert conf.version is version
+    assert vcs_state.called
+
+    vcs_state.return_value = "new"
+    assert conf.version is not version
+    assert conf.version == version
+
+
+@pytest.mark.parametrize("groups, files, expected", (
+    ([], [], {"full_version", "major", "all", "complex", "vcomplex",
+              "minor_major_patch", "minor_major", "clean"}),
+    (["minors"], [], {"minor_major_patch", "minor_major"}),
+    (["minors", "all"], [], {"minor_major_patch", "minor_major", "all"}),
+    (["unknown"], [], {"full_version", "major", "all", "complex",
+                       "vcomplex", "minor_major_patch", "minor_major",
+                       "clean"}),
+    ([], ["major", "clean", "unknown"], {"major", "clean"}),
+    (["minors"], ["major", "minor_major"], {"minor_major"})
+))
+def test_filter_files(config, tmp_project, groups, files, expected):
+    config["groups"] = {"minors": "minor_.*", "all": "all"}
+    conf = scd.config.make_config(
+        tmp_project.join("config.json").strpath, None, config, {})
+    required_files = [mock.Mock() for _ in files]
+    for fileobj, name in zip(required_files, files):
+        fileobj.name = tmp_project.join(name).strpath
+
+    filtered = conf.filter_files(groups, required_files)
+
+    assert {fileobj.name for fileobj in filtered} == expected
+    assert list(filtered.paths) == sorted(filtered.paths)
+
+
+def test_group_index(config, tmp_project):
+    config["groups"] = {"minors": "minor_.*", "none": "nothing"}
+    conf = scd.config.make_config(
+        tmp_project.join("config.json").strpath, None, config, {})
+    files = conf.files
+
+    positions = files.get_group_positions("minors")
+    assert [files.names[position] for position in positions] == [
+        "minor_major", "minor_major_patch"]
+    assert files.get_group_positions("minors") is positions
+    assert files.get_group_positions("none") == ()
+    assert set(files.group_index) == {"minors", "none"}
+
+    with pytest.raises(KeyError):
+        files.get_group_positions("unknown")
+
+
+def test_group_incorrect_regexp(config, tmp_project):
+    config["groups"] = {"broken": "(minor"}
+    conf = scd.config.make_config(
+        tmp_project.join("config.json").strpath, None, config, {})
+
+    with pytest.raises(ValueError):
+        conf.filter_files(["broken"], [])
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import pickle
+
+import pytest
+
+import scd.config
+import scd.engine
+import scd.files
+
+
+@pytest.fixture
+def full_config(config, tmp_project):
+    config_file = tmp_project.join("config.json").strpath
+    return scd.config.make_config(config_file, None, config, {})
+
+
+def naive_process(patterns, version, text):
+    result = []
+    for line in text.splitlines(True):
+        for sr in patterns:
+            line = sr.process(version, line)
+        result.append(line)
+
+    return "".join(result)
+
+
+def test_same_as_naive(full_config):
+    for fileobj in full_config.files:
+        with open(fileobj.path, "rt") as filefp:
+            content = filefp.read()
+        content = "\n".join([content, "nothing", content, "", content])
+
+        engine = scd.engine.Engine.from_patterns(
+            fileobj.patterns, full_config.version)
+        assert engine.matcher is not None
+        assert engine.process(content) == \
+            naive_process(fileobj.patterns, full_config.version, content)
+
+
+def test_edits_only_changed_lines(full_config):
+    fileobj = [f for f in full_config.files if f.filename == "all"][0]
+    content = "nothing\n" * 100 + "version 0.1.0\n" + "nothing\n" * 100
+
+    engine = scd.engine.Engine.from_patterns(
+        fileobj.patterns, full_config.version)
+    edits = list(engine.edits(content))
+
+    assert len(edits) == 1
+    start, end, _ = edits[0]
+    assert content[start:end] == "version 0.1.0\n"
+
+
+@pytest.mark.parametrize("search", (
+    r"(?<!\s)\d+",
+    r"\d+(?!\s*3)",
+    r"\A\d+",
+    r"(\d)\1",
+    r"(?i)\d+"
+))
+def test_fallback(full_config, search):
+    search = scd.files.make_pattern(search, full_config)
+    replace = scd.files.make_template("{{ major }}")
+    sr = scd.files.SearchReplace(search, replace)
+    content = "11 22\n 33\n"
+
+    engine = scd.engine.Engine.from_patterns([sr], full_config.version)
+    assert engine.matcher is None
+    assert engine.process(content) == \
+        naive_process([sr], full_config.version, content)
+
+
+def test_negative_lookahead_same_as_naive(full_config):
+    search = scd.files.make_pattern(r"(?i:version)(?!\s*x)", full_config)
+    replace = scd.files.make_template("{{ major }}")
+    sr = scd.files.SearchReplace(search, replace)
+    content = "version\nx\n"
+
+    engine = scd.engine.Engine.from_patterns([sr], full_config.version)
+    assert engine.process(content) == \
+        naive_process([sr], full_config.version, content)
+    assert engine.process(content) != content
+
+
+def test_no_patterns():
+    engine = scd.engine.Engine([])
+
+    assert engine.matcher is None
+    assert engine.process("1.2.3\n") == "1.2.3\n"
+
+
+def test_missed_replacement_vars(full_config):
+    search = scd.files.make_pattern("xxx", full_config)
+    replace = scd.files.make_template("{{ unknown }}")
+
+    with pytest.raises(ValueError):
+        scd.engine.Engine.from_patterns(
+            [scd.files.SearchReplace(search, replace)], full_config.version)
+
+
+def test_pickle(full_config):
+    for fileobj in full_config.files:
+        engine = scd.engine.Engine.from_patterns(
+            fileobj.patterns, full_config.version)
+        restored = pickle.loads(pickle.dumps(engine))
+
+        assert restored.substitutions == engine.substitutions
+        assert restored.matcher == engine.matcher
+
+
+@pytest.mark.parametrize("edits, result", (
+    ([], "0123456789"),
+    ([(0, 1, "x")], "x123456789"),
+    ([(0, 1, "x"), (5, 7, "")], "x1234789"),
+    ([(9, 10, "xx")], "012345678xx")
+))
+def test_apply_edits(edits, result):
+    assert scd.engine.apply_edits("0123456789", edits) == result
+
+
+@pytest.yield_fixture
+def mapped_file(monkeypatch, full_config, tmp_project):
+    monkeypatch.setattr(scd.engine, "MMAP_THRESHOLD", 1)
+    fileobj = [f for f in full_config.files if f.filename == "all"][0]
+
+    yield fileobj
+
+
+@pytest.mark.parametrize("content", (
+    "nothing\n" * 10 + "version 0.1.0\n" + "nothing" * 10,
+    "version 0.1.0\n\n0.1.0",
+    "версия 0.1.0\nversion 0.1.0\n",
+    "١.٢.٣\nnothing\n",
+    "nothing\x1c0.1.0\n"
+))
+def test_mapped_same_as_text(full_config, mapped_file, content):
+    with open(mapped_file.path, "wb") as filefp:
+        filefp.write(content.encode(scd.engine.get_encoding()))
+
+    engine = scd.engine.Engine.from_patterns(
+        mapped_file.patterns, full_config.version)
+    assert engine.can_map(mapped_file.path)
+
+    with scd.engine.map_file(mapped_file.path) as mapped:
+        result = engine.process(mapped)[:]
+
+    assert result.decode(scd.engine.get_encoding()) == \
+        engine.process(content)
+
+
+@pytest.mark.parametrize("content, changed", (
+    (b"version 0.1.0\n", True),
+    (b"nothing to do here\n", False)
+))
+def test_mapped_changed(full_config, mapped_file, content, changed):
+    with open(mapped_file.path, "wb") as filefp:
+        filefp.write(content)
+
+    engine = scd.engine.Engine.from_patterns(
+        mapped_file.patterns, full_config.version)
+    with scd.engine.map_file(mapped_file.path) as mapped:
+        result = engine.process(mapped)
+        assert (result is not mapped) == changed
+
+
+def test_cannot_map_crlf(full_config, mapped_file):
+    with open(mapped_file.path, "wb") as filefp:
+        filefp.write(b"version 0.1.0\r\n")
+
+    engine = scd.engine.Engine.from_patterns(
+        mapped_file.patterns, full_config.version)
+
+    assert not engine.can_map(mapped_file.path)
+
+
+def test_cannot_map_small(full_config, mapped_file, monkeypatch):
+    monkeypatch.setattr(scd.engine, "MMAP_THRESHOLD", 1024 * 1024)
+
+    engine = scd.engine.Engine.from_patterns(
+        mapped_file.patterns, full_config.version)
+
+    assert not engine.can_map(mapped_file.path)
+
+
+@pytest.mark.parametrize("chunk_size", (1, 7, 1024 * 1024))
+@pytest.mark.parametrize("dry_run", (True, False))
+def test_process_text_file(full_config, tmp_project, monkeypatch,
+                           chunk_size, dry_run):
+    monkeypatch.setattr(scd.engine, "CHUNK_SIZE", chunk_size)
+    fileobj = [f for f in full_config.files if f.filename == "all"][0]
+    content = "nothing\r\n" * 10 + "version 0.1.0\n" + "nothing\n" * 10
+    content += "0.1.0\n" + "nothing"
+    with open(fileobj.path, "wb") as filefp:
+        filefp.write(content.encode("utf-8"))
+    with open(fileobj.path, "rt") as filefp:
+        expected = filefp.read()
+
+    engine = scd.engine.Engine.from_patterns(
+        fileobj.patterns, full_config.version)
+    expected = engine.process(expected)
+
+    assert scd.engine.process_text_file(engine, fileobj.path, dry_run)
+    with open(fileobj.path, "rt") as filefp:
+        if dry_run:
+            assert filefp.read() == content.replace("\r\n", "\n")
+        else:
+            assert filefp.read() == expected
+    assert not [
+        name for name in tmp_project.listdir() if name.ext == ".scd"]
+
+
+@pytest.mark.parametrize("chunk_size", (1, 7, 1024 * 1024))
+def test_process_mapped_file(full_config, mapped_file, monkeypatch,
+                             chunk_size):
+    monkeypatch.setattr(scd.engine, "CHUNK_SIZE", chunk_size)
+    content = "nothing\n" * 10 + "version 0.1.0\n" + "nothing\n" * 10
+    content += "0.1.0"
+    with open(mapped_file.path, "wt") as filefp:
+        filefp.write(content)
+
+    engine = scd.engine.Engine.from_patterns(
+        mapped_file.patterns, full_config.version)
+    expected = engine.process(content)
+
+    assert scd.engine.process_mapped_file(engine, mapped_file.path, False)
+    with open(mapped_file.path, "rt") as filefp:
+        assert filefp.read() == expected
+
+
+def test_process_file_nothing_to_change(full_config, tmp_project):
+    fileobj = [f for f in full_config.files if f.filename == "clean"][0]
+    engine = scd.engine.Engine.from_patterns(
+        fileobj.patterns, full_config.version)
+
+    assert not scd.engine.process_text_file(engine, fileobj.path, False)
+    assert not [
+        name for name in tmp_project.listdir() if name.ext == ".scd"]
@@ -5,12 +5,18 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import json
 import os
+import re
+import subprocess
+import sys
 
+import mock
 import pytest
 
 import scd.files
 import scd.utils
+import scd.version
 
 
 @pytest.mark.parametrize("replacement", ("base", "full"))
@@ -72,6 +78,16 @@ class TestSearchReplace(object):
 
         assert result == sr.process(minimal_config.version, "hello")
 
+    def test_replacement_required_vars(self, minimal_config):
+        get_replacement = scd.files.SearchReplace.get_replacement.__wrapped__
+        replacement = scd.files.make_template("{{ major }}.{{ minor }}")
+
+        with mock.patch.object(scd.version.SemVer, "next_prerelease",
+                               new_callable=mock.PropertyMock) as mocked:
+            assert get_replacement(replacement, minimal_config.version) == \
+                "1.2"
+            assert not mocked.called
+
 
 class TestFile(object):
 
@@ -99,7 +115,7 @@ class TestFile(object):
     def test_default_search_patterns(self, full_config, firstfile):
         assert firstfile.default_search_patterns == {
             name: scd.files.make_pattern("{{ %s }}" % name, full_config)
-            for name in scd.utils.get_version_plugins()
+            for name in scd.utils.get_version_plugin_names()
         }
 
     def test_all_search_patterns(self, scheme, full_config, firstfile):
@@ -119,10 +135,208 @@ class TestFile(object):
         assert firstfile.default_replace_pattern == scd.files.make_template(
             "{{ major }}")
 
+    def test_get_search_pattern(self, scheme, full_config, firstfile):
+        for name, pattern in firstfile.all_search_patterns.items():
+            assert firstfile.get_search_pattern(name) == pattern
+
+        with pytest.raises(KeyError):
+            firstfile.get_search_pattern("unknown")
+
+    def test_get_replace_pattern(self, firstfile):
+        for name, template in firstfile.all_replacements.items():
+            assert firstfile.get_replace_pattern(name) == template
+
+        with pytest.raises(KeyError):
+            firstfile.get_replace_pattern("unknown")
+
     def test_patterns(self, full_config):
         for fileobj in full_config.files:
             assert fileobj.patterns
 
+    def test_patterns_shared(self, full_config):
+        patterns = {}
+        for fileobj in full_config.files:
+            for item, sr in zip(fileobj.data, fileobj.patterns):
+                key = json.dumps(item, sort_keys=True)
+                assert patterns.setdefault(key, sr) is sr
+
+        for fileobj in full_config.files:
+            assert fileobj.pattern_table is full_config.files[0].pattern_table
+
+
+def test_file_table(full_config, tmp_project):
+    files = full_config.files
+    assert files is full_config.files
+    assert list(files.paths) == sorted(files.paths)
+    assert len(files) == len(full_config.raw["files"])
+
+    for position, fileobj in enumerate(files):
+        assert fileobj.path == files.paths[position]
+        assert files.index[fileobj.path] == position
+        assert files.get(fileobj.path).name == fileobj.name
+        assert fileobj.path == scd.files.File(
+            fileobj.name, fileobj.data, full_config).path
+
+    assert files.get(tmp_project.join("unknown").strpath) is None
+    assert files[1:3].paths == files.paths[1:3]
+    assert files.select([0, 2]).index == {
+        files.paths[0]: 0, files.paths[2]: 1}
+
+
+def test_make_filename():
+    assert scd.files.make_filename("docs/conf.py") == \
+        os.path.join("docs", "conf.py")
+
+
+def test_pattern_table_lazy(full_config):
+    table = scd.files.PatternTable(full_config)
+    assert not table.searches
+    assert not table.replacements
+
+    with mock.patch.object(scd.files, "make_pattern",
+                           wraps=scd.files.make_pattern) as mocked:
+        pattern = table.get_search_pattern("vsearch")
+        assert table.get_search_pattern("vsearch") is pattern
+        assert mocked.call_count == 1
+
+    assert set(table.searches) == {"vsearch"}
+    assert not table.replacements
+
+    assert table.get_search_replace("default") is \
+        table.get_search_replace({})
+    assert table.get_search_replace({"replace": "major2"}) is \
+        table.get_search_replace("default")
+
+
+def test_pattern_table_unknown(full_config):
+    table = scd.files.PatternTable(full_config)
+
+    with pytest.raises(KeyError):
+        table.get_search_pattern("unknown")
+    with pytest.raises(KeyError):
+        table.get_replace_pattern("unknown")
+
+
+@pytest.mark.parametrize("template", (
+    "",
+    "text",
+    "{{ major }}.{{ minor }}",
+    "{{major}}{{ minor }}",
+    "v{{ full }}\n",
+    "v{{ full }}\n\n",
+    "\n{{ full }} x",
+    "{{ missing }}",
+    "{{ none_value }}-{{ number }}",
+    "a}}b{{ major }}",
+    "{\\d{2,3}}{{ major }}",
+    "{{\n  major\n}}"
+))
+def test_simple_template(template):
+    import jinja2
+
+    context = {"major": 1, "minor": "2", "full": "1.2.3",
+               "none_value": None, "number": 1.5}
+    tpl = scd.files.make_template(template)
+
+    assert isinstance(tpl, scd.files.SimpleTemplate)
+    assert tpl.source == template
+    assert tpl.render(context) == jinja2.Template(template).render(context)
+    assert tpl.render(**context) == tpl.render(context)
+
+
+@pytest.mark.parametrize("template", (
+    "{% if post %}.post{{ post }}{% endif %}",
+    "{{ major + 1 }}",
+    "{{ major|string }}",
+    "{{ true }}",
+    "{{- major }}",
+    "{# comment #}{{ major }}",
+    "{{ major }}\r\n"
+))
+def test_jinja_template(template):
+    import jinja2
+
+    tpl = scd.files.make_template(template)
+
+    assert isinstance(tpl, jinja2.Template)
+    assert tpl.source == template
+
+
+def test_simple_template_no_jinja():
+    code = (
+        "import sys, scd.files; "
+        "tpl = scd.files.make_template('{{ major }}.{{ minor }}'); "
+        "assert tpl.render(major=1, minor=2) == '1.2'; "
+        "assert 'jinja2' not in sys.modules")
+
+    subprocess.check_call([sys.executable, "-c", code])
+
+
+def test_make_pattern_loads_required_plugins(minimal_config):
+    make_pattern = scd.files.make_pattern.__wrapped__
+
+    with mock.patch.object(
+            scd.utils, "get_version_plugin",
+            wraps=scd.utils.get_version_plugin) as mocked:
+        make_pattern("v{{ pep440 }}", minimal_config)
+        mocked.assert_called_once_with("pep440")
+
+        mocked.reset_mock()
+        make_pattern(r"\d+", minimal_config)
+        assert not mocked.called
+
+
+@pytest.mark.parametrize("pattern, literals, digit, min_length", (
+    (r"\W+", (), False, 1),
+    (r"(?<=version=\"){{ pep440 }}", ("version=\"",), True, 1),
+    (r"(?<=^__version__\s=\s\"){{ semver }}", ("\"", ".", "=", "__version__"),
+     True, 5),
+    (r"v{{ semver }}", (".", "v"), True, 6),
+    (r"(?i)version\d", (), True, 8),
+    (r"(?i:ver)sion", ("sion",), False, 7),
+    (r"(?:abc|abd)x{2,}", ("ab", "x"), False, 5),
+    (r"(?:abc|xyz)", (), False, 3),
+    (r"(?:1|[2-5]|\d)", (), True, 1),
+    (r"(?:1|[a-z])", (), False, 1),
+    (r"(?:1|x)?[^0-9]", (), False, 1),
+))
+def test_make_prefilter(minimal_config, pattern, literals, digit, min_length):
+    prefilter = scd.files.make_prefilter(
+        scd.files.make_pattern(pattern, minimal_config))
+
+    assert prefilter.literals == literals
+    assert (prefilter.digit is not None) == digit
+    assert prefilter.min_length == min_length
+
+
+@pytest.mark.parametrize("text, result", (
+    ("version=\"1.2.3\"", True),
+    ("version=\"\"", False),
+    ("1.2.3", False),
+    ("version=\"\u0661\"", True),
+    ("version=\"", False),
+))
+def test_prefilter_match(minimal_config, text, result):
+    prefilter = scd.files.make_prefilter(scd.files.make_pattern(
+        r"(?<=version=\"){{ pep440 }}", minimal_config))
+
+    assert prefilter.match(text) == result
+    assert prefilter.encode("utf-8").match(text.encode("utf-8")) == result
+
+
+def test_prefilter_gate(minimal_config):
+    prefilter = scd.files.make_prefilter(scd.files.make_pattern(
+        r"(?<=version=\"){{ pep440 }}", minimal_config))
+    assert prefilter.gate == re.escape("version=\"")
+
+    prefilter = scd.files.make_prefilter(scd.files.make_pattern(
+        r"{{ pep440 }}", minimal_config))
+    assert prefilter.gate == r"\d"
+
+    prefilter = scd.files.make_prefilter(scd.files.make_pattern(
+        r"\w+", minimal_config))
+    assert prefilter.gate is None
+
 
 def test_validate_access_ok(full_config):
     assert scd.files.validate_access(full_config.files)
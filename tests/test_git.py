@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import shutil
+import subprocess
+
+import mock
+import pytest
+
+import scd.cache
+import scd.git
+import scd.version
+
+
+if hasattr(shutil, "which"):
+    has_git = shutil.which("git")
+else:
+    import distutils.spawn
+    has_git = distutils.spawn.find_executable("git")
+
+
+pytestmark = pytest.mark.skipif(not has_git, reason="No git is found in PATH")
+
+
+def run_git(directory, *args):
+    env = dict(os.environ)
+    env.update({
+        "GIT_AUTHOR_NAME": "scd", "GIT_AUTHOR_EMAIL": "scd@example.com",
+        "GIT_COMMITTER_NAME": "scd", "GIT_COMMITTER_EMAIL": "scd@example.com",
+        "GIT_CONFIG_NOSYSTEM": "1", "HOME": directory})
+
+    return subprocess.check_output(
+        ["git", "-C", directory] + list(args), env=env,
+        universal_newlines=True).strip()
+
+
+def commit(directory, number, filename="file"):
+    with open(os.path.join(directory, filename), "a") as fp:
+        fp.write("line {0}\n".format(number) * 50)
+    run_git(directory, "add", filename)
+    run_git(directory, "commit", "-q", "-m", "commit {0}".format(number))
+
+
+@pytest.fixture
+def repository(tmpdir):
+    directory = tmpdir.strpath
+    run_git(directory, "init", "-q")
+    for number in range(3):
+        commit(directory, number)
+    run_git(directory, "tag", "v0.1")
+    for number in range(3, 5):
+        commit(directory, number)
+    run_git(directory, "tag", "-a", "-m", "annotated", "v0.2")
+    run_git(directory, "tag", "x1")
+    for number in range(5, 9):
+        commit(directory, number)
+
+    return directory
+
+
+def describe(directory, *args):
+    try:
+        output = run_git(directory, "describe", "--tags", "--long", *args)
+    except subprocess.CalledProcessError:
+        return None
+
+    tag, distance, _ = output.rsplit("-", 2)
+    return tag, int(distance)
+
+
+@pytest.mark.parametrize("packed", (False, True))
+@pytest.mark.parametrize("matcher", ("v*", "*", "v0.1", "unknown"))
+def test_describe(repository, packed, matcher):
+    if packed:
+        run_git(repository, "gc", "-q")
+    repo = scd.git.Repository(os.path.join(repository, ".git"))
+
+    assert repo.describe(matcher) == describe(
+        repository, "--match", matcher)
+
+
+def test_describe_merges(repository):
+    run_git(repository, "checkout", "-q", "-b", "feature", "HEAD~3")
+    commit(repository, 100, "feature")
+    run_git(repository, "tag", "v1.0")
+    commit(repository, 101, "feature")
+    run_git(repository, "checkout", "-q", "-")
+    run_git(repository, "merge", "-q", "--no-edit", "feature")
+    repo = scd.git.Repository(os.path.join(repository, ".git"))
+
+    assert repo.describe("v*") == describe(repository, "--match", "v*")
+    assert repo.describe("v*", first_parent=True) == describe(
+        repository, "--match", "v*", "--first-parent")
+
+
+@pytest.mark.parametrize("candidates", (0, 1, 2))
+def test_describe_candidates(repository, candidates):
+    repo = scd.git.Repository(os.path.join(repository, ".git"))
+
+    assert repo.describe("*", candidates) == describe(
+        repository, "--candidates", str(candidates))
+
+
+@pytest.mark.parametrize("merged", (False, True))
+def test_describe_max_commits(repository, merged):
+    if merged:
+        run_git(repository, "checkout", "-q", "-b", "feature", "HEAD~6")
+        commit(repository, 100, "feature")
+        run_git(repository, "checkout", "-q", "-")
+        run_git(repository, "merge", "-q", "--no-edit", "feature")
+    repo = scd.git.Repository(os.path.join(repository, ".git"))
+    expected = describe(repository, "--match", "v*")
+
+    results = [
+        repo.describe("v*", max_commits=max_commits)
+        for max_commits in range(1, 20)]
+    assert set(results) == {None, expected}
+    assert results[0] is None
+    assert results[-1] == expected
+
+
+def test_git_distance_max_commits(repository):
+    git_dir = os.path.join(repository, ".git")
+
+    assert scd.version.git_distance(git_dir, "v*", {"max_commits": 2}) \
+        is None
+    assert scd.version.git_distance(git_dir, "v*", {"max_commits": 100}) \
+        == 4
+
+
+def test_count_commits(repository):
+    repo = scd.git.Repository(os.path.join(repository, ".git"))
+    head = repo.resolve("HEAD")
+
+    assert repo.count_commits(head) == 9
+    assert repo.count_commits(head, max_commits=3) is None
+    assert repo.count_commits(head, max_commits=8) is None
+    assert repo.count_commits(head, max_commits=9) == 9
+    assert repo.count_commits(head, max_commits=100) == 9
+
+
+def test_describe_exact(repository):
+    run_git(repository, "tag", "v1.0")
+    repo = scd.git.Repository(os.path.join(repository, ".git"))
+
+    assert repo.describe("v*") == ("v1.0", 0)
+
+
+def test_describe_empty(tmpdir):
+    run_git(tmpdir.strpath, "init", "-q")
+    repo = scd.git.Repository(tmpdir.join(".git").strpath)
+
+    assert repo.resolve("HEAD") is None
+    assert repo.describe("*") is None
+
+
+@pytest.mark.parametrize("packed", (False, True))
+def test_abbreviate(repository, packed):
+    if packed:
+        run_git(repository, "gc", "-q")
+    repo = scd.git.Repository(os.path.join(repository, ".git"))
+    head = repo.resolve("HEAD")
+
+    assert head == run_git(repository, "rev-parse", "HEAD")
+    assert repo.abbreviate(head) == run_git(
+        repository, "rev-parse", "--short", "HEAD")
+
+
+def test_version_functions(repository):
+    git_dir = os.path.join(repository, ".git")
+
+    assert scd.version.git_distance(git_dir, "v*") == 4
+    assert scd.version.git_tag(git_dir) == run_git(
+        repository, "rev-parse", "--short", "HEAD")
+
+
+@pytest.mark.parametrize("strategy, max_commits, expected", (
+    ("fail", None, None),
+    ("count", None, 2),
+    ("count", 2, 2),
+    ("count", 1, None)
+))
+def test_shallow(repository, tmpdir, strategy, max_commits, expected):
+    clone = tmpdir.join("clone").strpath
+    run_git(repository, "clone", "-q", "--depth", "2",
+            "file://" + repository, clone)
+    git_dir = os.path.join(clone, ".git")
+    options = {"shallow": strategy, "max_commits": max_commits}
+
+    assert scd.version.git_distance(git_dir, "v*", options) == expected
+    with mock.patch.object(scd.git, "Repository", side_effect=ValueError):
+        assert scd.version.git_distance(git_dir, "v*", options) == expected
+
+
+def test_vcs_stats(repository, enabled_cache, monkeypatch):
+    monkeypatch.setattr(scd.version, "STATS", [])
+    git_dir = os.path.join(repository, ".git")
+    scd.version.git_distance(git_dir, "v*")
+    scd.version.git_distance(git_dir, "v*")
+    commit(repository, 10)
+    scd.version.git_distance(git_dir, "v*")
+    with mock.patch.object(scd.git, "Repository", side_effect=ValueError):
+        scd.version.git_distance(git_dir, "v*")
+
+    assert [stats.method for stats in scd.version.STATS] == [
+        "describe", "cache", "incremental", "git"]
+    assert all(stats.duration >= 0 for stats in scd.version.STATS)
+
+
+@pytest.mark.parametrize("tagged", (False, True))
+def test_git_metadata(repository, tagged):
+    if tagged:
+        run_git(repository, "tag", "v1.0")
+    git_dir = os.path.join(repository, ".git")
+    short = run_git(repository, "rev-parse", "--short", "HEAD")
+    expected = (0, "") if tagged else (4, short)
+
+    assert scd.version.git_metadata(git_dir, "v*") == expected
+    with mock.patch.object(scd.git, "Repository", side_effect=ValueError):
+        assert scd.version.git_metadata(git_dir, "v*") == expected
+
+
+def test_worktree(repository, tmpdir):
+    worktree = tmpdir.join("worktree").strpath
+    run_git(repository, "worktree", "add", "-q", worktree, "HEAD~1")
+    git_file = os.path.join(worktree, ".git")
+
+    assert os.path.isfile(git_file)
+    assert scd.git.Repository(git_file).describe("v*") == ("v0.2", 3)
+    assert scd.git.find_toplevel(os.path.join(worktree)) == worktree
+
+
+def test_unsupported(tmpdir):
+    run_git(tmpdir.strpath, "init", "-q")
+    with tmpdir.join(".git", "config").open("a") as fp:
+        fp.write("[extensions]\n\tobjectformat = sha256\n")
+
+    with pytest.raises(ValueError):
+        scd.git.Repository(tmpdir.join(".git").strpath)
+
+
+def test_not_repository(tmpdir):
+    with pytest.raises(ValueError):
+        scd.git.Repository(tmpdir.join(".git").strpath)
+
+
+def test_find_toplevel(repository, tmpdir):
+    subdir = os.path.join(repository, "a", "b")
+    os.makedirs(subdir)
+
+    assert scd.git.find_toplevel(subdir) == repository
+    assert scd.git.find_toplevel(repository) == repository
+
+
+def test_apply_delta():
+    base = b"0123456789"
+    delta = bytearray([10, 7, 0x91, 2, 3, 4]) + b"abcd"
+
+    assert scd.git.apply_delta(base, bytes(delta)) == b"234abcd"
+
+    with pytest.raises(ValueError):
+        scd.git.apply_delta(b"short", bytes(delta))
+
+
+def test_get_new_commits(repository):
+    repo = scd.git.Repository(os.path.join(repository, ".git"))
+    head = repo.resolve("HEAD")
+    base = run_git(repository, "rev-parse", "HEAD~3")
+
+    assert sorted(repo.get_new_commits(head, base)) == sorted(run_git(
+        repository, "rev-list", "{0}..{1}".format(base, head)).split())
+    assert repo.get_new_commits(head, head) == []
+    assert repo.get_new_commits(base, head) is None
+
+
+@pytest.fixture
+def enabled_cache(monkeypatch):
+    monkeypatch.setattr(scd.cache, "ENABLED", True)
+
+
+def test_describe_cached(repository, enabled_cache):
+    git_dir = os.path.join(repository, ".git")
+    short = run_git(repository, "rev-parse", "--short", "HEAD")
+    assert scd.version.git_describe(git_dir, "v*") == ("v0.2", 4, short)
+
+    with mock.patch.object(scd.git.Repository, "describe") as mocked:
+        assert scd.version.git_describe(git_dir, "v*") == ("v0.2", 4, short)
+        commit(repository, 10)
+        commit(repository, 11)
+        described = scd.version.git_describe(git_dir, "v*")
+        assert not mocked.called
+
+    assert described == describe(repository, "--match", "v*") + (
+        run_git(repository, "rev-parse", "--short", "HEAD"),)
+
+
+def test_describe_cache_saved_on_change(repository, enabled_cache):
+    git_dir = os.path.join(repository, ".git")
+
+    with mock.patch.object(scd.cache, "save",
+                           side_effect=scd.cache.save) as mocked:
+        scd.version.git_describe(git_dir, "v*")
+        assert mocked.call_count == 1
+        scd.version.git_describe(git_dir, "v*")
+        assert mocked.call_count == 1
+        commit(repository, 10)
+        scd.version.git_describe(git_dir, "v*")
+        assert mocked.call_count == 2
+
+
+@pytest.mark.parametrize("change", ("tag", "reset", "merge"))
+def test_describe_cache_invalidated(repository, enabled_cache, change):
+    git_dir = os.path.join(repository, ".git")
+    scd.version.git_describe(git_dir, "v*")
+
+    if change == "tag":
+        run_git(repository, "tag", "v1.0", "HEAD~1")
+    elif change == "reset":
+        run_git(repository, "reset", "-q", "--hard", "HEAD~2")
+    else:
+        run_git(repository, "checkout", "-q", "-b", "feature", "HEAD~6")
+        commit(repository, 100, "feature")
+        run_git(repository, "checkout", "-q", "-")
+        run_git(repository, "merge", "-q", "--no-edit", "feature")
+
+    with mock.patch.object(scd.git.Repository, "describe",
+                           autospec=True,
+                           side_effect=scd.git.Repository.describe) as mocked:
+        described = scd.version.git_describe(git_dir, "v*")
+        assert mocked.called
+
+    assert described[:2] == describe(repository, "--match", "v*")
@@ -5,19 +5,33 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import json
+import logging
 import os
 import os.path
+import subprocess
 import sys
 
+import mock
 import pytest
 
+import scd.cache
 import scd.config
+import scd.engine
+import scd.files
 import scd.main
+import scd.utils
 
 
 @pytest.fixture
-def cliargs(monkeypatch):
+def cliargs(monkeypatch, tmpdir):
     monkeypatch.setattr(sys, "argv", ["scd"])
+    monkeypatch.setenv("XDG_CACHE_HOME", tmpdir.join("user_cache").strpath)
+    monkeypatch.setattr(scd.cache, "ENABLED", scd.cache.ENABLED)
+    monkeypatch.setattr(
+        scd.config, "STRICT_VALIDATION", scd.config.STRICT_VALIDATION)
+    monkeypatch.setattr(scd.files, "TEMPLATES_PROJECT_DIRECTORY",
+                        scd.files.TEMPLATES_PROJECT_DIRECTORY)
 
 
 @pytest.fixture
@@ -77,3 +91,191 @@ def test_main(chdir_to_tmpproject, conf, cliargs):
 
     with open("full_version") as ffp:
         assert ffp.read() == "1.2.3"
+
+
+def test_main_mapped(chdir_to_tmpproject, conf, cliargs, monkeypatch):
+    monkeypatch.setattr(scd.engine, "MMAP_THRESHOLD", 1)
+    sys.argv.extend(["-c", "config.json"])
+
+    assert scd.main.main() == os.EX_OK
+
+    with open("full_version") as ffp:
+        assert ffp.read() == "1.2.3"
+
+
+@pytest.mark.parametrize("jobs", (
+    ["-j", "3"],
+    ["-j", "3", "--processes"]
+))
+def test_main_jobs(chdir_to_tmpproject, conf, cliargs, jobs):
+    sys.argv.extend(["-c", "config.json"] + jobs)
+
+    assert scd.main.main() == os.EX_OK
+
+    with open("full_version") as ffp:
+        assert ffp.read() == "1.2.3"
+    with open("vcomplex") as ffp:
+        assert ffp.read() == "v1.2.3"
+
+
+@pytest.mark.parametrize("option", ("-j", "--cache-size"))
+@pytest.mark.parametrize("jobs", ("0", "-1", "x"))
+def test_main_incorrect_jobs(cliargs, option, jobs):
+    sys.argv.extend([option, jobs])
+
+    with pytest.raises(SystemExit):
+        scd.main.get_options()
+
+
+@pytest.mark.parametrize("scheme", ("semver", "git_pep440"))
+def test_version_scheme(cliargs, scheme):
+    sys.argv.extend(["-s", scheme])
+
+    assert scd.main.get_options().version_scheme == scheme
+
+
+@pytest.mark.parametrize("no_cache", (False, True))
+def test_version_scheme_uses_cache(cliargs, monkeypatch, no_cache):
+    cache_states = []
+
+    def get_version_plugin_names():
+        cache_states.append(scd.cache.ENABLED)
+        return {"semver", "pep440"}
+
+    monkeypatch.setattr(
+        scd.utils, "get_version_plugin_names", get_version_plugin_names)
+    sys.argv.extend(["-s", "semver"])
+    if no_cache:
+        sys.argv.append("--no-cache")
+
+    assert scd.main.get_options().version_scheme == "semver"
+    assert cache_states == [not no_cache]
+
+
+def test_incorrect_version_scheme(cliargs):
+    sys.argv.extend(["-s", "unknown"])
+
+    with pytest.raises(SystemExit):
+        scd.main.get_options()
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason="No -X importtime")
+def test_import_time():
+    output = subprocess.check_output(
+        [sys.executable, "-X", "importtime", "-c", "import scd.main"],
+        stderr=subprocess.STDOUT, universal_newlines=True)
+    timings = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            timings[name.strip()] = int(cumulative)
+
+    assert "scd.main" in timings
+    for name in ("jinja2", "jsonschema", "multiprocessing", "pkg_resources",
+                 "semver"):
+        assert name not in timings
+
+
+def test_replace_version_imports(config, tmp_project):
+    configpath = tmp_project.join("config.json")
+    configpath.write(json.dumps(config))
+    code = (
+        "import sys, scd.main; "
+        "sys.argv = ['scd', '-p', '--no-cache', '-c', {0!r}]; "
+        "scd.main.main(); print(' '.join(sys.modules))").format(
+            configpath.strpath)
+    output = subprocess.check_output(
+        [sys.executable, "-c", code], universal_newlines=True)
+    version, modules = output.split("\n", 1)
+
+    assert version
+    assert "multiprocessing" not in modules.split()
+
+
+def test_own_version_imports():
+    code = (
+        "import sys, scd.main; sys.argv = ['scd', '-V']; scd.main.main(); "
+        "print(' '.join(sys.modules))")
+    output = subprocess.check_output(
+        [sys.executable, "-c", code], universal_newlines=True)
+    modules = output.split()
+
+    assert "jinja2" not in modules
+    assert "jsonschema" not in modules
+
+
+@pytest.fixture
+def project_conf(config, tmp_project):
+    return scd.config.make_config(
+        tmp_project.join("config.json").strpath, None, config, {})
+
+
+def test_process_files_order(project_conf, caplog):
+    plan = scd.main.make_plan(project_conf.files, project_conf)
+
+    with caplog.at_level(logging.INFO):
+        scd.main.process_files(plan, 4, False, True)
+
+    started = [
+        record.getMessage() for record in caplog.records
+        if record.getMessage().startswith("Start to process")]
+    assert started == [
+        "Start to process {0}".format(path) for path, _ in plan]
+
+
+def test_process_files_error(project_conf, tmp_project):
+    plan = scd.main.make_plan(project_conf.files, project_conf)
+    tmp_project.join("full_version").remove()
+
+    with pytest.raises(IOError):
+        scd.main.process_files(plan, 4, False, True)
+
+
+def test_main_cached(chdir_to_tmpproject, conf, cliargs, tmp_project):
+    sys.argv.extend(["-c", "config.json", "-n"])
+    assert scd.main.main() == os.EX_OK
+    assert tmp_project.join(scd.cache.DIRECTORY_NAME).check(dir=True)
+
+    sys.argv.remove("-n")
+    with mock.patch.object(scd.config.Config, "validate_schema") as mocked:
+        assert scd.main.main() == os.EX_OK
+        assert not mocked.called
+
+    with open("full_version") as ffp:
+        assert ffp.read() == "1.2.3"
+    with open("vcomplex") as ffp:
+        assert ffp.read() == "v1.2.3"
+
+
+def test_main_strict_validate(chdir_to_tmpproject, conf, cliargs):
+    sys.argv.extend(["-c", "config.json", "-n"])
+    assert scd.main.main() == os.EX_OK
+
+    sys.argv.append("--strict-validate")
+    with mock.patch.object(scd.config.Config, "validate_schema",
+                           return_value=[]) as mocked:
+        assert scd.main.main() == os.EX_OK
+        assert mocked.called
+
+
+def test_main_stats(chdir_to_tmpproject, conf, cliargs, capsys):
+    original_size = scd.utils.CACHE_SIZE
+    sys.argv.extend(["-c", "config.json", "--stats", "--cache-size", "2048"])
+
+    try:
+        assert scd.main.main() == os.EX_OK
+    finally:
+        scd.utils.configure_caches(original_size)
+
+    _, err = capsys.readouterr()
+    assert "scd.files.make_pattern" in err
+    assert "2048" in err
+
+
+def test_main_no_cache(chdir_to_tmpproject, conf, cliargs, tmp_project):
+    sys.argv.extend(["-c", "config.json", "--no-cache"])
+
+    assert scd.main.main() == os.EX_OK
+    assert not tmp_project.join(scd.cache.DIRECTORY_NAME).check()
@@ -5,11 +5,16 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import logging
 import os
+import os.path
 
+import mock
 import pytest
 
+import scd.cache
 import scd.utils
+import scd.version
 
 
 def test_lru_cache():
@@ -31,6 +36,128 @@ def test_lru_cache():
     assert val1 != val3
 
 
+def test_lru_cache_hash_collision():
+    class Value(object):
+
+        def __init__(self, value):
+            self.value = value
+
+        def __hash__(self):
+            return 1
+
+        def __eq__(self, other):
+            return self.value == other.value
+
+    @scd.utils.lru_cache()
+    def method(arg):
+        return arg.value
+
+    assert method(Value(1)) == 1
+    assert method(Value(2)) == 2
+    assert method(Value(1)) == 1
+
+
+def test_lru_cache_stats():
+    @scd.utils.lru_cache(maxsize=2)
+    def method(arg, kwarg=None):
+        return arg, kwarg
+
+    assert method(1) == (1, None)
+    assert method(1) == (1, None)
+    assert method(1, kwarg=2) == (1, 2)
+    assert method(2) == (2, None)
+    assert method(1) == (1, None)
+
+    stats = method.cache.stats
+    assert stats.name.endswith(".method")
+    assert (stats.hits, stats.misses, stats.evictions) == (1, 4, 2)
+    assert (stats.size, stats.maxsize) == (2, 2)
+    assert stats in scd.utils.get_cache_stats()
+
+    method.cache_clear()
+    stats = method.cache.stats
+    assert (stats.hits, stats.misses, stats.size) == (0, 0, 0)
+
+
+def test_configure_caches():
+    @scd.utils.lru_cache()
+    def method(arg):
+        return arg
+
+    for idx in range(5):
+        method(idx)
+    original_size = scd.utils.CACHE_SIZE
+
+    try:
+        scd.utils.configure_caches(3)
+        assert method.cache.stats.size == 3
+        assert method.cache.stats.evictions == 2
+    finally:
+        scd.utils.configure_caches(original_size)
+    assert method.cache.stats.maxsize == original_size
+
+    scd.utils.clear_caches()
+    assert method.cache.stats.size == 0
+
+
+def test_get_vcs_state(tmpdir):
+    assert scd.utils.get_vcs_state(tmpdir.strpath)
+
+    git_dir = tmpdir.join(".git")
+    git_dir.join("HEAD").write("ref: refs/heads/master\n", ensure=True)
+    git_dir.join("refs", "heads", "master").write("a" * 40, ensure=True)
+    state = scd.utils.get_vcs_state(tmpdir.strpath)
+    assert state == scd.utils.get_vcs_state(tmpdir.strpath)
+
+    master = git_dir.join("refs", "heads", "master")
+    stat = master.stat()
+    master.write("b" * 40)
+    os.utime(master.strpath, (stat.atime, stat.mtime))
+    assert state != scd.utils.get_vcs_state(tmpdir.strpath)
+
+    state = scd.utils.get_vcs_state(tmpdir.strpath)
+    git_dir.join("refs", "tags", "release", "v1").write("c" * 40, ensure=True)
+    assert state != scd.utils.get_vcs_state(tmpdir.strpath)
+
+    state = scd.utils.get_vcs_state(tmpdir.strpath)
+    tags_dir = git_dir.join("refs", "tags", "release")
+    tags_dir.join("v1.lock").write("d" * 40)
+    tags_dir.join("v1.lock").rename(tags_dir.join("v1"))
+    os.utime(tags_dir.strpath, (0, 0))
+    assert state != scd.utils.get_vcs_state(tmpdir.strpath)
+
+
+def test_get_vcs_state_tags_not_checked(tmpdir):
+    git_dir = tmpdir.join(".git")
+    git_dir.join("HEAD").write("ref: refs/heads/master\n", ensure=True)
+    for number in range(100):
+        git_dir.join("refs", "tags", "v{0}".format(number)).write(
+            "a" * 40, ensure=True)
+
+    with mock.patch("os.stat", side_effect=os.stat) as mocked:
+        scd.utils.get_vcs_state(tmpdir.strpath)
+        assert mocked.call_count < 10
+
+
+def test_get_vcs_state_gitfile(tmpdir):
+    git_dir = tmpdir.join("repo.git")
+    git_dir.join("HEAD").write("ref: refs/heads/master\n", ensure=True)
+    git_dir.join("refs", "heads", "master").write("a" * 40, ensure=True)
+    project = tmpdir.join("project")
+    project.join(".git").write("gitdir: ../repo.git\n", ensure=True)
+    subdirectory = project.mkdir("subdirectory")
+
+    state = scd.utils.get_vcs_state(subdirectory.strpath)
+    assert state == scd.utils.get_vcs_state(project.strpath)
+
+    git_dir.join("refs", "tags", "v1").write("b" * 40, ensure=True)
+    assert state != scd.utils.get_vcs_state(subdirectory.strpath)
+
+    state = scd.utils.get_vcs_state(subdirectory.strpath)
+    git_dir.join("refs", "heads", "master").write("c" * 41)
+    assert state != scd.utils.get_vcs_state(subdirectory.strpath)
+
+
 def test_execute_ok():
     command = ["/bin/sh", "-c", "echo 1; echo 2 1>&2"]
 
@@ -68,3 +195,121 @@ def test_get_plugins_nok():
 def test_get_version_plugins():
     plugins = scd.utils.get_plugins(scd.utils.VERSION_PLUGIN_NAMESPACE)
     assert plugins == scd.utils.get_version_plugins()
+
+
+def test_get_plugin():
+    plugin = scd.utils.get_plugin(scd.utils.VERSION_PLUGIN_NAMESPACE, "semver")
+
+    assert plugin is scd.version.SemVer
+    assert scd.utils.get_version_plugin("semver") is plugin
+
+
+def test_get_plugin_unknown():
+    with pytest.raises(ValueError):
+        scd.utils.get_plugin(scd.utils.VERSION_PLUGIN_NAMESPACE, "xxx")
+
+
+def test_get_plugin_versions():
+    versions = scd.utils.get_plugin_versions(
+        scd.utils.VERSION_PLUGIN_NAMESPACE)
+
+    assert len(versions) == len(scd.utils.get_version_plugin_names())
+    assert any(version.startswith("semver=scd ") for version in versions)
+
+
+def test_get_entry_points_cached(monkeypatch, tmpdir):
+    monkeypatch.setattr(scd.cache, "ENABLED", True)
+    monkeypatch.setenv("XDG_CACHE_HOME", tmpdir.strpath)
+    get_entry_points = scd.utils.get_entry_points.__wrapped__
+
+    entry_points = get_entry_points(scd.utils.VERSION_PLUGIN_NAMESPACE)
+    assert entry_points["pep440"].reference == "scd.version:PEP440"
+    assert len(tmpdir.join("scd", "entry_points").listdir()) == 1
+
+    with mock.patch.object(scd.utils, "collect_entry_points") as mocked:
+        assert get_entry_points(
+            scd.utils.VERSION_PLUGIN_NAMESPACE) == entry_points
+        assert not mocked.called
+
+
+@pytest.mark.parametrize("reference, result", (
+    ("scd.version:SemVer", scd.version.SemVer),
+    ("scd.version : SemVer [extra]", scd.version.SemVer),
+    ("os.path:join", os.path.join),
+    ("os.path", os.path),
+    ("scd.version:Version.__init__", scd.version.Version.__init__)
+))
+def test_load_reference(reference, result):
+    assert scd.utils.load_reference(reference) is result
+
+
+def test_load_reference_incorrect():
+    with pytest.raises(ValueError):
+        scd.utils.load_reference(":Class")
+
+
+def test_capture_logs(caplog):
+    with caplog.at_level(logging.INFO):
+        with scd.utils.capture_logs() as records:
+            logging.info("Hello %s", "world")
+        assert not caplog.records
+
+        assert len(records) == 1
+        assert records[0].getMessage() == "Hello world"
+
+        scd.utils.replay_logs(records)
+        assert [rec.getMessage() for rec in caplog.records] == ["Hello world"]
+
+
+def test_atomic_writer_ok(tmpdir):
+    target = tmpdir.join("file")
+    target.write("old")
+    target.chmod(0o751)
+
+    with scd.utils.AtomicWriter(target.strpath, "wt") as writer:
+        writer.write("new")
+        writer.write(" content")
+        assert target.read() == "old"
+
+    assert target.read() == "new content"
+    assert target.stat().mode & 0o777 == 0o751
+    assert tmpdir.listdir() == [target]
+
+
+def test_atomic_writer_nothing_written(tmpdir):
+    target = tmpdir.join("file")
+    target.write("old")
+    mtime = target.mtime()
+
+    with scd.utils.AtomicWriter(target.strpath, "wt"):
+        pass
+
+    assert target.read() == "old"
+    assert target.mtime() == mtime
+    assert tmpdir.listdir() == [target]
+
+
+def test_atomic_writer_exception(tmpdir):
+    target = tmpdir.join("file")
+    target.write("old")
+
+    with pytest.raises(RuntimeError):
+        with scd.utils.AtomicWriter(target.strpath, "wt") as writer:
+            writer.write("new")
+            raise RuntimeError
+
+    assert target.read() == "old"
+    assert tmpdir.listdir() == [target]
+
+
+def test_atomic_writer_symlink(tmpdir):
+    target = tmpdir.join("file")
+    target.write("old")
+    link = tmpdir.join("link")
+    link.mksymlinkto(target)
+
+    with scd.utils.AtomicWriter(link.strpath, "wt") as writer:
+        writer.write("new")
+
+    assert link.islink()
+    assert target.read() == "new"
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import copy
+import os
+import timeit
+
+import jsonschema
+import pytest
+
+import scd.config
+import scd.validator
+
+
+SCHEMA = {
+    "type": "object",
+    "required": ["name"],
+    "properties": {
+        "name": {"type": "string", "enum": ["a", "b"]},
+        "number": {"type": ["number", "null"], "minimum": 1,
+                   "multipleOf": 1.0},
+        "limited": {"type": "integer", "maximum": 10,
+                    "exclusiveMaximum": True},
+        "items": {
+            "type": "array",
+            "items": {
+                "oneOf": [
+                    {"type": "string"},
+                    {"type": "object", "anyOf": [
+                        {"required": ["x"]},
+                        {"required": ["y"], "not": {"required": ["z"]}}
+                    ]}
+                ]
+            }
+        }
+    },
+    "additionalProperties": {"type": "boolean"}
+}
+
+
+def is_valid(schema, instance):
+    validator = jsonschema.Draft4Validator(schema)
+    return not list(validator.iter_errors(instance))
+
+
+@pytest.mark.parametrize("instance", (
+    {"name": "a"},
+    {"name": "c"},
+    {"name": 1},
+    {},
+    [],
+    "a",
+    {"name": "b", "number": 1},
+    {"name": "b", "number": None},
+    {"name": "b", "number": 0},
+    {"name": "b", "number": 1.5},
+    {"name": "b", "number": True},
+    {"name": "b", "limited": 9},
+    {"name": "b", "limited": 10},
+    {"name": "b", "limited": 9.0},
+    {"name": "b", "items": []},
+    {"name": "b", "items": ["x", {"x": 1}, {"y": 1}]},
+    {"name": "b", "items": [{"y": 1, "z": 1}]},
+    {"name": "b", "items": [1]},
+    {"name": "b", "items": {}},
+    {"name": "b", "extra": True},
+    {"name": "b", "extra": "true"}
+))
+def test_compile_schema(instance):
+    validator = scd.validator.compile_schema(SCHEMA)
+
+    assert validator(instance) == is_valid(SCHEMA, instance)
+
+
+def test_compile_config_schema(config):
+    schema = scd.config.make_v1_config_schema()
+    validator = scd.validator.compile_schema(schema)
+    assert validator(config)
+
+    broken = copy.deepcopy(config)
+    broken["version"]["scheme"] = "unknown"
+    assert not validator(broken)
+
+    broken = copy.deepcopy(config)
+    broken["files"]["all"].append({"search": "x", "search_raw": "y"})
+    assert validator(broken) == is_valid(schema, broken)
+
+
+@pytest.mark.parametrize("schema", (
+    {"type": "unknown"},
+    {"pattern": "^a$"},
+    {"properties": {"a": {"$ref": "#"}}},
+    {"items": [{"type": "string"}]},
+    []
+))
+def test_compile_schema_unsupported(schema):
+    with pytest.raises(ValueError):
+        scd.validator.compile_schema(schema)
+
+
+def test_large_config(config):
+    config = copy.deepcopy(config)
+    for idx in range(4000):
+        config["files"]["file{0}".format(idx)] = [
+            "default", {"search": "full", "replace": "major2"}]
+
+    schema = scd.config.make_v1_config_schema()
+    compiled = scd.validator.compile_schema(schema)
+    interpreted = jsonschema.Draft4Validator(schema)
+
+    assert compiled(config)
+    assert interpreted.is_valid(config)
+
+    config["files"]["file3999"].append({"search": 1})
+    assert not compiled(config)
+    assert not interpreted.is_valid(config)
+
+
+@pytest.mark.skipif(not os.environ.get("SCD_BENCHMARK"),
+                    reason="Benchmarks are enabled with SCD_BENCHMARK=1")
+def test_benchmark(config, capsys):
+    config = copy.deepcopy(config)
+    for idx in range(4000):
+        config["files"]["file{0}".format(idx)] = [
+            "default", {"search": "full", "replace": "major2"}]
+
+    schema = scd.config.make_v1_config_schema()
+    compiled = scd.validator.compile_schema(schema)
+    interpreted = jsonschema.Draft4Validator(schema)
+
+    compiled_time = min(timeit.repeat(
+        lambda: compiled(config), number=1, repeat=5))
+    interpreted_time = min(timeit.repeat(
+        lambda: list(interpreted.iter_errors(config)), number=1, repeat=5))
+    with capsys.disabled():
+        print("\nvalidation of {0} files: compiled {1:.4f}s, "
+              "jsonschema {2:.4f}s ({3:.1f}x)".format(
+                  len(config["files"]), compiled_time, interpreted_time,
+                  interpreted_time / compiled_time))
+
+    assert compiled_time < interpreted_time
@@ -30,14 +30,14 @@ def external_command():
 
 
 @pytest.yield_fixture
-def git_tag():
-    with mock.patch.object(scd.version, "git_tag") as mocked:
-        yield mocked
+def no_reader():
+    with mock.patch("scd.git.Repository", side_effect=ValueError):
+        yield
 
 
 @pytest.yield_fixture
-def git_distance():
-    with mock.patch.object(scd.version, "git_distance") as mocked:
+def git_metadata():
+    with mock.patch.object(scd.version, "git_metadata") as mocked:
         yield mocked
 
 
@@ -147,6 +147,38 @@ class TestSemVer(VersionTest):
     def test_empty_version(self):
         assert scd.version.SemVer.parse_text_version("") == 0
 
+    def test_context_lazy(self):
+        context = self.config.version.context
+
+        with mock.patch.object(scd.version.SemVer, "next_prerelease",
+                               new_callable=mock.PropertyMock,
+                               return_value="pre9") as expensive, \
+                mock.patch.object(scd.version.SemVer, "next_minor",
+                                  new_callable=mock.PropertyMock,
+                                  return_value=7) as cheap:
+            assert context["k"] == "v"
+            assert "next_prerelease" in context
+            assert "unknown" not in context
+            assert not expensive.called
+            assert not cheap.called
+
+            assert context["next_prerelease"] == "pre9"
+            assert context["next_prerelease"] == "pre9"
+            assert expensive.call_count == 1
+
+            assert context["next_minor"] == 7
+            assert context["next_minor"] == 7
+            assert cheap.call_count == 2
+
+        with pytest.raises(KeyError):
+            context["unknown"]
+
+    def test_context_extra_override(self):
+        self.config.extra_context["major"] = "X"
+
+        assert self.config.version.context["major"] == "X"
+        assert len(self.config.version.context) == 18
+
 
 @pytest.mark.usefixtures("external_command")
 class TestGitSemver(VersionTest):
@@ -161,12 +193,11 @@ class TestGitSemver(VersionTest):
         with pytest.raises(ValueError):
             self.config.version
 
-    def test_version_parse_full(self, git_distance, git_tag):
+    def test_version_parse_full(self, git_metadata):
         tag_name = pytest.faux.gen_alpha()
         tag_distance = str(abs(pytest.faux.gen_integer()))
 
-        git_distance.return_value = tag_distance
-        git_tag.return_value = tag_name
+        git_metadata.return_value = tag_distance, tag_name
 
         self.config.raw["version"]["number"] = "1.2.0"
         version = self.config.version
@@ -211,8 +242,8 @@ class TestGitSemver(VersionTest):
             "k": "v"
         }
 
-    def test_empty_distance(self, git_dir, git_distance, git_tag):
-        git_distance.return_value = None
+    def test_empty_distance(self, git_dir, git_metadata):
+        git_metadata.return_value = None, pytest.faux.gen_alpha()
         self.config.raw["version"]["number"] = "1.2.0"
         version = self.config.version
 
@@ -305,15 +336,15 @@ class TestGitPEP440(VersionTest):
             self.config.version
 
     @pytest.mark.parametrize("distance", (0, 7))
-    def test_dev(self, distance, git_tag, git_distance):
-        git_distance.return_value = distance
+    def test_dev(self, distance, git_metadata):
+        git_metadata.return_value = distance, ""
         self.config.raw["version"]["number"] = "0.0.0"
 
         assert self.config.version.dev == distance
 
     @pytest.mark.parametrize("local", ("", "xxx"))
-    def test_local(self, local, git_tag, git_distance):
-        git_tag.return_value = local
+    def test_local(self, local, git_metadata):
+        git_metadata.return_value = 1, local
         self.config.raw["version"]["number"] = "0.0.0+loc.dd"
 
         if local:
@@ -327,7 +358,7 @@ def test_git_tag_ok(git_dir):
     assert scd.version.git_tag(git_dir)
 
 
-def test_git_tag_nok(git_dir, external_command):
+def test_git_tag_nok(git_dir, no_reader, external_command):
     external_command.side_effect = ValueError
     assert scd.version.git_tag(git_dir) is None
 
@@ -342,11 +373,32 @@ def test_git_distance_no_tag(git_dir):
     assert scd.version.git_distance(git_dir, pytest.faux.gen_uuid()) is None
 
 
-def test_git_distance_no_distance(git_dir, external_command):
+def test_git_distance_no_distance(git_dir, no_reader, external_command):
     external_command.return_value = {
         "code": os.EX_OK,
-        "stdout": ["v0.1.0"],
+        "stdout": ["v0.1.0-0-gabcdef0"],
         "stderr": []
     }
 
     assert scd.version.git_distance(git_dir, pytest.faux.gen_uuid()) == 0
+
+
+def test_git_metadata_single_command(git_dir, no_reader, external_command):
+    external_command.return_value = {
+        "code": os.EX_OK,
+        "stdout": ["v0.1.0-3-gabcdef0"],
+        "stderr": []
+    }
+
+    assert scd.version.git_metadata(git_dir, "v*") == (3, "abcdef0")
+    assert external_command.call_count == 1
+
+
+def test_git_metadata_no_tag(git_dir, no_reader, external_command):
+    external_command.return_value = {
+        "code": os.EX_OK,
+        "stdout": ["abcdef0"],
+        "stderr": []
+    }
+
+    assert scd.version.git_metadata(git_dir, "v*") == (None, "abcdef0")
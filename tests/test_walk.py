@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+
+import pytest
+
+import scd.config
+import scd.walk
+
+
+@pytest.fixture
+def tree(tmpdir):
+    for name in (
+            "setup.py",
+            "pkg/__init__.py",
+            "pkg/sub/__init__.py",
+            "pkg/sub/module.py",
+            "packages/a/package.json",
+            "packages/b/package.json",
+            "packages/b/nested/package.json",
+            "docs/conf.py",
+            "docs/index.rst",
+            "build/pkg/__init__.py",
+            "keep/__init__.py",
+            ".git/__init__.py",
+            "module.pyc"):
+        tmpdir.join(*name.split("/")).ensure()
+    tmpdir.join(".gitignore").write(
+        "# comment\n\nbuild/\n*.pyc\n/keep\n!/keep/__init__.py\n")
+
+    return tmpdir
+
+
+@pytest.mark.parametrize("name, expected", (
+    ("setup.py", False),
+    ("docs/conf.py", False),
+    ("docs/", True),
+    ("*.py", True),
+    ("pkg/[ab].py", True),
+    ("pkg/[ab.py", False),
+    ("pkg/[]ab].py", True),
+    ("pkg/?.py", True)
+))
+def test_is_glob(name, expected):
+    assert scd.walk.is_glob(name) is expected
+
+
+def test_is_glob_existing_file(tmpdir):
+    tmpdir.join("docs", "[draft].txt").write("", ensure=True)
+
+    assert scd.walk.is_glob("docs/[draft].txt")
+    assert not scd.walk.is_glob("docs/[draft].txt", tmpdir.strpath)
+    assert scd.walk.is_glob("docs/[final].txt", tmpdir.strpath)
+    assert scd.walk.is_glob("docs/", tmpdir.strpath)
+
+
+@pytest.mark.parametrize("glob, name, expected", (
+    ("*.py", "setup.py", True),
+    ("*.py", "pkg/setup.py", False),
+    ("**/__init__.py", "__init__.py", True),
+    ("**/__init__.py", "a/b/__init__.py", True),
+    ("**/__init__.py", "a/b/x__init__.py", False),
+    ("pkg/**", "pkg/a/b", True),
+    ("pkg/**", "pkgx/a", False),
+    ("docs/", "docs/a/b.rst", True),
+    ("docs/", "docs", False),
+    ("file?.txt", "file1.txt", True),
+    ("file?.txt", "file/.txt", False),
+    ("file[0-9].txt", "file1.txt", True),
+    ("file[!0-9].txt", "file1.txt", False),
+    ("file[!0-9].txt", "filea.txt", True),
+    ("file[!0-9].txt", "file/.txt", False),
+    ("file[.txt", "file[.txt", True),
+    ("a+b.txt", "a+b.txt", True),
+    ("a+b.txt", "aab.txt", False)
+))
+def test_make_glob_regexp(glob, name, expected):
+    matched = scd.walk.make_glob_regexp(glob).match(name) is not None
+
+    assert matched is expected
+
+
+def test_ignore_rules():
+    rules = scd.walk.IgnoreRules.from_lines([
+        "# comment", "", "build/", "*.pyc", "/keep", "!/keep/x.py"])
+
+    assert rules.match("build", True)
+    assert rules.match("a/build", True)
+    assert not rules.match("build", False)
+    assert rules.match("a/b.pyc", False)
+    assert rules.match("keep", True)
+    assert not rules.match("a/keep", True)
+    assert not rules.match("keep/x.py", False)
+    assert not rules.match("setup.py", False)
+
+
+def test_ignore_rules_no_file(tmpdir):
+    assert not scd.walk.IgnoreRules.from_directory(tmpdir.strpath).rules
+
+
+@pytest.mark.parametrize("globs, expected", (
+    (["**/__init__.py"], {
+        "pkg/__init__.py": "**/__init__.py",
+        "pkg/sub/__init__.py": "**/__init__.py"}),
+    (["packages/*/package.json"], {
+        "packages/a/package.json": "packages/*/package.json",
+        "packages/b/package.json": "packages/*/package.json"}),
+    (["docs/", "*.py"], {
+        "docs/conf.py": "docs/",
+        "docs/index.rst": "docs/",
+        "setup.py": "*.py"}),
+    (["pkg/**", "**/__init__.py"], {
+        "pkg/__init__.py": "**/__init__.py",
+        "pkg/sub/__init__.py": "**/__init__.py",
+        "pkg/sub/module.py": "pkg/**"}),
+    ([], {})
+))
+def test_expand(tree, globs, expected):
+    assert scd.walk.expand(tree.strpath, globs) == expected
+
+
+def test_expand_prunes(tree, monkeypatch):
+    monkeypatch.setattr(scd.walk, "STATS", [])
+    visited = []
+    list_directory = scd.walk.list_directory
+
+    def mocked(path):
+        visited.append(os.path.relpath(path, tree.strpath))
+        return list_directory(path)
+
+    monkeypatch.setattr(scd.walk, "list_directory", mocked)
+    scd.walk.expand(tree.strpath, ["packages/*/package.json"])
+
+    assert sorted(visited) == [
+        "packages", os.path.join("packages", "a"),
+        os.path.join("packages", "b")]
+    assert len(scd.walk.STATS) == 1
+    assert scd.walk.STATS[0].root == tree.join("packages").strpath
+    assert scd.walk.STATS[0].directories == 3
+    assert scd.walk.STATS[0].files == 2
+
+
+def test_config_globs(tree):
+    tree.join("docs", "[draft].txt").ensure()
+    data = {"search": "semver", "replace": "full"}
+    conf = scd.config.make_config(tree.join("config.json").strpath, None, {
+        "config": 1,
+        "version": {"scheme": "semver", "number": "1.2.3"},
+        "files": {
+            "**/__init__.py": [data],
+            "pkg/__init__.py": ["default"],
+            "docs/[draft].txt": ["default"],
+            "missing.py": ["default"]
+        },
+        "defaults": {"search": "semver", "replacement": "base"}
+    }, {})
+
+    files = conf.files
+    assert files.names == (
+        "docs/[draft].txt", "missing.py", "pkg/__init__.py",
+        "pkg/sub/__init__.py")
+    assert files.data == (["default"], ["default"], ["default"], [data])